@@ -0,0 +1,32 @@
+class MatchSettings:
+    """
+    Everything both peers have to agree on before a match starts, the server sends it in the HANDSHAKE message.
+    """
+
+    def __init__(self, width: int, height: int, player_speed: int, ball_speed: int, tick_rate: int,
+                 ball_count: int = 1, rollback_seed: int = 0, player_name: str = "Player", features: int = 0):
+        self.width: int = width
+        self.height: int = height
+        self.player_speed: int = player_speed
+        self.ball_speed: int = ball_speed
+        self.tick_rate: int = tick_rate
+        # More than 1: chaos mode, see multiball.py
+        self.ball_count: int = ball_count
+        # 0: the server simulates and sends snapshots, else rollback mode with this random seed
+        self.rollback_seed: int = rollback_seed
+        # The name of the player that sends the settings
+        self.player_name: str = player_name
+        # The features the match needs (protocol.Feature), the peer rejects the match if it lacks one
+        self.features: int = features
+
+    def __str__(self) -> str:
+        ret: str = ''
+        ret += f"size: {self.width}x{self.height},"
+        ret += f"player_speed: {self.player_speed},"
+        ret += f"ball_speed: {self.ball_speed},"
+        ret += f"tick_rate: {self.tick_rate},"
+        ret += f"ball_count: {self.ball_count},"
+        ret += f"rollback_seed: {self.rollback_seed},"
+        ret += f"player_name: {self.player_name},"
+        ret += f"features: {self.features}"
+        return ret
@@ -1,11 +1,26 @@
 class SendData():
-    def __init__(self, player_position, game_state, ball_x, ball_y, server_score, client_score):
+    # __slots__ keeps the object small, it gets reused every frame instead of creating a new one
+    __slots__ = ("player_position", "game_state", "ball_x", "ball_y", "server_score", "client_score",
+                 "client_position", "input_sequence", "balls")
+
+    def __init__(self, player_position, game_state, ball_x, ball_y, server_score, client_score,
+                 client_position=0, input_sequence=0, balls=None):
+        self.update(player_position, game_state, ball_x, ball_y, server_score, client_score,
+                    client_position, input_sequence, balls)
+
+    def update(self, player_position, game_state, ball_x, ball_y, server_score, client_score,
+               client_position=0, input_sequence=0, balls=None):
         self.player_position = player_position
         self.game_state = game_state
         self.ball_x = ball_x
         self.ball_y = ball_y
         self.server_score = server_score
         self.client_score = client_score
+        # The client paddle as the server accepted it, and the input of the client it belongs to
+        self.client_position = client_position
+        self.input_sequence = input_sequence
+        # Chaos mode: the packed positions of all balls (see multiball.py), None with one ball
+        self.balls = balls
 
     def __getstate__(self):
         return (
@@ -14,7 +29,10 @@ class SendData():
             self.ball_x,
             self.ball_y,
             self.server_score,
-            self.client_score
+            self.client_score,
+            self.client_position,
+            self.input_sequence,
+            self.balls
         )
 
     def __setstate__(self, state):
@@ -24,5 +42,8 @@ class SendData():
             self.ball_x,
             self.ball_y,
             self.server_score,
-            self.client_score
+            self.client_score,
+            self.client_position,
+            self.input_sequence,
+            self.balls
         ) = state
@@ -1,13 +1,20 @@
 import pygame
 import sys
 import threading
+import tracing
 from typing import Dict, List, Optional
+from assets import AssetCache, get_assets
+from frame_pacing import IDLE_TIMEOUT_MS, MAX_MENU_FPS, FramePacer, post_network_event
 from network import Network
+from renderer import SurfaceRenderer
 from SettingData import SettingData
 
+# The waiting dots change this often
+DOTS_INTERVAL_MS: int = 500
+
 
 class StartScreen:
-    def __init__(self, window_width, window_height, window, clock):
+    def __init__(self, window_width, window_height, renderer, clock):
 
         # Set up the game window
         if window_width is not None:
@@ -20,11 +27,11 @@ class StartScreen:
         else:
             self.window_height = 600
 
-        if window is not None:
-            self.window = window
+        # Draws the screens, see renderer.py
+        if renderer is not None:
+            self.renderer = renderer
         else:
-            self.window = pygame.display.set_mode(
-                (self.window_width, self.window_height))
+            self.renderer = SurfaceRenderer((self.window_width, self.window_height))
 
         if clock is not None:
             self.clock = clock
@@ -32,7 +39,7 @@ class StartScreen:
             self.clock: pygame.time.Clock = pygame.time.Clock()
 
         # Set the caption of the window
-        pygame.display.set_caption("Start Screen")
+        self.renderer.set_title("Start Screen")
 
         # Colors
         self.BLACK = (0, 0, 0)
@@ -48,6 +55,8 @@ class StartScreen:
         self.player_name: str = "Player"
         self.player_speed: int = 8
         self.ball_speed: int = 5
+        self.tick_rate: int = 60  # simulation ticks per second, rendering is not bound to it
+        self.ball_count: int = 1  # more than 1: chaos mode, see multiball.py
 
         # Game state
         self.game_state: str = "main_menu"
@@ -56,6 +65,7 @@ class StartScreen:
         self.option_to_gamestate: Dict[str, str] = {
             "START GAME": "start_game",
             "JOIN GAME": "join_game",
+            "WATCH GAME": "watch_game",  # spectate the newest match of a dedicated server
             "SETTINGS": "settings",
             "EXIT": "exit",
             "MAIN MENU": "main_menu"
@@ -68,19 +78,26 @@ class StartScreen:
         self.options: List[str] = list(self.option_to_gamestate.keys())
         # The selected option at the moment, 0 is the first option
         self.selected_option: int = 0
-        self.font_options = pygame.font.Font(None, 40)
+        self.layout_options()
+
+        # The screen is only drawn again after an event or when the waiting dots change, see frame_pacing.py
+        self.pacer: FramePacer = FramePacer()
+        self.drawn_dots: int = -1
 
         # Network
         self.ip_address: str = ""
         self.connection_established: bool = False
         self.network_thread:  Optional[threading.Thread] = None
         self.network: Network = None
+        self.transport: str = "tcp"  # "tcp" or "udp", see Network
+        # Simulated network conditions for testing (latency, latency_jitter, packet_loss, packet_reorder of Network)
+        self.network_options: Dict[str, float] = {}
+        self.rollback: bool = False  # exchange only inputs and simulate on both peers, see rollback.py
 
         # Invalid game state button
         self.invalid_state_button_rect = pygame.Rect(
             20, self.window_height - 70, 200, 50)
-        self.invalid_state_button_text = self.font_options.render(
-            "<- Back to Main Menu", True, self.WHITE)
+        self.invalid_state_button_text = get_assets().text("<- Back to Main Menu", 40)
 
         # Input rectangles for settings
         self.fixed_length = 200
@@ -98,7 +115,12 @@ class StartScreen:
             SettingData(rect=None, safe="ball_speed", input="ball_speed_input",
                         text="Ball Speed: ", input_type="int", upper_limit=20, lower_limit=1),
             SettingData(rect=None, safe="player_speed", input="player_speed_input",
-                        text="Player Speed: ", input_type="int", upper_limit=20, lower_limit=1)
+                        text="Player Speed: ", input_type="int", upper_limit=20, lower_limit=1),
+            SettingData(rect=None, safe="tick_rate", input="tick_rate_input",
+                        text="Tick Rate: ", input_type="int", upper_limit=240, lower_limit=30),
+            # A snapshot with all balls has to fit into one udp datagram
+            SettingData(rect=None, safe="ball_count", input="ball_count_input",
+                        text="Balls: ", input_type="int", upper_limit=300, lower_limit=1)
         ]
         self.reset_settings_input()  # Reset the inputs to the values at the moment
 
@@ -135,45 +157,65 @@ class StartScreen:
             Network: The network object
         """
         while True:
-            ret = self.render_screen()
-            if ret is not None:
-                return ret
-            ret = self.handle_input()
+            if self.pacer.redraw or self.dots_changed():
+                self.pacer.redraw = False
+                ret = self.render_screen()
+                if ret is not None:
+                    return ret
+                self.clock.tick(MAX_MENU_FPS)
+            ret = self.handle_input(self.pacer.wait(self.next_frame_timeout()))
             if ret is not None:
                 return ret
-            self.clock.tick(60)
+
+    def dots_changed(self) -> bool:
+        """
+        Returns True if the waiting dots have to be drawn again. Nothing is animated while minimized.
+        """
+        return (self.game_state == "start_game" and not self.pacer.minimized
+                and pygame.time.get_ticks() // DOTS_INTERVAL_MS != self.drawn_dots)
+
+    def next_frame_timeout(self) -> float:
+        """
+        Returns the milliseconds until the next animation step, the loop sleeps this long if there is no event.
+        """
+        if self.game_state != "start_game" or self.pacer.minimized:
+            return IDLE_TIMEOUT_MS
+        return DOTS_INTERVAL_MS - pygame.time.get_ticks() % DOTS_INTERVAL_MS
+
+    def layout_options(self):
+        """
+        Renders the options of the main menu and places them, again when the window size changes
+        """
+        # Render the options, except for the "MAIN MENU" option
+        self.option_texts: List[pygame.Surface] = [
+            get_assets().text(option, 40) for option in self.options if option != "MAIN MENU"]
+        self.option_rects: List[pygame.Rect] = [
+            option_text.get_rect(
+                center=(self.window_width // 2, self.window_height // 2 + index * 50))
+            for index, option_text in enumerate(self.option_texts)
+        ]
 
     def render_screen(self) -> Optional[Network]:
-        self.window.fill(self.BLACK)  # Fill the screen with black
+        self.renderer.begin()  # Fill the screen with black
+        # Fonts and texts are cached, most of them are the same every frame
+        assets: AssetCache = get_assets()
 
         if self.game_state == "main_menu":
             # Increase font size for "Pong"
-            font_title = pygame.font.Font(None, 80)
-            title_text = font_title.render("Pong", True, self.WHITE)
+            title_text = assets.text("Pong", 80)
             title_rect = title_text.get_rect(
                 center=(self.window_width // 2, 100))
 
-            # Render the options, except for the "MAIN MENU" option
-            self.option_texts = [self.font_options.render(
-                option, True, self.WHITE) for option in self.options if option != "MAIN MENU"]
-
-            self.option_rects = [
-                option_text.get_rect(
-                    center=(self.window_width // 2, self.window_height // 2 + index * 50))
-                for index, option_text in enumerate(self.option_texts)
-            ]
-
-            self.window.blit(title_text, title_rect)  # Draw the title text
+            self.renderer.blit(title_text, title_rect)  # Draw the title text
 
             for index, option_rect in enumerate(self.option_rects):
-                if option_rect.collidepoint(pygame.mouse.get_pos()):
+                if option_rect.collidepoint(self.renderer.mouse_position()):
                     self.selected_option = index
                     # Draw a black rectangle around the option
-                    pygame.draw.rect(self.window, self.BLACK,
-                                     option_rect.inflate(6, 6))
+                    self.renderer.rect(self.BLACK, option_rect.inflate(6, 6))
                 else:
                     # Draw a black rectangle around the option
-                    pygame.draw.rect(self.window, self.BLACK, option_rect)
+                    self.renderer.rect(self.BLACK, option_rect)
 
                 if index == self.selected_option:  # If the option is selected
                     selected_option_react = option_rect
@@ -181,56 +223,51 @@ class StartScreen:
                     underline_rect = pygame.Rect(selected_option_react.left, selected_option_react.bottom - 4,
                                                  selected_option_react.width, 4)
                     # Draw a white rectangle under the option
-                    pygame.draw.rect(self.window, self.WHITE, underline_rect)
+                    self.renderer.rect(self.WHITE, underline_rect)
 
-                self.window.blit(self.option_texts[index], option_rect)
+                self.renderer.blit(self.option_texts[index], option_rect)
 
-        elif self.game_state == "join_game":
-            font_title = pygame.font.Font(None, 80)
-            font_input = pygame.font.Font(None, 40)
-
-            title_text = font_title.render("Join Game", True, self.WHITE)
+        elif self.game_state in ("join_game", "watch_game"):
+            title: str = "Join Game" if self.game_state == "join_game" else "Watch Game"
+            title_text = assets.text(title, 80)
             title_rect = title_text.get_rect(
                 center=(self.window_width // 2, 100))
 
-            title_ip_text = font_input.render("Server IP:", True, self.WHITE)
+            title_ip_text = assets.text("Server IP:", 40)
             title_ip_rect = title_ip_text.get_rect(
                 midleft=(self.window_width // 2 - 100, self.window_height // 2 - 50))
 
-            pygame.draw.rect(self.window, self.WHITE, (self.window_width //
-                             2 - 100, self.window_height // 2 - 25, 200, 50), 2)
+            self.renderer.rect(self.WHITE, (self.window_width // 2 - 100, self.window_height // 2 - 25, 200, 50), 2)
 
-            self.window.blit(title_text, title_rect)
-            self.window.blit(title_ip_text, title_ip_rect)
+            self.renderer.blit(title_text, title_rect)
+            self.renderer.blit(title_ip_text, title_ip_rect)
 
             # Render the current IP address input
-            ip_text = font_input.render(self.ip_address, True, self.WHITE)
+            ip_text = assets.text(self.ip_address, 40)
             ip_rect = ip_text.get_rect(
                 midleft=(self.window_width // 2 - 90, self.window_height // 2))
-            self.window.blit(ip_text, ip_rect)
+            self.renderer.blit(ip_text, ip_rect)
 
         elif self.game_state == "start_game":
-            font_start = pygame.font.Font(None, 40)
-            waiting_text = font_start.render(
-                "Waiting for a connection", True, self.WHITE)
+            waiting_text = assets.text("Waiting for a connection", 40)
             waiting_rect = waiting_text.get_rect(
                 center=(self.window_width // 2, self.window_height // 2))
-            ip_text = font_start.render(
-                f"IP: {self.ip_address}", True, self.WHITE)
+            ip_text = assets.text(f"IP: {self.ip_address}", 40)
             ip_rect = ip_text.get_rect(
                 center=(self.window_width // 2, self.window_height // 2 + 50))
 
             # Calculate the number of dots to display based on the current frame count
-            num_dots = (pygame.time.get_ticks() // 500) % 4
+            self.drawn_dots = pygame.time.get_ticks() // DOTS_INTERVAL_MS
+            num_dots = self.drawn_dots % 4
             dots = "." * num_dots
 
-            dots_text = font_start.render(dots, True, self.WHITE)
+            dots_text = assets.text(dots, 40)
             dots_rect = dots_text.get_rect(
                 left=waiting_rect.right + 10, centery=waiting_rect.centery)
 
-            self.window.blit(waiting_text, waiting_rect)
-            self.window.blit(dots_text, dots_rect)
-            self.window.blit(ip_text, ip_rect)
+            self.renderer.blit(waiting_text, waiting_rect)
+            self.renderer.blit(dots_text, dots_rect)
+            self.renderer.blit(ip_text, ip_rect)
 
             if self.connection_established:
                 print(f"Network: {self.network}")
@@ -240,29 +277,33 @@ class StartScreen:
             self.render_settings()
 
         else:  # Other game states (including the error state)
-            font_error = pygame.font.Font(None, 40)
-            error_text = font_error.render(
-                f"Invalid game state: \"{self.game_state}\"", True, self.RED)
+            error_text = assets.text(f"Invalid game state: \"{self.game_state}\"", 40, self.RED)
             error_rect = error_text.get_rect(
                 center=(self.window_width // 2, self.window_height // 2))
 
             # Render the error message
-            self.window.blit(error_text, error_rect)
+            self.renderer.blit(error_text, error_rect)
 
             # Render the "Back to Main Menu" button
-            pygame.draw.rect(self.window, self.GRAY,
-                             self.invalid_state_button_rect)
-            pygame.draw.rect(self.window, self.BLACK,
-                             self.invalid_state_button_rect.inflate(6, 6))
-            self.window.blit(self.invalid_state_button_text,
-                             self.invalid_state_button_rect.move(10, 10))
-
-        pygame.display.flip()
+            self.renderer.rect(self.GRAY, self.invalid_state_button_rect)
+            self.renderer.rect(self.BLACK, self.invalid_state_button_rect.inflate(6, 6))
+            self.renderer.blit(self.invalid_state_button_text, self.invalid_state_button_rect.move(10, 10))
+
+        self.renderer.present()
         return None
 
-    def handle_input(self) -> Optional[Network]:
-        # Event handling
-        for event in pygame.event.get():
+    def handle_input(self, events: List[pygame.event.Event]) -> Optional[Network]:
+        """
+        Handles the events of the screen
+
+        Args:
+            events (List[pygame.event.Event]): the events since the last call
+
+        Returns:
+            Network: The network object, if the player joins a game
+        """
+        for event in events:
+            self.pacer.handle_event(event)
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -283,7 +324,7 @@ class StartScreen:
                             # Add code for selected option action
 
                 if event.type == pygame.MOUSEBUTTONUP:
-                    mouse_pos = pygame.mouse.get_pos()
+                    mouse_pos = self.renderer.mouse_position()
                     for index, option_rect in enumerate(self.option_rects):
                         if option_rect.collidepoint(mouse_pos):
                             self.selected_option = index
@@ -293,7 +334,7 @@ class StartScreen:
                                 self.options[self.selected_option])
                             # Add code for selected option action
 
-            elif self.game_state == "join_game":
+            elif self.game_state in ("join_game", "watch_game"):
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_BACKSPACE:
                         # Remove the last character
@@ -301,8 +342,13 @@ class StartScreen:
                     elif event.key == pygame.K_RETURN:
                         print(
                             f"Connecting to server with IP: {self.ip_address}")
-                        self.network: Network = Network(
-                            server_ip=self.ip_address)
+                        if self.game_state == "watch_game":
+                            # Spectators only exist on the dedicated server, over tcp
+                            self.network: Network = Network(
+                                server_ip=self.ip_address, spectate_match=0, **self.network_options)
+                        else:
+                            self.network: Network = Network(
+                                server_ip=self.ip_address, transport=self.transport, **self.network_options)
                         return self.network
                         # Add code for connecting to the server with the entered IP address
                     else:
@@ -315,7 +361,7 @@ class StartScreen:
 
             elif self.game_state == "settings":
                 if event.type == pygame.MOUSEBUTTONUP:
-                    mouse_pos = pygame.mouse.get_pos()
+                    mouse_pos = self.renderer.mouse_position()
                     if self.save_button_rect.collidepoint(mouse_pos):
                         self.save_settings()
 
@@ -345,6 +391,7 @@ class StartScreen:
         Switches to the selected option:
         - start_game: creates a server and waits for a connection, then starts the game
         - join_game: allows the user to enter an IP address to connect to
+        - watch_game: allows the user to enter the IP address of a dedicated server to watch a match
         - settings: allows the user to change the game settings
         - exit: exits the game
 
@@ -360,7 +407,7 @@ class StartScreen:
                     target=self.wait_for_connection)
                 self.network_thread.daemon = True
                 self.network_thread.start()
-            case "join_game":
+            case "join_game" | "watch_game":
                 pass
             case "settings":
                 self.reset_settings_input()
@@ -374,11 +421,14 @@ class StartScreen:
             self.game_state = option_to_state
 
     def wait_for_connection(self) -> None:
-        self.network = Network(is_server=True, start_now=False)
-        self.ip_address = self.network.start_socket()
+        with tracing.span("StartScreen.wait_for_connection"):
+            self.network = Network(is_server=True, start_now=False, transport=self.transport,
+                                   **self.network_options)
+            self.ip_address = self.network.start_socket()
 
-        self.network.accept_connection()
+            self.network.accept_connection()
         self.connection_established = True
+        post_network_event()  # the start screen sleeps until an event arrives
 
     def handle_setting_input(self, input_rect: pygame.Rect, attribute_name: str, type: str = "int"):
         """
@@ -393,7 +443,19 @@ class StartScreen:
 
         active: bool = True
         while active:
-            for event in pygame.event.get():
+            # Nothing changes without input, so the field is only drawn again after events
+            if self.pacer.redraw:
+                self.pacer.redraw = False
+                self.renderer.begin()
+
+                self.render_settings()
+                # Highlight the active input field
+                self.renderer.rect(self.YELLOW, input_rect, 2)
+                self.renderer.present()
+                self.clock.tick(MAX_MENU_FPS)
+
+            for event in self.pacer.wait(IDLE_TIMEOUT_MS):
+                self.pacer.handle_event(event)
                 if event.type == pygame.QUIT:
                     pygame.quit()
                     sys.exit()
@@ -427,58 +489,46 @@ class StartScreen:
                                         self, attribute_name) + event.unicode)
 
                 elif event.type == pygame.MOUSEBUTTONUP:
-                    mouse_pos = pygame.mouse.get_pos()
+                    mouse_pos = self.renderer.mouse_position()
                     if not input_rect.collidepoint(mouse_pos):
                         active = False
 
-            self.window.fill(self.BLACK)
-
-            self.render_settings()
-            # Highlight the active input field
-            pygame.draw.rect(self.window, self.YELLOW, input_rect, 2)
-            pygame.display.flip()
-            self.clock.tick(60)
-
     def render_settings(self):
         """
         Render the settings screen, including the input fields
         """
-        font_settings = pygame.font.Font(None, 40)
-        settings_text = font_settings.render("Settings", True, self.WHITE)
+        assets: AssetCache = get_assets()
+        settings_text = assets.text("Settings", 40)
         settings_rect = settings_text.get_rect(
             center=(self.window_width // 2, self.window_height // 2 - 250))
-        self.window.blit(settings_text, settings_rect)
+        self.renderer.blit(settings_text, settings_rect)
 
         label_width: int = self.window_width // 2 - 250  # Width of the labels
         input_width: int = self.window_width // 2 - 50  # Width of the input fields
 
-        font_input = pygame.font.Font(None, 32)
-
         for i, data in enumerate(self.settings_data):
-            label = font_input.render(data.text, True, self.WHITE)
+            label = assets.text(data.text, 32)
             label_rect = label.get_rect(
                 midleft=(label_width, self.window_height // 2 - 150 + (50 * i)))
-            input = font_input.render(
-                str(getattr(self, data.input)), True, self.WHITE)
+            input = assets.text(str(getattr(self, data.input)), 32)
             input_height: int = self.window_height // 2 - \
                 150 + (i * 50) - input.get_height()//2
 
             data.rect = pygame.Rect(
                 input_width, input_height - 5, self.fixed_length, input.get_height() + 5)
-            pygame.draw.rect(self.window, self.WHITE, data.rect, 2)
+            self.renderer.rect(self.WHITE, data.rect, 2)
 
-            self.window.blit(label, label_rect)
-            self.window.blit(input, (input_width + 5, input_height))
+            self.renderer.blit(label, label_rect)
+            self.renderer.blit(input, (input_width + 5, input_height))
 
         # Render the save button
         self.save_button_rect = pygame.Rect(
             self.window_width // 2 - 100, self.window_height - 100, 200, 50)
-        save_button_text = font_input.render("Save Changes", True, self.WHITE)
+        save_button_text = assets.text("Save Changes", 32)
 
-        pygame.draw.rect(self.window, self.GRAY, self.save_button_rect)
-        pygame.draw.rect(self.window, self.BLACK,
-                         self.save_button_rect.inflate(6, 6))
-        self.window.blit(save_button_text, self.save_button_rect.move(10, 10))
+        self.renderer.rect(self.GRAY, self.save_button_rect)
+        self.renderer.rect(self.BLACK, self.save_button_rect.inflate(6, 6))
+        self.renderer.blit(save_button_text, self.save_button_rect.move(10, 10))
 
         return
 
@@ -508,8 +558,8 @@ class StartScreen:
 
         if update_window is True:
             print("resizing window")
-            self.window = pygame.display.set_mode(
-                (self.window_width, self.window_height))
+            self.renderer.set_size((self.window_width, self.window_height))
+            self.layout_options()
 
     def reset_settings_input(self):
 
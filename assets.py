@@ -0,0 +1,138 @@
+"""
+Cache for what the render code needs every frame: fonts, rendered texts and the sprites of the ball and paddles.
+
+Creating a font or rendering a text takes much longer than blitting the result, and most texts (the menu, the
+labels, the score) stay the same for many frames. Fonts and texts are kept in LRU caches with a maximum size,
+so texts that change all the time (e.g. the ip address while typing) can not fill the memory.
+
+All render code shares the cache from get_assets(). It needs pygame to be initialized. The sprites are converted
+to the format of the display if there is one (the texture renderer has none, it uploads them as textures).
+After pygame.quit() the cached surfaces are invalid, call clear() then.
+"""
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+import pygame
+
+MAX_FONTS: int = 16
+MAX_TEXTS: int = 256
+WHITE: Tuple[int, int, int] = (255, 255, 255)
+
+
+def convert(surface: pygame.Surface) -> pygame.Surface:
+    """
+    Converts the surface to the format of the display for fast blits, if a display mode is set.
+    """
+    if pygame.display.get_surface() is None:
+        return surface
+    return surface.convert()
+
+
+class LRUCache:
+    """
+    A dict with a maximum size, adding to a full cache removes the entry that was used the longest time ago.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size: int = max_size
+        self.entries: OrderedDict = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value: Optional[Any] = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class AssetCache:
+    def __init__(self, max_fonts: int = MAX_FONTS, max_texts: int = MAX_TEXTS):
+        """
+        Args:
+            max_fonts (int, optional): the number of font sizes that are kept
+            max_texts (int, optional): the number of rendered texts that are kept
+        """
+        self.fonts: LRUCache = LRUCache(max_fonts)
+        self.texts: LRUCache = LRUCache(max_texts)
+        self.sprites: dict = {}  # only a few, they are never evicted
+
+    def font(self, size: int) -> pygame.font.Font:
+        """
+        Returns the default font in this size.
+        """
+        font: Optional[pygame.font.Font] = self.fonts.get(size)
+        if font is None:
+            font = pygame.font.Font(None, size)
+            self.fonts.put(size, font)
+        return font
+
+    def text(self, text: str, size: int, color: Tuple[int, int, int] = WHITE) -> pygame.Surface:
+        """
+        Returns the text rendered with the default font (antialiased), like font.render(text, True, color).
+        The surface is shared, do not draw on it.
+        """
+        key: tuple = (text, size, color)
+        surface: Optional[pygame.Surface] = self.texts.get(key)
+        if surface is None:
+            surface = self.font(size).render(text, True, color)
+            self.texts.put(key, surface)
+        return surface
+
+    def ball(self, size: int, color: Tuple[int, int, int] = WHITE) -> pygame.Surface:
+        """
+        Returns a ball with the diameter size, blit it at (x - size // 2, y - size // 2) for the center x, y.
+        Black is transparent (color key), a color key blit is faster than one with per pixel alpha.
+        """
+        key: tuple = ("ball", size, color)
+        sprite: Optional[pygame.Surface] = self.sprites.get(key)
+        if sprite is None:
+            sprite = pygame.Surface((size, size))
+            pygame.draw.circle(sprite, color, (size // 2, size // 2), size // 2)
+            sprite = convert(sprite)
+            sprite.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+            self.sprites[key] = sprite
+        return sprite
+
+    def paddle(self, width: int, height: int, color: Tuple[int, int, int] = WHITE) -> pygame.Surface:
+        key: tuple = ("paddle", width, height, color)
+        sprite: Optional[pygame.Surface] = self.sprites.get(key)
+        if sprite is None:
+            sprite = pygame.Surface((width, height))
+            sprite.fill(color)
+            sprite = convert(sprite)
+            self.sprites[key] = sprite
+        return sprite
+
+    def clear(self):
+        self.fonts.clear()
+        self.texts.clear()
+        self.sprites.clear()
+
+
+_assets: Optional[AssetCache] = None
+
+
+def get_assets() -> AssetCache:
+    """
+    Returns the cache all render code shares.
+    """
+    global _assets
+    if _assets is None:
+        _assets = AssetCache()
+    return _assets
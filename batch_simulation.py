@@ -0,0 +1,179 @@
+"""
+Many matches at once with NumPy, for balance tests (sweeps over the speeds and the field size) and bots.
+
+The state of all matches is stored as one array per value (ball x, y, dx, dy, paddles, scores, ...) and
+every tick steps all of them with the same rules as PongSimulation: swept collision with the walls and
+paddles, the calculate_ball_angle bounce model, scoring and resets. Only the random numbers come from
+NumPy instead of DeterministicRandom, so a match does not repeat a PongSimulation with the same seed.
+
+Needs numpy (pip install numpy), the game itself does not.
+"""
+from typing import Optional
+
+import numpy as np
+
+from protocol import GameStateCode
+from rollback import INPUT_DOWN, INPUT_SPACE, INPUT_UP
+from simulation import BASE_TICK_RATE, MAX_BOUNCES, WINNING_SCORE
+
+START: int = int(GameStateCode.START)
+PLAYING: int = int(GameStateCode.PLAYING)
+GAME_OVER: int = int(GameStateCode.GAME_OVER)
+
+# What the ball hit first in a step of the swept collision
+_NOTHING, _WALL, _LEFT_PADDLE, _RIGHT_PADDLE = 0, 1, 2, 3
+
+
+class BatchSimulation:
+    def __init__(self, count: int, width=800, height=600, player_speed=8, ball_speed=5, tick_rate: int = 60,
+                 seed: Optional[int] = None):
+        """
+        The settings can be a number for all matches or an array with one value per match.
+
+        Args:
+            count (int): the number of matches
+            width (optional): the width of the field
+            height (optional): the height of the field
+            player_speed (optional): paddle speed in pixels per 1/60 second
+            ball_speed (optional): ball speed in pixels per 1/60 second
+            tick_rate (int, optional): ticks per second
+            seed (int, optional): seed of the random numbers
+        """
+        self.count: int = count
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+
+        def per_match(value) -> np.ndarray:
+            return np.broadcast_to(np.asarray(value, dtype=np.float64), (count,)).copy()
+
+        self.width: np.ndarray = per_match(width)
+        self.height: np.ndarray = per_match(height)
+        self.tick_rate: int = tick_rate
+        self.tick_scale: float = BASE_TICK_RATE / tick_rate
+        self.paddle_step: np.ndarray = per_match(player_speed) * self.tick_scale
+        self.ball_step: np.ndarray = per_match(ball_speed) * self.tick_scale
+        self.ball_size: int = 20
+
+        self.paddle1_pos: np.ndarray = self.height // 2
+        self.paddle2_pos: np.ndarray = self.height // 2
+        self.ball_x: np.ndarray = np.zeros(count)
+        self.ball_y: np.ndarray = np.zeros(count)
+        self.ball_dx: np.ndarray = np.zeros(count)
+        self.ball_dy: np.ndarray = np.zeros(count)
+        self.player1_score: np.ndarray = np.zeros(count, dtype=np.int32)
+        self.player2_score: np.ndarray = np.zeros(count, dtype=np.int32)
+        self.game_state: np.ndarray = np.full(count, START, dtype=np.int8)
+
+        self.reset_ball(np.ones(count, dtype=bool))
+
+    @staticmethod
+    def calculate_ball_angles(paddle_pos: np.ndarray, ball_pos: np.ndarray) -> np.ndarray:
+        """
+        PongSimulation.calculate_ball_angle for arrays.
+        """
+        normalized_relative_y: np.ndarray = (ball_pos - paddle_pos - 25) / 25
+        return -np.sin(normalized_relative_y * np.pi / 2) * (np.pi * 3 / 4)
+
+    def reset_ball(self, mask: np.ndarray):
+        """
+        Resets the ball of the selected matches to the center and gives it a random direction.
+        """
+        self.ball_x[mask] = (self.width // 2)[mask]
+        self.ball_y[mask] = (self.height // 2)[mask]
+        step: np.ndarray = self.ball_step[mask]
+        self.ball_dx[mask] = np.where(self.rng.random(step.size) < 0.5, step, -step)
+        self.ball_dy[mask] = np.where(self.rng.random(step.size) < 0.5, step, -step)
+
+    def step(self, input1, input2):
+        """
+        Simulates one tick of all matches.
+
+        Args:
+            input1: the input bits of player 1, a number or one per match (see rollback.py)
+            input2: the input bits of player 2
+        """
+        input1 = np.broadcast_to(np.asarray(input1), (self.count,))
+        input2 = np.broadcast_to(np.asarray(input2), (self.count,))
+        playing: np.ndarray = self.game_state == PLAYING
+
+        space: np.ndarray = ((input1 | input2) & INPUT_SPACE) != 0
+        restart: np.ndarray = space & (self.game_state == GAME_OVER)
+        self.game_state[space & (self.game_state == START)] = PLAYING
+        if restart.any():
+            self.game_state[restart] = START
+            self.player1_score[restart] = 0
+            self.player2_score[restart] = 0
+            self.reset_ball(restart)
+
+        self.move_paddles(input1, input2, playing)
+        self.step_ball(playing)
+
+    def move_paddles(self, input1: np.ndarray, input2: np.ndarray, playing: np.ndarray):
+        bottom: np.ndarray = self.height - 50
+        for paddle, inputs in ((self.paddle1_pos, input1), (self.paddle2_pos, input2)):
+            # In the same order as PongSimulation, the down check sees the position after moving up
+            paddle -= np.where(playing & ((inputs & INPUT_UP) != 0) & (paddle > 0), self.paddle_step, 0)
+            paddle += np.where(playing & ((inputs & INPUT_DOWN) != 0) & (paddle < bottom), self.paddle_step, 0)
+
+    def step_ball(self, playing: np.ndarray):
+        """
+        Moves the balls of the playing matches, see PongSimulation.step_ball. Every round of the loop handles
+        the next hit of all balls that are still moving in this tick.
+        """
+        top: float = self.ball_size // 2
+        bottom: np.ndarray = self.height - 1 - self.ball_size // 2
+        left_paddle: float = 30
+        right_paddle: np.ndarray = self.width - 50
+        x, y, dx, dy = self.ball_x, self.ball_y, self.ball_dx, self.ball_dy
+
+        remaining: np.ndarray = np.where(playing, 1.0, 0.0)
+        moving: np.ndarray = playing.copy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for _ in range(MAX_BOUNCES):
+                hit_time: np.ndarray = remaining.copy()
+                hit: np.ndarray = np.full(self.count, _NOTHING, dtype=np.int8)
+
+                wall_time: np.ndarray = np.maximum(np.where(
+                    dy < 0, (top - y) / dy, np.where(dy > 0, (bottom - y) / dy, np.inf)), 0)
+                first: np.ndarray = moving & (wall_time <= hit_time)
+                hit_time[first] = wall_time[first]
+                hit[first] = _WALL
+
+                # A ball that is on or behind the paddle column already hit or missed the paddle
+                towards_left: np.ndarray = (dx < 0) & (x > left_paddle)
+                towards_right: np.ndarray = (dx > 0) & (x < right_paddle)
+                paddle_time: np.ndarray = np.maximum(np.where(
+                    towards_left, (left_paddle - x) / dx,
+                    np.where(towards_right, (right_paddle - x) / dx, np.inf)), 0)
+                first = moving & (paddle_time <= hit_time)
+                hit_time[first] = paddle_time[first]
+                hit[first] = np.where(towards_left, _LEFT_PADDLE, _RIGHT_PADDLE)[first]
+
+                x += dx * hit_time
+                y += dy * hit_time
+                remaining -= hit_time
+                moving &= hit != _NOTHING
+                if not moving.any():
+                    break
+
+                wall: np.ndarray = hit == _WALL
+                dy[wall] *= -1
+
+                paddle_pos: np.ndarray = np.where(hit == _LEFT_PADDLE, self.paddle1_pos, self.paddle2_pos)
+                caught: np.ndarray = (hit >= _LEFT_PADDLE) & (paddle_pos <= y) & (y < paddle_pos + 50)
+                if caught.any():
+                    angles: np.ndarray = self.calculate_ball_angles(paddle_pos[caught], y[caught])
+                    direction: np.ndarray = np.where(hit[caught] == _LEFT_PADDLE, 1, -1)
+                    dx[caught] = direction * np.abs(dx[caught])
+                    dy[caught] = (-np.sin(angles) * self.ball_step[caught]
+                                  + self.rng.uniform(-1, 1, angles.size) * self.tick_scale)
+
+        left_out: np.ndarray = playing & (x < 0)
+        right_out: np.ndarray = playing & (x > self.width)
+        self.player2_score += left_out
+        self.player1_score += right_out
+        scored: np.ndarray = left_out | right_out
+        if scored.any():
+            self.reset_ball(scored)
+
+        over: np.ndarray = playing & ((self.player1_score >= WINNING_SCORE) | (self.player2_score >= WINNING_SCORE))
+        self.game_state[over] = GAME_OVER
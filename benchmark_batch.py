@@ -0,0 +1,86 @@
+"""
+Compares stepping many matches one by one with PongSimulation and all at once with BatchSimulation.
+In both, two bots that follow the ball play each other, both aim next to the ball now and then.
+Reported are the match-ticks per second and the share of the points player 1 scored, which should be
+about the same in both, because the rules are the same.
+
+Usage: python benchmark_batch.py [ticks]     (e.g. 3000)
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+from batch_simulation import PLAYING, BatchSimulation
+from headless import follow_ball
+from rollback import INPUT_DOWN, INPUT_SPACE, INPUT_UP
+from simulation import PongSimulation
+
+SCALAR_MATCHES: int = 100
+BATCH_SIZES: tuple = (100, 1_000, 10_000, 100_000)
+
+
+def miss1(tick: int) -> float:
+    return 40 if tick % 700 < 200 else 0
+
+
+def miss2(tick: int) -> float:
+    return 40 if tick % 600 < 300 else 0
+
+
+def follow_ball_batch(batch: BatchSimulation, paddle_pos: np.ndarray, miss: float = 0) -> np.ndarray:
+    """
+    headless.follow_ball for all matches of the batch.
+    """
+    target: np.ndarray = batch.ball_y + miss - 25
+    inputs: np.ndarray = np.where(target < paddle_pos - batch.paddle_step, INPUT_UP,
+                                  np.where(target > paddle_pos + batch.paddle_step, INPUT_DOWN, 0))
+    return np.where(batch.game_state == PLAYING, inputs, INPUT_SPACE)
+
+
+def run_scalar(count: int, ticks: int) -> tuple:
+    seeds: random.Random = random.Random(1)
+    matches: list = [PongSimulation(seed=seeds.getrandbits(32)) for _ in range(count)]
+    points: list = [0, 0]
+    start: float = time.perf_counter()
+    for tick in range(ticks):
+        for match in matches:
+            match.step(follow_ball(match, match.paddle1_pos, miss1(tick)),
+                       follow_ball(match, match.paddle2_pos, miss2(tick)))
+    duration: float = time.perf_counter() - start
+    for match in matches:
+        points[0] += match.player1_score
+        points[1] += match.player2_score
+    return duration, points
+
+
+def run_batch(count: int, ticks: int) -> tuple:
+    batch: BatchSimulation = BatchSimulation(count, seed=1)
+    start: float = time.perf_counter()
+    for tick in range(ticks):
+        batch.step(follow_ball_batch(batch, batch.paddle1_pos, miss1(tick)),
+                   follow_ball_batch(batch, batch.paddle2_pos, miss2(tick)))
+    duration: float = time.perf_counter() - start
+    return duration, [int(batch.player1_score.sum()), int(batch.player2_score.sum())]
+
+
+def report(name: str, count: int, ticks: int, result: tuple) -> float:
+    duration, points = result
+    rate: float = count * ticks / duration
+    share: float = points[0] / max(sum(points), 1)
+    print(f"{name:<7} {count:>7} matches   {rate:>13,.0f} match-ticks/s   "
+          f"{sum(points) / count:5.2f} points/match, {share:.1%} for player 1")
+    return rate
+
+
+def main():
+    ticks: int = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    scalar_rate: float = report("scalar", SCALAR_MATCHES, ticks, run_scalar(SCALAR_MATCHES, ticks))
+    for count in BATCH_SIZES:
+        rate: float = report("batch", count, ticks, run_batch(count, ticks))
+        print(f"{'':<7} {rate / scalar_rate:.1f}x the scalar path")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Checks the round trip time and the clock offset that the PINGs measure (see clock_sync.py) against the real ones.
+Two peers talk through the delaying proxy of benchmark_handshake.py, the clock of the client is shifted by skew,
+so the server should see an offset of +skew and the client one of -skew. Both only run their NetworkWorker.
+Before that it checks that FrameReader.read_latest hands every PING and PONG to the network exactly once.
+
+Usage: python benchmark_clock.py [rtt ms] [skew ms] [seconds]     (e.g. 100 2500 5)
+"""
+import socket
+import sys
+import threading
+import time
+from typing import List
+
+import protocol
+from benchmark_handshake import DelayProxy
+from clock_sync import ClockSync
+from framing import FRAME_HEADER, FrameReader
+from network import Network
+from network_worker import NetworkWorker
+from protocol import MessageType
+
+PING_INTERVAL: float = 0.1
+
+
+def check_read_latest(rounds: int = 500):
+    """
+    Sends rounds of state, PING, state, PONG frames and reads them with read_latest. The buffer of the reader is
+    small, so read_latest often keeps the newest state while more data waits and parses the rest again later.
+    The states have to come out in order and every control frame has to be handled once.
+    """
+    sender, receiver = socket.socketpair()
+    handled: List[float] = []
+
+    def control(frame: memoryview) -> bool:
+        if not protocol.is_control(frame):
+            return False
+        handled.append(protocol.decode_ping(frame) if frame[1] == MessageType.PING else protocol.decode_pong(frame)[0])
+        return True
+
+    messages: List[bytes] = []
+    for number in range(rounds):
+        messages += [protocol.encode_paddle(2 * number), protocol.encode_ping(number),
+                     protocol.encode_paddle(2 * number + 1), protocol.encode_pong(number + 0.5, 0.0, 0.0)]
+    sender.sendall(b"".join(FRAME_HEADER.pack(len(message)) + message for message in messages))
+
+    reader: FrameReader = FrameReader(receiver, capacity=100, control=control)
+    positions: List[float] = []
+    while not positions or positions[-1] < 2 * rounds - 1:
+        positions.append(protocol.decode_paddle(reader.read_latest())[0])
+    sender.close()
+    receiver.close()
+    assert positions == sorted(set(positions)), "read_latest returned a state twice or out of order"
+    expected: List[float] = [time for number in range(rounds) for time in (number, number + 0.5)]
+    assert handled == expected, f"{len(handled)} control frames handled, {len(expected)} sent"
+    print(f"read_latest: {len(positions)} of {2 * rounds} states, {len(handled)} control frames handled once")
+
+
+def report(name: str, network: Network, expected_offset: float):
+    clock: ClockSync = network.clock
+    if clock.rtt is None:
+        print(f"{name:>7}: no PONG yet")
+        return
+    print(f"{name:>7}: {clock.samples:>3} samples, {clock}, "
+          f"offset error {(clock.offset - expected_offset) * 1000:+.2f} ms")
+
+
+def main():
+    rtt: float = (float(sys.argv[1]) if len(sys.argv) > 1 else 100.0) / 1000
+    skew: float = (float(sys.argv[2]) if len(sys.argv) > 2 else 2500.0) / 1000
+    seconds: float = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+    check_read_latest()
+
+    server: Network = Network(is_server=True, start_now=False, ping_interval=PING_INTERVAL)
+    server.host = "127.0.0.1"
+    server.port = 0
+    server.start_socket()
+    proxy: DelayProxy = DelayProxy(server.port, rtt / 2)
+    accept = threading.Thread(target=server.accept_connection)
+    accept.start()
+    client: Network = Network(server_ip="127.0.0.1", start_now=False, ping_interval=PING_INTERVAL)
+    client.clock = ClockSync(lambda: time.monotonic() + skew)
+    client.port = proxy.port
+    client.connect_to_server()
+    accept.join()
+
+    workers = [NetworkWorker(network, lambda message: None) for network in (server, client)]
+    for worker in workers:
+        worker.start()
+    print(f"round trip time {rtt * 1000:.0f} ms, clock of the client {skew * 1000:+.0f} ms")
+    for second in range(int(seconds)):
+        time.sleep(1)
+        print(f"after {second + 1} s")
+        report("server", server, skew)
+        report("client", client, -skew)
+    for worker in workers:
+        worker.stop()
+    client.close_connection()
+    server.close_connection()
+    proxy.listener.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Compares the binary codec from protocol.py with the old pickle path,
+in bytes per frame and time to encode and decode one snapshot.
+Then streams a simulated rally through the delta codec from snapshot_delta.py and reports
+the bytes per tick and the compression ratio.
+
+Usage: python benchmark_codec.py
+"""
+import pickle
+import timeit
+
+import protocol
+from SendData import SendData
+from snapshot_delta import SnapshotDecoder, SnapshotEncoder
+
+ITERATIONS: int = 200_000
+RALLY_TICKS: int = 6000
+ACK_DELAY: int = 3  # ticks until the server gets the acknowledgement of a snapshot
+
+
+def measure(name: str, encode, decode) -> None:
+    message = encode()
+    encode_time: float = timeit.timeit(encode, number=ITERATIONS) / ITERATIONS
+    decode_time: float = timeit.timeit(lambda: decode(message), number=ITERATIONS) / ITERATIONS
+    print(f"{name:<8} {len(message):>6} bytes/frame   encode {encode_time * 1e6:6.2f} us   "
+          f"decode {decode_time * 1e6:6.2f} us")
+
+
+def rally(ticks: int):
+    """
+    Yields the snapshots of a simulated rally: the ball bounces between the walls, the server paddle
+    follows it some of the time and a point is scored now and then.
+    """
+    width, height = 800, 600
+    ball_x, ball_y, ball_dx, ball_dy = width / 2, height / 2, 5, 3.7
+    paddle: float = height / 2
+    score: int = 0
+    for tick in range(ticks):
+        ball_x += ball_dx
+        ball_y += ball_dy
+        if ball_x < 30 or ball_x > width - 50:
+            ball_dx *= -1
+        if ball_y < 10 or ball_y > height - 10:
+            ball_dy *= -1
+        if (tick // 40) % 3 == 0:  # the player does not move all the time
+            paddle += 8 if ball_y > paddle + 25 else -8
+        if tick % 900 == 899:
+            score += 1
+        yield SendData(paddle, "playing", ball_x, ball_y, score, 0)
+
+
+def measure_rally() -> None:
+    encoder: SnapshotEncoder = SnapshotEncoder()
+    decoder: SnapshotDecoder = SnapshotDecoder()
+    out: SendData = SendData(0, "start", 0, 0, 0, 0)
+    acks: list = []
+    pickle_bytes: int = 0
+    codec_bytes: int = 0
+    max_error: float = 0
+
+    for data in rally(RALLY_TICKS):
+        pickle_bytes += len(pickle.dumps(data))
+        codec_bytes += len(protocol.encode_snapshot(data))
+        message: bytes = encoder.encode(data)
+        decoder.decode(message, out)
+        max_error = max(max_error, abs(out.ball_x - data.ball_x), abs(out.ball_y - data.ball_y))
+        acks.append(decoder.acked_tick)
+        if len(acks) > ACK_DELAY:
+            encoder.acknowledge(acks.pop(0))
+
+    delta_bytes: float = encoder.bytes_sent / RALLY_TICKS
+    print(f"\nrally of {RALLY_TICKS} ticks, acknowledgements {ACK_DELAY} ticks late:")
+    print(f"pickle   {pickle_bytes / RALLY_TICKS:6.2f} bytes/tick")
+    print(f"codec    {codec_bytes / RALLY_TICKS:6.2f} bytes/tick")
+    print(f"delta    {delta_bytes:6.2f} bytes/tick   max position error {max_error:.3f} px")
+    print(f"compression ratio: {pickle_bytes / RALLY_TICKS / delta_bytes:.1f}x vs pickle, "
+          f"{codec_bytes / RALLY_TICKS / delta_bytes:.1f}x vs codec")
+
+    message = encoder.encode(data)
+    encode_time: float = timeit.timeit(lambda: encoder.encode(data), number=ITERATIONS) / ITERATIONS
+    decode_time: float = timeit.timeit(lambda: decoder.decode(message, out), number=ITERATIONS) / ITERATIONS
+    print(f"delta    encode {encode_time * 1e6:6.2f} us   decode {decode_time * 1e6:6.2f} us")
+
+
+def main():
+    data: SendData = SendData(284.0, "playing", 412.0, 133.5, 3, 7)
+
+    # Old path: pickle.dumps on a new SendData every frame, pickle.loads on the other side
+    measure(
+        "pickle",
+        lambda: pickle.dumps(SendData(data.player_position, data.game_state, data.ball_x,
+                             data.ball_y, data.server_score, data.client_score)),
+        pickle.loads
+    )
+
+    # New path: pack into a reused buffer, decode into a reused SendData
+    buffer: bytearray = bytearray(protocol.SNAPSHOT.size)
+    out: SendData = SendData(0, "start", 0, 0, 0, 0)
+    measure(
+        "codec",
+        lambda: protocol.encode_snapshot(data, buffer),
+        lambda message: protocol.decode_snapshot(message, out)
+    )
+
+    measure_rally()
+
+
+if __name__ == "__main__":
+    main()
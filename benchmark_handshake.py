@@ -0,0 +1,126 @@
+"""
+Measures how long the session handshake takes over a link with latency, from the connect of the client until
+the client has the settings (it could draw its first frame) and until the server has the reply.
+A proxy on localhost delays everything by half the round trip time in each direction, the tcp connect itself
+is not delayed. "legacy" is the handshake before protocol version 9: seven settings, each one acknowledged.
+
+Usage: python benchmark_handshake.py [rtt ms] [runs]     (e.g. 100 5)
+"""
+import socket
+import sys
+import threading
+import time
+from queue import SimpleQueue
+from typing import List, Tuple
+
+import protocol
+from MatchSettings import MatchSettings
+from network import Network
+
+LEGACY_SETTINGS: int = 7
+
+
+class DelayProxy:
+    """
+    Forwards tcp connections to a port on localhost and delays every chunk in both directions.
+    """
+
+    def __init__(self, target_port: int, delay: float):
+        self.target_port: int = target_port
+        self.delay: float = delay
+        self.listener: socket.socket = socket.create_server(("127.0.0.1", 0))
+        self.port: int = self.listener.getsockname()[1]
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    def accept_loop(self):
+        while True:
+            client, _ = self.listener.accept()
+            server: socket.socket = socket.create_connection(("127.0.0.1", self.target_port))
+            for connection in (client, server):
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            for source, destination in ((client, server), (server, client)):
+                threading.Thread(target=self.pump, args=(source, destination), daemon=True).start()
+
+    def pump(self, source: socket.socket, destination: socket.socket):
+        chunks: SimpleQueue = SimpleQueue()
+
+        def send_later():
+            while True:
+                due, data = chunks.get()
+                time.sleep(max(0.0, due - time.perf_counter()))
+                if not data:
+                    destination.close()
+                    return
+                destination.sendall(data)
+
+        threading.Thread(target=send_later, daemon=True).start()
+        data: bytes = b"x"
+        while data:
+            try:
+                data = source.recv(4096)
+            except OSError:
+                data = b""
+            chunks.put((time.perf_counter() + self.delay, data))
+
+
+def measure(legacy: bool, rtt: float) -> Tuple[float, float]:
+    """
+    Runs one handshake through a new proxy.
+
+    Returns:
+        Tuple[float, float]: the seconds until the client and until the server are done
+    """
+    server: Network = Network(is_server=True, start_now=False)
+    server.host = "127.0.0.1"
+    server.port = 0
+    server.start_socket()
+    proxy: DelayProxy = DelayProxy(server.port, rtt / 2)
+    settings: MatchSettings = MatchSettings(800, 600, 8, 5, 60, player_name="Server")
+    server_done: List[float] = []
+
+    def serve():
+        server.accept_connection()
+        if legacy:
+            for value in range(LEGACY_SETTINGS):
+                server.send_data(protocol.encode_setting(protocol.SettingCode.MATCH_PORT, value))
+                server.receive_ack()
+        else:
+            server.handshake_server(settings)
+        server_done.append(time.perf_counter())
+
+    server_thread = threading.Thread(target=serve)
+    server_thread.start()
+
+    client: Network = Network(server_ip="127.0.0.1", start_now=False)
+    client.port = proxy.port
+    started: float = time.perf_counter()
+    client.connect_to_server()
+    if legacy:
+        for _ in range(LEGACY_SETTINGS):
+            protocol.decode_setting(client.receive_data())
+            client.send_ack()
+    else:
+        client.handshake_client("Client")
+    client_done: float = time.perf_counter()
+    server_thread.join()
+    client.close_connection()
+    server.close_connection()
+    proxy.listener.close()
+    return client_done - started, server_done[0] - started
+
+
+def main():
+    rtt: float = (float(sys.argv[1]) if len(sys.argv) > 1 else 100.0) / 1000
+    runs: int = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    print(f"round trip time {rtt * 1000:.0f} ms, {runs} runs")
+    print(f"{'handshake':>10} {'client ms':>10} {'client rtt':>11} {'server ms':>10} {'server rtt':>11}")
+    for legacy in (True, False):
+        times: List[Tuple[float, float]] = [measure(legacy, rtt) for _ in range(runs)]
+        client: float = sum(t[0] for t in times) / runs
+        server: float = sum(t[1] for t in times) / runs
+        print(f"{'legacy' if legacy else 'single':>10} {client * 1000:>10.1f} {client / rtt:>11.2f} "
+              f"{server * 1000:>10.1f} {server / rtt:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
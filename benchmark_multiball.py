@@ -0,0 +1,73 @@
+"""
+Measures the chaos mode from 1 to 10k balls: the time of a whole tick, the time to find the balls that can
+touch with the grid and by comparing every pair (O(n^2), only up to BRUTE_FORCE_LIMIT balls),
+and the size of a snapshot with all balls.
+The field grows with the number of balls, so the balls are always about equally crowded.
+
+Usage: python benchmark_multiball.py [ticks]     (e.g. 200)
+"""
+import math
+import pickle
+import sys
+import time
+
+import numpy as np
+
+from SendData import SendData
+from simulation import PongSimulation
+from snapshot_delta import SnapshotEncoder
+
+BALL_COUNTS: tuple = (1, 10, 100, 1_000, 10_000)
+BRUTE_FORCE_LIMIT: int = 2_000
+COVERED: float = 0.05  # part of the field covered by balls
+
+
+def touching_pairs_brute_force(x: np.ndarray, y: np.ndarray, diameter: float) -> int:
+    distance_squared: np.ndarray = (x[:, None] - x[None, :]) ** 2 + (y[:, None] - y[None, :]) ** 2
+    return int(np.count_nonzero(np.triu(distance_squared < diameter * diameter, 1)))
+
+
+def main():
+    ticks: int = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{'balls':>6} {'field':>11} {'tick':>10} {'pairs grid':>11} {'pairs all':>11} {'snapshot':>10} "
+          f"{'pickle':>10}")
+    for count in BALL_COUNTS:
+        area: float = count * 20 * 20 / COVERED
+        width: int = max(800, int(math.sqrt(area * 4 / 3)))
+        height: int = width * 3 // 4
+        simulation: PongSimulation = PongSimulation(width, height, seed=1)
+        simulation.add_balls(count)
+        simulation.game_state = "playing"
+        balls = simulation.balls
+
+        start: float = time.perf_counter()
+        for _ in range(ticks):
+            simulation.step(0, 0)
+            simulation.game_state = "playing"  # keep playing, the score does not matter here
+        tick_time: float = (time.perf_counter() - start) / ticks
+
+        start = time.perf_counter()
+        for _ in range(ticks):
+            balls.grid.update(balls.x, balls.y)
+            balls.grid.pairs()
+        grid_time: float = (time.perf_counter() - start) / ticks
+
+        brute_force: str = "-"
+        if count <= BRUTE_FORCE_LIMIT:
+            repeats: int = max(1, ticks // 10)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                touching_pairs_brute_force(balls.x, balls.y, simulation.ball_size)
+            brute_force = f"{(time.perf_counter() - start) / repeats * 1000:.2f} ms"
+
+        snapshot: SendData = SendData(simulation.paddle1_pos, "playing", simulation.ball_x, simulation.ball_y,
+                                      0, 0, simulation.paddle2_pos, 0, balls.pack())
+        snapshot_size: int = len(SnapshotEncoder().encode(snapshot))
+        pickle_size: int = len(pickle.dumps(list(zip(balls.x.tolist(), balls.y.tolist()))))
+
+        print(f"{count:>6} {f'{width}x{height}':>11} {tick_time * 1000:>7.2f} ms {grid_time * 1000:>8.2f} ms "
+              f"{brute_force:>11} {snapshot_size:>8} B {pickle_size:>8} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Measures the cpu time per frame of the render code, without a window (SDL dummy video driver), with both
+backends of renderer.py: Game.render_game in every game state and the main menu and settings of StartScreen,
+at three window sizes. The surface backend runs with a full redraw every frame and with dirty rectangles
+(see dirty_rects.py), the texture backend with SDL's software renderer, like in CI.
+"scaled" draws the 800x600 game into a window of that size (the logical resolution of the texture backend).
+The ball and the paddles move every frame like in a game.
+With the dummy driver showing a frame costs almost nothing, with a real window a full flip costs more
+and the texture backend can use the gpu.
+
+Usage: python benchmark_render.py [frames] [balls]     (e.g. 500 1, more balls: the chaos mode)
+"""
+import os
+import sys
+import time
+
+import pygame
+
+from game import Game
+from renderer import SurfaceRenderer, TextureRenderer
+from simulation import PongSimulation
+from StartScreen import StartScreen
+
+RESOLUTIONS: tuple = ((800, 600), (1920, 1080), (2560, 1440))
+
+
+class RenderTarget:
+    """
+    Just what Game.render_game needs, without the network.
+    """
+
+    render_game = Game.render_game
+    interpolate_positions = Game.interpolate_positions
+
+    def __init__(self, width: int, height: int, renderer, balls: int = 1):
+        self.screen_width: int = width
+        self.screen_height: int = height
+        self.renderer = renderer
+        self.simulation: PongSimulation = PongSimulation(width, height, seed=1)
+        if balls > 1:
+            self.simulation.add_balls(balls)
+        self.previous_positions: tuple = self.simulation.positions()
+
+
+def measure(draw, frames: int) -> float:
+    """
+    Returns the milliseconds of cpu time per frame of draw(frame).
+    """
+    for frame in range(10):  # warm up, e.g. caches
+        draw(frame)
+    start: float = time.process_time()
+    for frame in range(frames):
+        draw(frame)
+    return (time.process_time() - start) / frames * 1000
+
+
+def measure_game(target: RenderTarget, game_state: str, frames: int) -> float:
+    width, height = target.screen_width, target.screen_height
+    target.simulation.game_state = game_state
+
+    def draw_game(frame: int):
+        simulation: PongSimulation = target.simulation
+        target.previous_positions = simulation.positions()
+        simulation.step_ball()
+        simulation.game_state = game_state  # the score must not end the game here
+        simulation.paddle1_pos = (frame * 3) % (height - 50)
+        simulation.paddle2_pos = height - 50 - (frame * 5) % (height - 50)
+        target.render_game(0.5)
+
+    return measure(draw_game, frames)
+
+
+def measure_menu(renderer, width: int, height: int, menu_state: str, frames: int) -> float:
+    start_screen: StartScreen = StartScreen(width, height, renderer, pygame.time.Clock())
+    start_screen.game_state = menu_state
+    return measure(lambda frame: start_screen.render_screen(), frames)
+
+
+def main():
+    frames: int = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    balls: int = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # read when the display is initialized
+    pygame.init()
+    print(f"{'screen':>10} {'resolution':>16} {'full ms':>9} {'dirty ms':>9} {'texture ms':>11}")
+    for width, height in RESOLUTIONS:
+        surface: SurfaceRenderer = SurfaceRenderer((width, height))
+        texture: TextureRenderer = TextureRenderer((width, height), software=True)
+        scaled: TextureRenderer = TextureRenderer((800, 600), window_size=(width, height), software=True)
+
+        for game_state in ("playing", "start", "game_over"):
+            times: list = []
+            for dirty in (False, True):
+                surface.dirty_rects.enabled = dirty
+                times.append(measure_game(RenderTarget(width, height, surface, balls), game_state, frames))
+            times.append(measure_game(RenderTarget(width, height, texture, balls), game_state, frames))
+            print(f"{game_state:>10} {f'{width}x{height}':>16} {times[0]:>9.3f} {times[1]:>9.3f} {times[2]:>11.3f}")
+        scaled_time: float = measure_game(RenderTarget(800, 600, scaled, balls), "playing", frames)
+        print(f"{'playing':>10} {f'scaled {width}x{height}':>16} {'-':>9} {'-':>9} {scaled_time:>11.3f}")
+
+        surface.dirty_rects.enabled = True
+        for menu_state in ("main_menu", "settings"):
+            print(f"{menu_state:>10} {f'{width}x{height}':>16} "
+                  f"{measure_menu(surface, width, height, menu_state, frames):>9.3f} {'-':>9} "
+                  f"{measure_menu(texture, width, height, menu_state, frames):>11.3f}")
+        texture.close()
+        scaled.close()
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
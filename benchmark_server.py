@@ -0,0 +1,99 @@
+"""
+Measures how many matches the dedicated server can run on one core: ticks all matches like TickScheduler,
+with bots that send their paddle like a client, and counts the time per tick.
+The connections are replaced by a buffer that only counts the bytes, so this is the cost of the simulation,
+the paddle messages and encoding the snapshots, without the sockets.
+With spectators, the time to send them the ticks is measured separately, like the server sends it after the
+snapshots of the players.
+
+Usage: python benchmark_server.py [matches] [ticks] [spectators per match]     (e.g. 1000 600 0)
+"""
+import sys
+import time
+
+import protocol
+from dedicated_server import Match, Player, Spectator
+from headless import follow_ball
+from prediction import SEQUENCE_MODULO
+from rollback import INPUT_DOWN, INPUT_UP
+from simulation import PongSimulation
+
+
+class CountingWriter:
+    """
+    Stands in for the asyncio.StreamWriter of a Player and counts what is sent.
+    """
+
+    def __init__(self):
+        self.transport = self
+        self.sent: int = 0
+
+    def write(self, data: bytes):
+        self.sent += len(data)
+
+    def get_write_buffer_size(self) -> int:
+        return 0
+
+    def get_extra_info(self, name: str) -> str:
+        return "bot"
+
+    def close(self):
+        pass
+
+
+def bot_paddle(simulation: PongSimulation, player: Player, paddle_pos: float, tick: int, miss: float):
+    """
+    Moves the paddle like a client with the follow_ball bot and stores the paddle message as received.
+    """
+    inputs: int = follow_ball(simulation, paddle_pos, miss)
+    if inputs & INPUT_UP:
+        paddle_pos -= simulation.paddle_step
+    elif inputs & INPUT_DOWN:
+        paddle_pos += simulation.paddle_step
+    message: bytes = protocol.encode_paddle(paddle_pos, tick, (tick + 1) % SEQUENCE_MODULO)
+    player.paddle = protocol.decode_paddle(message)
+
+
+def main():
+    count: int = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    ticks: int = int(sys.argv[2]) if len(sys.argv) > 2 else 600
+    spectators: int = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+    matches: list = []
+    for _ in range(count):
+        players: list = [Player(None, CountingWriter()), Player(None, CountingWriter())]
+        match: Match = Match(players[0], players[1], PongSimulation())
+        match.spectators = [Spectator(None, CountingWriter()) for _ in range(spectators)]
+        matches.append(match)
+
+    tick_time: float = 0
+    broadcast_time: float = 0
+    for tick in range(ticks):
+        for match in matches:
+            simulation: PongSimulation = match.simulation
+            bot_paddle(simulation, match.player1, simulation.paddle1_pos, tick, 30)
+            bot_paddle(simulation, match.player2, simulation.paddle2_pos, tick, -30)
+        start: float = time.perf_counter()
+        for match in matches:
+            match.tick(time.monotonic())
+        tick_time += time.perf_counter() - start
+        start = time.perf_counter()
+        for match in matches:
+            match.broadcast()
+        broadcast_time += time.perf_counter() - start
+
+    per_tick: float = tick_time / ticks
+    per_match: float = per_tick / count
+    sent: int = sum(match.player1.writer.sent + match.player2.writer.sent for match in matches)
+    print(f"{count} matches, {ticks} ticks: {per_tick * 1000:.2f} ms per tick, {per_match * 1e6:.1f} us per match")
+    print(f"about {1 / 60 / per_match:.0f} matches per core at 60 Hz (without the sockets), "
+          f"{sent / count / ticks * 60 / 1024:.1f} KiB/s sent per match")
+    if spectators:
+        watched: int = sum(spectator.writer.sent for match in matches for spectator in match.spectators)
+        print(f"{spectators} spectators per match: {broadcast_time / ticks * 1000:.2f} ms per tick, "
+              f"{broadcast_time / ticks / count / spectators * 1e6:.2f} us per spectator, "
+              f"{watched / count / spectators / ticks * 60 / 1024:.2f} KiB/s per spectator")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Measures how smooth the ball moves on the client with artificial latency and jitter.
+
+A simulated rally is sent at 60 ticks per second, every snapshot arrives after latency plus a random
+jitter (in order, like on TCP). The client renders at 60 frames per second, once showing the newest
+snapshot that arrived (like before) and once through the InterpolationBuffer.
+Reported are the frames where the ball did not move and how uneven the movement per frame is.
+
+Usage: python benchmark_smoothing.py [latency] [jitter]     (in seconds, e.g. 0.05 0.03)
+"""
+import random
+import statistics
+import sys
+
+from benchmark_codec import rally
+from interpolation import InterpolationBuffer
+
+TICKS: int = 3600
+TICK: float = 1 / 60
+FRAME: float = 1 / 60
+
+
+def main():
+    latency: float = float(sys.argv[1]) if len(sys.argv) > 1 else 0.05
+    jitter: float = float(sys.argv[2]) if len(sys.argv) > 2 else 0.03
+    rng: random.Random = random.Random(1)
+
+    arrivals: list = []
+    release: float = 0
+    for tick, data in enumerate(rally(TICKS), start=1):
+        release = max(release, tick * TICK + latency + rng.uniform(0, jitter))
+        arrivals.append((release, tick, (data.ball_x, data.ball_y)))
+
+    buffer: InterpolationBuffer = InterpolationBuffer(tick_duration=TICK)
+    latest = None
+    index: int = 0
+    raw: list = []
+    smooth: list = []
+    now: float = latency + jitter
+    while index < len(arrivals):
+        while index < len(arrivals) and arrivals[index][0] <= now:
+            _, tick, values = arrivals[index]
+            latest = values
+            buffer.add(tick, arrivals[index][0], values)
+            index += 1
+        raw.append(latest)
+        smooth.append(buffer.sample(now))
+        now += FRAME
+
+    # The ball moves the same distance along x every tick, so every frame should move it about the same
+    def report(name: str, positions: list) -> None:
+        steps: list = [abs(b[0] - a[0]) for a, b in zip(positions, positions[1:]) if a and b]
+        steps = [step for step in steps if step < 50]  # skip the reset after a point
+        frozen: int = sum(1 for step in steps if step < 0.01)
+        print(f"{name:<12} frozen frames {frozen:5d}/{len(steps)}   "
+              f"movement per frame {statistics.mean(steps):5.2f} +- {statistics.pstdev(steps):5.2f} px")
+
+    print(f"latency {latency * 1000:.0f} ms, jitter up to {jitter * 1000:.0f} ms")
+    report("newest", raw)
+    report("interpolated", smooth)
+    print(f"interpolation delay settled at {buffer.delay * 1000:.1f} ms, measured jitter {buffer.jitter * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Runs a server and a client over loopback and streams snapshots from the server to the client,
+with a reliable game state change every few snapshots. Over udp datagrams can be dropped and
+reordered on purpose to check that stale snapshots are skipped and reliable messages still arrive in order.
+
+Usage: python benchmark_transport.py [tcp|udp] [packet_loss] [packet_reorder]
+e.g.   python benchmark_transport.py udp 0.2 0.1
+"""
+import sys
+import threading
+import time
+
+import protocol
+from network import Network
+from SendData import SendData
+
+SNAPSHOTS: int = 2000
+RELIABLE_EVERY: int = 100   # send a reliable score change every n snapshots
+SEND_INTERVAL: float = 0.001
+
+
+def connect(transport: str, packet_loss: float, packet_reorder: float):
+    server: Network = Network(is_server=True, start_now=False, transport=transport,
+                              packet_loss=packet_loss, packet_reorder=packet_reorder)
+    server.host = "127.0.0.1"
+    server.port = 0
+    server.start_socket()
+
+    client: Network = Network(server_ip="127.0.0.1", start_now=False, transport=transport,
+                              packet_loss=packet_loss, packet_reorder=packet_reorder)
+    client.port = server.port
+    accept_thread = threading.Thread(target=server.accept_connection)
+    accept_thread.start()
+    client.connect_to_server()
+    if transport == "udp":
+        # The hello is only resent while the client waits for something
+        while accept_thread.is_alive():
+            client.channel.retransmit()
+            time.sleep(0.01)
+    accept_thread.join()
+    return server, client
+
+
+def main():
+    transport: str = sys.argv[1] if len(sys.argv) > 1 else "udp"
+    packet_loss: float = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    packet_reorder: float = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    server, client = connect(transport, packet_loss, packet_reorder)
+
+    snapshots_received: int = 0
+    newest: float = -1
+    went_back: int = 0
+    scores: list = []
+
+    def receive():
+        nonlocal snapshots_received, newest, went_back
+        while len(scores) < SNAPSHOTS // RELIABLE_EVERY or newest < SNAPSHOTS - 1:
+            message = client.receive_data()
+            data: SendData = protocol.decode_snapshot(message)
+            snapshots_received += 1
+            if data.game_state == "game_over":
+                scores.append(data.server_score)
+                continue  # reliable messages may be older than the newest snapshot
+            if data.player_position < newest:
+                went_back += 1
+            newest = data.player_position
+
+    receive_thread = threading.Thread(target=receive, daemon=True)
+    start: float = time.perf_counter()
+    receive_thread.start()
+    snapshot: SendData = SendData(0, "playing", 0, 0, 0, 0)
+    for i in range(SNAPSHOTS):
+        if i % RELIABLE_EVERY == RELIABLE_EVERY - 1:
+            snapshot.update(i, "game_over", 0, 0, i // RELIABLE_EVERY, 0)
+            server.send_snapshot(snapshot, reliable=True)
+        snapshot.update(i, "playing", 0, 0, 0, 0)
+        server.send_snapshot(snapshot)
+        time.sleep(SEND_INTERVAL)
+    if transport == "udp":
+        # the last snapshot can be lost, keep resending it like the game does every frame
+        while receive_thread.is_alive() and time.perf_counter() - start < 30:
+            server.send_snapshot(snapshot)
+            server.channel.retransmit()
+            time.sleep(0.01)
+    receive_thread.join(timeout=30)
+    elapsed: float = time.perf_counter() - start
+
+    print(f"transport={transport} packet_loss={packet_loss} packet_reorder={packet_reorder}")
+    print(f"snapshots sent: {SNAPSHOTS}, received: {snapshots_received}, went back in time: {went_back}")
+    print(f"reliable messages in order: {scores == list(range(len(scores)))}, "
+          f"{len(scores)}/{SNAPSHOTS // RELIABLE_EVERY} arrived")
+    if transport == "udp":
+        print(f"stale datagrams dropped: {client.channel.stale}, retransmitted: {server.channel.retransmitted}")
+    print(f"time: {elapsed:.2f} s")
+
+    server.close_connection()
+    client.close_connection()
+
+
+if __name__ == "__main__":
+    main()
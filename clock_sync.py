@@ -0,0 +1,83 @@
+"""
+Round trip time and clock offset to the peer, measured with PING and PONG messages (see Network.ping).
+
+A PING carries the time it was sent (t1). The peer answers with a PONG that echoes t1 and adds the time the PING
+arrived (t2) and the time the PONG was sent (t3), both on its own clock. When the PONG arrives (t4):
+
+    round trip time = (t4 - t1) - (t3 - t2)
+    clock offset    = ((t2 - t1) + (t3 - t4)) / 2     (the clock of the peer minus ours, like NTP)
+
+The round trip time is smoothed like TCP does it (RFC 6298), the jitter is its mean deviation. The offset of a
+single sample is off by up to half of the difference between the two directions, and queues make one direction
+slower now and then. So the offset is taken from the sample with the smallest round trip time of the last few,
+like the clock filter of NTP.
+"""
+import collections
+import time
+from typing import Callable, Deque, Optional, Tuple
+
+# Gains of the smoothed round trip time and of the jitter (RFC 6298)
+RTT_GAIN: float = 1 / 8
+JITTER_GAIN: float = 1 / 4
+# The offset is taken from the best of this many samples
+OFFSET_SAMPLES: int = 8
+
+
+class ClockSync:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            clock (Callable[[], float], optional): the local clock in seconds, only differences matter
+        """
+        self.clock: Callable[[], float] = clock
+        self.rtt: Optional[float] = None        # smoothed round trip time in seconds, None before the first PONG
+        self.jitter: float = 0.0                # mean deviation of the round trip time
+        self.min_rtt: Optional[float] = None    # the smallest round trip time of the recent samples
+        self.offset: Optional[float] = None     # the clock of the peer minus the local clock
+        self.samples: int = 0
+        self.last_ping: float = float("-inf")
+        self.recent: Deque[Tuple[float, float]] = collections.deque(maxlen=OFFSET_SAMPLES)  # (rtt, offset)
+
+    def now(self) -> float:
+        return self.clock()
+
+    def add_sample(self, t1: float, t2: float, t3: float, t4: float):
+        """
+        Adds the times of one PING and its PONG.
+
+        Args:
+            t1 (float): PING sent, local clock
+            t2 (float): PING received, clock of the peer
+            t3 (float): PONG sent, clock of the peer
+            t4 (float): PONG received, local clock
+        """
+        rtt: float = max(0.0, (t4 - t1) - (t3 - t2))
+        offset: float = ((t2 - t1) + (t3 - t4)) / 2
+        if self.rtt is None:
+            self.rtt = rtt
+            self.jitter = rtt / 2
+        else:
+            self.jitter += (abs(self.rtt - rtt) - self.jitter) * JITTER_GAIN
+            self.rtt += (rtt - self.rtt) * RTT_GAIN
+        self.recent.append((rtt, offset))
+        self.min_rtt, self.offset = min(self.recent)
+        self.samples += 1
+
+    @property
+    def offset_error(self) -> Optional[float]:
+        """
+        The most the offset can be off, half the round trip time of the sample it is from.
+        """
+        return None if self.min_rtt is None else self.min_rtt / 2
+
+    def to_local(self, peer_time: float) -> Optional[float]:
+        """
+        Converts a time on the clock of the peer (e.g. when it sent a snapshot) to the local clock.
+        """
+        return None if self.offset is None else peer_time - self.offset
+
+    def __str__(self) -> str:
+        if self.rtt is None:
+            return "rtt: -"
+        return (f"rtt: {self.rtt * 1000:.1f} ms, jitter: {self.jitter * 1000:.1f} ms, "
+                f"offset: {self.offset * 1000:.1f} +- {self.offset_error * 1000:.1f} ms")
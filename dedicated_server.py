@@ -0,0 +1,430 @@
+"""
+Dedicated server: hosts many matches in one process, without a window.
+
+Clients join it with "JOIN GAME" and the ip of the server, like they join a player that hosts a game.
+Every two clients are paired into a match. The server simulates all matches on one shared tick, the clients
+only send their paddle and render the snapshots. Both players see themselves on the right side, for the
+player of the left paddle the snapshots are mirrored.
+A match starts as soon as both players are there and starts again RESTART_DELAY seconds after it is over.
+When a player leaves, the match ends and the other player is disconnected.
+
+Spectators connect to the spectator port and send SPECTATE with the id of a match (0 for the newest one), then they
+get the same handshake and the snapshots of the match from the view of the right player. Each tick is encoded once
+for all spectators of a match (see BroadcastEncoder) and sent after the snapshots of the players of all matches.
+A spectator that can not keep up skips ticks and gets a keyframe when it caught up.
+
+Only tcp, the messages and the framing are the same as between two players (see protocol.py, framing.py).
+
+Usage: python dedicated_server.py [--host 0.0.0.0] [--port 5555] [--spectator-port 5554] [--tick-rate 60] ...
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+import protocol
+from framing import FRAME_HEADER
+from MatchSettings import MatchSettings
+from network import SPECTATOR_PORT
+from prediction import SEQUENCE_MODULO
+from protocol import ProtocolError, RejectReason
+from SendData import SendData
+from simulation import PongSimulation
+from snapshot_delta import BroadcastEncoder, SnapshotEncoder
+
+RESTART_DELAY: float = 5.0
+REPORT_INTERVAL: float = 10.0
+LOAD_SMOOTHING: float = 0.02  # the load follows the tick time over about 50 ticks
+# A client with this much unsent data gets no new snapshots until it caught up, a newer one follows anyway
+MAX_WRITE_BUFFER: int = 16 * 1024
+# The left and the right paddle bounce the ball at x = 30 and x = width - 50, mirroring swaps them
+MIRROR_OFFSET: int = 20
+
+
+class Player:
+    """
+    One connected client. Receiving runs in its own task and only keeps the newest paddle message,
+    the match applies it on the next tick.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader: asyncio.StreamReader = reader
+        self.writer: asyncio.StreamWriter = writer
+        self.name: str = str(writer.get_extra_info("peername"))
+        self.player_name: str = ""  # from the handshake
+        self.paddle: Optional[tuple] = None  # the newest (position, acked_tick, sequence) of the client
+        self.sequence: int = 0  # the input sequence of the last applied paddle position
+        self.encoder: SnapshotEncoder = SnapshotEncoder()
+        self.snapshot: SendData = SendData(0, "start", 0, 0, 0, 0)
+        self.connected: bool = True
+        self.skipped: int = 0  # snapshots not sent because the client was too slow
+
+    async def read_frame(self) -> bytes:
+        header: bytes = await self.reader.readexactly(FRAME_HEADER.size)
+        return await self.reader.readexactly(FRAME_HEADER.unpack(header)[0])
+
+    def send(self, message: bytes):
+        self.writer.write(FRAME_HEADER.pack(len(message)) + message)
+
+    def can_send(self) -> bool:
+        return self.writer.transport.get_write_buffer_size() < MAX_WRITE_BUFFER
+
+    async def handshake(self, settings: MatchSettings):
+        """
+        Sends the match settings like Game does on the server and waits for the reply, one round trip.
+
+        Raises:
+            ProtocolError: if the client rejected the match
+        """
+        self.send(protocol.encode_handshake(settings))
+        await self.writer.drain()
+        reason, features, self.player_name = protocol.decode_handshake_reply(await self.read_frame())
+        if reason != RejectReason.ACCEPTED:
+            raise ProtocolError(f"{self.player_name} rejected the match: {reason.name}")
+        self.name = f"{self.player_name} {self.name}"
+
+    async def receive_loop(self):
+        try:
+            while True:
+                message: bytes = await self.read_frame()
+                if protocol.is_control(message):
+                    # The client measures its round trip time and clock offset, see clock_sync.py
+                    received: float = time.monotonic()
+                    self.send(protocol.encode_pong(protocol.decode_ping(message), received, time.monotonic()))
+                    continue
+                self.paddle = protocol.decode_paddle(message)
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError) as error:
+            print(f"{self.name} left: {error!r}")
+        finally:
+            self.connected = False
+
+    def close(self):
+        self.connected = False
+        self.writer.close()
+
+
+class Spectator(Player):
+    """
+    A read-only connection that watches a match, it sends nothing after SPECTATE.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        super().__init__(reader, writer)
+        self.needs_keyframe: bool = True  # it just joined or skipped a tick, a delta is of no use
+
+
+class Match:
+    """
+    One authoritative game between two players, player1 has the left paddle and player2 the right one.
+    """
+
+    def __init__(self, player1: Player, player2: Player, simulation: PongSimulation, match_id: int = 0):
+        self.id: int = match_id
+        self.player1: Player = player1
+        self.player2: Player = player2
+        self.simulation: PongSimulation = simulation
+        self.simulation.game_state = "playing"
+        self.game_over_since: Optional[float] = None
+        self.sent_state: tuple = None  # (game_state, player1_score, player2_score) of the last snapshots
+        self.spectators: List[Spectator] = []
+        self.broadcaster: BroadcastEncoder = BroadcastEncoder()
+        self.spectator_snapshot: SendData = SendData(0, "start", 0, 0, 0, 0)
+
+    def tick(self, now: float) -> bool:
+        """
+        Simulates one tick and sends the snapshots.
+
+        Args:
+            now (float): the time of the tick (time.monotonic())
+
+        Returns:
+            bool: False if the match is over because a player left
+        """
+        if not (self.player1.connected and self.player2.connected):
+            self.player1.close()
+            self.player2.close()
+            for spectator in self.spectators:
+                spectator.close()
+            return False
+
+        simulation: PongSimulation = self.simulation
+        simulation.paddle1_pos = self.accept_paddle(self.player1, simulation.paddle1_pos)
+        simulation.paddle2_pos = self.accept_paddle(self.player2, simulation.paddle2_pos)
+        if simulation.game_state == "playing":
+            simulation.step_ball()  # the paddles are moved by the clients
+        elif self.game_over_since is None:
+            self.game_over_since = now
+        elif now - self.game_over_since > RESTART_DELAY:
+            self.game_over_since = None
+            simulation.press_space()
+            simulation.press_space()
+
+        state: tuple = (simulation.game_state, simulation.player1_score, simulation.player2_score)
+        changed: bool = state != self.sent_state
+        self.sent_state = state
+        width: int = simulation.width
+        self.send_snapshot(self.player1, changed, simulation.paddle2_pos, width - MIRROR_OFFSET - simulation.ball_x,
+                           simulation.player2_score, simulation.player1_score, simulation.paddle1_pos)
+        self.send_snapshot(self.player2, changed, simulation.paddle1_pos, simulation.ball_x,
+                           simulation.player1_score, simulation.player2_score, simulation.paddle2_pos)
+        return True
+
+    def accept_paddle(self, player: Player, current: float) -> float:
+        """
+        Applies the newest paddle message of the player, see Game.accept_client_paddle.
+        """
+        if player.paddle is None:
+            return current
+        position, acked_tick, sequence = player.paddle
+        player.encoder.acknowledge(acked_tick)
+        steps: int = (sequence - player.sequence) % SEQUENCE_MODULO
+        if steps == 0 or steps > SEQUENCE_MODULO // 2:
+            return current  # not newer than the last one
+        player.sequence = sequence
+        return self.simulation.clamp_paddle(current, position, steps)
+
+    def send_snapshot(self, player: Player, keyframe: bool, opponent_position: float, ball_x: float,
+                      opponent_score: int, own_score: int, own_position: float):
+        """
+        Sends the state as the player sees it: the opponent is the "server" paddle on the left.
+        """
+        if not keyframe and not player.can_send():
+            player.skipped += 1
+            return
+        simulation: PongSimulation = self.simulation
+        player.snapshot.update(opponent_position, simulation.game_state, ball_x, simulation.ball_y,
+                               opponent_score, own_score, own_position, player.sequence)
+        player.send(player.encoder.encode(player.snapshot, keyframe=keyframe))
+
+    def broadcast(self):
+        """
+        Sends the state of this tick to all spectators. It is encoded and framed once, every spectator
+        gets the same bytes: the delta, or the keyframe if it can not use the delta.
+        """
+        if not self.spectators:
+            return
+        simulation: PongSimulation = self.simulation
+        self.spectator_snapshot.update(simulation.paddle1_pos, simulation.game_state, simulation.ball_x,
+                                       simulation.ball_y, simulation.player1_score, simulation.player2_score,
+                                       simulation.paddle2_pos, 0)
+        self.broadcaster.encode(self.spectator_snapshot)
+        delta_frame: Optional[bytes] = None
+        keyframe_frame: Optional[bytes] = None
+        if self.broadcaster.delta is not None:
+            delta_frame = FRAME_HEADER.pack(len(self.broadcaster.delta)) + self.broadcaster.delta
+
+        for spectator in self.spectators:
+            if not spectator.can_send():
+                # Skip this tick instead of buffering more, after that only a keyframe helps
+                spectator.needs_keyframe = True
+                spectator.skipped += 1
+            elif spectator.needs_keyframe or delta_frame is None:
+                if keyframe_frame is None:
+                    keyframe: bytes = self.broadcaster.keyframe()
+                    keyframe_frame = FRAME_HEADER.pack(len(keyframe)) + keyframe
+                spectator.writer.write(keyframe_frame)
+                spectator.needs_keyframe = False
+            else:
+                spectator.writer.write(delta_frame)
+        if not all(spectator.connected for spectator in self.spectators):
+            self.spectators = [spectator for spectator in self.spectators if spectator.connected]
+
+
+class TickScheduler:
+    """
+    Runs the ticks of all matches one after another, tick_rate times per second, in one task.
+    Measures how much of the time the ticks take, to estimate how many matches one core can run.
+    """
+
+    def __init__(self, tick_rate: int):
+        self.tick_rate: int = tick_rate
+        self.tick_duration: float = 1 / tick_rate
+        self.matches: List[Match] = []
+        self.busy: float = 0  # seconds spent in ticks since the last report
+        self.broadcast_time: float = 0  # seconds spent sending to spectators since the last report
+        self.ticks: int = 0
+        self.late_ticks: int = 0
+        self.load: float = 0  # smoothed part of the tick duration the ticks take, 1 means the core is full
+
+    def add(self, match: Match):
+        self.matches.append(match)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        next_tick: float = loop.time()
+        report_time: float = time.monotonic() + REPORT_INTERVAL
+        cpu_time: float = time.process_time()
+        while True:
+            start: float = time.perf_counter()
+            now: float = time.monotonic()
+            self.matches = [match for match in self.matches if match.tick(now)]
+            elapsed: float = time.perf_counter() - start
+            self.busy += elapsed
+            self.load += (elapsed / self.tick_duration - self.load) * LOAD_SMOOTHING
+            # The spectators come after the players of all matches, so they can not delay their snapshots
+            start = time.perf_counter()
+            for match in self.matches:
+                match.broadcast()
+            self.broadcast_time += time.perf_counter() - start
+            self.ticks += 1
+
+            if now >= report_time:
+                self.report(REPORT_INTERVAL, time.process_time() - cpu_time)
+                report_time = now + REPORT_INTERVAL
+                cpu_time = time.process_time()
+
+            next_tick += self.tick_duration
+            delay: float = next_tick - loop.time()
+            if delay < 0:
+                # Too slow, skip the missed ticks instead of running them all at once
+                self.late_ticks += 1
+                next_tick = loop.time()
+            await asyncio.sleep(max(delay, 0))
+
+    def report(self, interval: float, cpu: float):
+        """
+        Prints the load. The capacity is estimated from the cpu time of the whole process (ticks and network)
+        per match, this process runs on one core.
+        """
+        count: int = len(self.matches)
+        tick_load: float = self.busy / interval
+        capacity: str = f"{count / (cpu / interval):.0f}" if count and cpu > 0 else "-"
+        spectators: int = sum(len(match.spectators) for match in self.matches)
+        print(f"{count} matches, {self.ticks} ticks ({self.late_ticks} late), ticks take {tick_load:.1%} and the "
+              f"process {cpu / interval:.1%} of a core, about {capacity} matches per core at {self.tick_rate} Hz, "
+              f"{spectators} spectators take {self.broadcast_time / interval:.1%}")
+        self.busy = 0
+        self.broadcast_time = 0
+        self.ticks = 0
+        self.late_ticks = 0
+
+
+class DedicatedServer:
+    def __init__(self, host: str, port: int, width: int = 800, height: int = 600, player_speed: int = 8,
+                 ball_speed: int = 5, tick_rate: int = 60, spectator_port: Optional[int] = None):
+        """
+        Args:
+            host (str): the address to listen on
+            port (int): the port to listen on, 0 picks a free port
+            width (int, optional): the width of the field, the clients resize their window to it
+            height (int, optional): the height of the field
+            player_speed (int, optional): paddle speed in pixels per 1/60 second
+            ball_speed (int, optional): ball speed in pixels per 1/60 second
+            tick_rate (int, optional): ticks per second
+            spectator_port (int, optional): the port for spectators, None for no spectators
+        """
+        self.host: str = host
+        self.port: int = port
+        self.spectator_port: Optional[int] = spectator_port
+        self.last_match_id: int = 0
+        self.width: int = width
+        self.height: int = height
+        self.player_speed: int = player_speed
+        self.ball_speed: int = ball_speed
+        self.scheduler: TickScheduler = TickScheduler(tick_rate)
+        self.waiting: Dict[int, Player] = {}  # the player without opponent yet, per port
+        # The same handshake as Game sends, the clients do not notice the difference
+        self.settings: MatchSettings = MatchSettings(
+            width, height, player_speed, ball_speed, tick_rate, player_name="Dedicated server")
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        player: Player = Player(reader, writer)
+        port: int = writer.get_extra_info("sockname")[1]
+        print(f"{player.name} connected")
+        try:
+            await player.handshake(self.settings)
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError) as error:
+            print(f"{player.name} failed the handshake: {error!r}")
+            player.close()
+            self.player_left(player, port)
+            return
+
+        # Players are paired per port, a lobby worker listens on one port per match (see lobby.py)
+        waiting: Optional[Player] = self.waiting.get(port)
+        if waiting is not None and waiting.connected:
+            del self.waiting[port]
+            self.start_match(waiting, player, port)
+        else:
+            self.waiting[port] = player
+        await player.receive_loop()
+        writer.close()
+        self.player_left(player, port)
+
+    def start_match(self, player1: Player, player2: Player, port: int):
+        simulation: PongSimulation = PongSimulation(
+            self.width, self.height, self.player_speed, self.ball_speed, self.scheduler.tick_rate)
+        self.last_match_id += 1
+        self.scheduler.add(Match(player1, player2, simulation, self.last_match_id))
+        print(f"match {self.last_match_id}: {player1.name} vs {player2.name}, {len(self.scheduler.matches)} matches")
+
+    def player_left(self, player: Player, port: int):
+        """
+        Called when the connection of a player on the port is closed, the player no longer waits for a match.
+        """
+        if self.waiting.get(port) is player:
+            del self.waiting[port]
+
+    def find_match(self, match_id: int) -> Optional[Match]:
+        """
+        Returns the running match with the id, or the newest one for 0.
+        """
+        if match_id == 0:
+            return self.scheduler.matches[-1] if self.scheduler.matches else None
+        return next((match for match in self.scheduler.matches if match.id == match_id), None)
+
+    async def handle_spectator(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        spectator: Spectator = Spectator(reader, writer)
+        try:
+            match_id: int = protocol.decode_spectate(await spectator.read_frame())
+            if self.find_match(match_id) is None:
+                raise ProtocolError(f"no match {match_id}")
+            await spectator.handshake(self.settings)
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError) as error:
+            print(f"spectator {spectator.name} failed the handshake: {error!r}")
+            spectator.close()
+            return
+
+        match: Optional[Match] = self.find_match(match_id)  # it can be over after the handshake
+        if match is None:
+            spectator.close()
+            return
+        match.spectators.append(spectator)
+        print(f"spectator {spectator.name} watches match {match.id}, {len(match.spectators)} spectators")
+        await spectator.receive_loop()
+        writer.close()
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle_client, self.host, self.port, backlog=128)
+        self.port = server.sockets[0].getsockname()[1]
+        print(f"Dedicated server listening on {self.host}:{self.port}")
+        servers: list = [server.serve_forever()]
+        if self.spectator_port is not None:
+            spectator_server = await asyncio.start_server(
+                self.handle_spectator, self.host, self.spectator_port, backlog=512)
+            print(f"Spectators can connect on port {self.spectator_port}")
+            servers.append(spectator_server.serve_forever())
+        await asyncio.gather(*servers, self.scheduler.run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hosts many Pong matches without a window.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--spectator-port", type=int, default=SPECTATOR_PORT)
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=600)
+    parser.add_argument("--player-speed", type=int, default=8)
+    parser.add_argument("--ball-speed", type=int, default=5)
+    parser.add_argument("--tick-rate", type=int, default=60)
+    args = parser.parse_args()
+
+    server: DedicatedServer = DedicatedServer(args.host, args.port, args.width, args.height, args.player_speed,
+                                              args.ball_speed, args.tick_rate, args.spectator_port)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
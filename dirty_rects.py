@@ -0,0 +1,73 @@
+"""
+Dirty rectangle rendering: only the parts of the window that changed are cleared and sent to the display.
+
+In a game only the ball, the paddles and sometimes the score change, a few small rectangles instead of the
+whole window. Every frame the rectangles drawn in the frame before are cleared, everything is drawn again
+(the small sprites are cheap) and only the old and the new rectangles are updated on the display.
+The whole window is cleared and flipped when the game state or the window size changed, after invalidate()
+(e.g. the window was covered) or when there are too many rectangles (the chaos mode).
+"""
+from typing import List, Optional, Tuple
+
+import pygame
+
+# With more rectangles one flip is faster than updating them one by one
+MAX_RECTS: int = 64
+
+
+class DirtyRects:
+    def __init__(self, background: Tuple[int, int, int] = (0, 0, 0), enabled: bool = True):
+        """
+        Args:
+            background (Tuple[int, int, int], optional): the color of the background
+            enabled (bool, optional): False clears and flips the whole window every frame
+        """
+        self.background: Tuple[int, int, int] = background
+        self.enabled: bool = enabled
+        self.drawn: List[pygame.Rect] = []  # the rectangles of the frame before, they are cleared next frame
+        self.current: List[pygame.Rect] = []
+        self.full: bool = True
+        self.state: Optional[str] = None
+        self.size: Optional[Tuple[int, int]] = None
+
+    def invalidate(self):
+        """
+        Redraws the whole window in the next frame.
+        """
+        self.full = True
+
+    def begin(self, screen: pygame.Surface, state: str):
+        """
+        Clears what was drawn in the frame before, or the whole window.
+
+        Args:
+            screen (pygame.Surface): the display surface
+            state (str): the game state, the whole window is redrawn when it changes
+        """
+        if not self.enabled or state != self.state or screen.get_size() != self.size:
+            self.full = True
+            self.state = state
+            self.size = screen.get_size()
+        if self.full:
+            screen.fill(self.background)
+        else:
+            for rect in self.drawn:
+                screen.fill(self.background, rect)
+        self.current = []
+
+    def add(self, rect: pygame.Rect):
+        """
+        Adds the rectangle of something that was drawn (e.g. the return value of blit).
+        """
+        self.current.append(rect)
+
+    def present(self):
+        """
+        Shows the frame: flips the whole window or updates only the old and the new rectangles.
+        """
+        if self.full or len(self.drawn) + len(self.current) > MAX_RECTS:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.drawn + self.current)
+        self.drawn = self.current
+        self.full = False
@@ -0,0 +1,85 @@
+"""
+Frame pacing for screens that mostly stay the same: the menus of the start screen and the start and game over
+screens of the game.
+
+These screens are not drawn 60 times a second. They are drawn again only when something happened: an input
+event, an animation step (e.g. the waiting dots) or a network event that a thread posted to the event queue.
+In between, the loop blocks in pygame.event.wait with a timeout, so the process sleeps instead of burning a core.
+While the window has no focus or is minimized, the game also drops to a low frame rate (IDLE_FPS).
+"""
+from typing import List
+
+import pygame
+
+# Frames per second while the window has no focus or is minimized
+IDLE_FPS: int = 10
+# Upper limit while something changes all the time (e.g. the mouse moves over the menu)
+MAX_MENU_FPS: int = 60
+# Timeout when no animation is running, so the loop notices changes that come without an event
+IDLE_TIMEOUT_MS: int = 1000
+
+# Threads post this to wake up a loop that waits for events (e.g. a client connected)
+NETWORK_EVENT: int = pygame.event.custom_type()
+
+FOCUS_LOST_EVENTS: tuple = (pygame.WINDOWFOCUSLOST,)
+FOCUS_GAINED_EVENTS: tuple = (pygame.WINDOWFOCUSGAINED,)
+HIDDEN_EVENTS: tuple = (pygame.WINDOWMINIMIZED, pygame.WINDOWHIDDEN)
+SHOWN_EVENTS: tuple = (pygame.WINDOWRESTORED, pygame.WINDOWSHOWN, pygame.WINDOWMAXIMIZED)
+
+
+def post_network_event():
+    """
+    Wakes up the loop that waits for events. Can be called from any thread.
+    """
+    pygame.event.post(pygame.event.Event(NETWORK_EVENT))
+
+
+class FramePacer:
+    def __init__(self):
+        self.focused: bool = True
+        self.minimized: bool = False
+        self.redraw: bool = True  # the first frame is always drawn
+
+    @property
+    def idle(self) -> bool:
+        """
+        True when nobody looks at the window, it only needs a few frames per second then.
+        """
+        return not self.focused or self.minimized
+
+    def handle_event(self, event: pygame.event.Event):
+        """
+        Tracks the focus and whether the window is minimized. Every event asks for a redraw, a new frame
+        is cheap compared to missing a change.
+        """
+        if event.type in FOCUS_LOST_EVENTS:
+            self.focused = False
+        elif event.type in FOCUS_GAINED_EVENTS:
+            self.focused = True
+        elif event.type in HIDDEN_EVENTS:
+            self.minimized = True
+        elif event.type in SHOWN_EVENTS:
+            self.minimized = False
+        self.redraw = True
+
+    def wait(self, timeout_ms: float) -> List[pygame.event.Event]:
+        """
+        Blocks until an event arrives or the timeout is over.
+
+        Args:
+            timeout_ms (float): the longest time to sleep in milliseconds
+
+        Returns:
+            List[pygame.event.Event]: all events in the queue, pass them to handle_event
+        """
+        # 0 would wait forever
+        event: pygame.event.Event = pygame.event.wait(max(1, int(timeout_ms)))
+        events: List[pygame.event.Event] = [] if event.type == pygame.NOEVENT else [event]
+        events.extend(pygame.event.get())
+        return events
+
+    def idle_timeout(self) -> float:
+        """
+        Returns the milliseconds of one frame while idle.
+        """
+        return 1000 / IDLE_FPS
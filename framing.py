@@ -0,0 +1,174 @@
+import select
+import socket
+import struct
+from typing import Callable, List, Optional
+
+# Every message on the stream is prefixed with its length
+FRAME_HEADER = struct.Struct("!H")
+MAX_FRAME_SIZE: int = 0xFFFF
+
+
+class FrameReader:
+    """
+    Reads length-prefixed frames from a stream socket.
+
+    TCP does not keep message boundaries, one recv can return half a message or several messages at once.
+    The reader fills a preallocated buffer with recv_into and hands out the frames as memoryviews into
+    that buffer, so nothing is copied or allocated per frame.
+    A returned frame is only valid until the next call that reads from the socket.
+    """
+
+    def __init__(self, sock: socket.socket, capacity: int = 65536,
+                 control: Optional[Callable[[memoryview], bool]] = None):
+        """
+        Args:
+            sock (socket.socket): the connected socket
+            capacity (int, optional): the size of the receive buffer, the largest frame has to fit
+            control (Callable[[memoryview], bool], optional): gets every frame first, the frames it returns True
+                for are consumed and not returned (e.g. PING and PONG, so read_latest does not drop them)
+        """
+        self.sock: socket.socket = sock
+        self.control: Optional[Callable[[memoryview], bool]] = control
+        self.buffer: bytearray = bytearray(capacity)
+        self.view: memoryview = memoryview(self.buffer)
+        self.start: int = 0  # first byte that is not parsed yet
+        self.end: int = 0    # end of the received bytes
+        self.bytes_received: int = 0
+
+    def fill(self, block: bool = True) -> int:
+        """
+        Receives as many bytes as fit into the free space of the buffer.
+
+        Args:
+            block (bool, optional): wait for data if nothing is available
+
+        Raises:
+            ConnectionError: if the peer closed the connection
+
+        Returns:
+            int: the number of bytes received, 0 if block is False and nothing was available
+        """
+        if not block and not self.readable():
+            return 0
+
+        if self.start == self.end:
+            # everything is parsed, start at the front again so compacting is rarely needed
+            self.start = self.end = 0
+        elif self.end == len(self.buffer):
+            self.compact()
+
+        received: int = self.sock.recv_into(self.view[self.end:])
+        if received == 0:
+            raise ConnectionError("connection closed by peer")
+        self.end += received
+        self.bytes_received += received
+        return received
+
+    def readable(self) -> bool:
+        """
+        Checks without blocking if data is waiting on the socket.
+        """
+        readable, _, _ = select.select([self.sock], [], [], 0)
+        return bool(readable)
+
+    def compact(self) -> None:
+        """
+        Moves the unparsed bytes to the front of the buffer to make room for new data.
+        """
+        remaining: int = self.end - self.start
+        if self.start == 0 and remaining == len(self.buffer):
+            raise ConnectionError("receive buffer full, frame is larger than the buffer")
+        self.view[:remaining] = self.view[self.start:self.end]
+        self.start = 0
+        self.end = remaining
+
+    def next_frame(self) -> Optional[memoryview]:
+        """
+        Returns the next complete frame that is already in the buffer.
+
+        Returns:
+            Optional[memoryview]: the payload of the frame, None if no complete frame is buffered
+        """
+        while True:
+            available: int = self.end - self.start
+            if available < FRAME_HEADER.size:
+                return None
+            length: int = FRAME_HEADER.unpack_from(self.buffer, self.start)[0]
+            if available < FRAME_HEADER.size + length:
+                if FRAME_HEADER.size + length > len(self.buffer):
+                    raise ConnectionError(f"frame of {length} bytes does not fit into the receive buffer")
+                return None
+            payload_start: int = self.start + FRAME_HEADER.size
+            self.start = payload_start + length
+            frame: memoryview = self.view[payload_start:payload_start + length]
+            if self.control is None or not self.control(frame):
+                return frame
+
+    def read_frame(self) -> memoryview:
+        """
+        Returns the next frame, waits until one is complete.
+        """
+        while True:
+            frame = self.next_frame()
+            if frame is not None:
+                return frame
+            self.fill(block=True)
+
+    def read_latest(self) -> memoryview:
+        """
+        Drains all frames that have arrived and returns only the newest one, waits if none is complete.
+        Use this for snapshots, where older ones are outdated as soon as a newer one exists.
+        """
+        latest: Optional[memoryview] = None
+        latest_start: int = 0
+        latest_end: int = 0
+        while True:
+            frame = self.next_frame()
+            if frame is not None:
+                # next_frame can have consumed control frames before it, so the start is taken from the end
+                latest = frame
+                latest_end = self.start
+                latest_start = latest_end - len(frame) - FRAME_HEADER.size
+                continue
+            if latest is not None:
+                if not self.readable():
+                    return latest
+                # More data is waiting, keep the newest frame unparsed so the next fill does not overwrite it.
+                # The control frames after it were handled already, the frame is moved right in front of the
+                # unparsed bytes so they are not read again.
+                new_start: int = self.start - (latest_end - latest_start)
+                if new_start != latest_start:
+                    self.view[new_start:self.start] = self.view[latest_start:latest_end]
+                self.start = new_start
+                latest = None
+            self.fill(block=True)
+
+
+def send_frames(sock: socket.socket, payloads: List[bytes]) -> None:
+    """
+    Sends several frames with as few syscalls as possible. The length headers and payloads are
+    handed to sendmsg together, so they do not need to be joined into one buffer first.
+
+    Args:
+        sock (socket.socket): the connected socket
+        payloads (List[bytes]): the payloads of the frames
+    """
+    buffers: list = []
+    for payload in payloads:
+        if len(payload) > MAX_FRAME_SIZE:
+            raise ValueError(f"frame of {len(payload)} bytes is too large")
+        buffers.append(FRAME_HEADER.pack(len(payload)))
+        buffers.append(payload)
+
+    if not hasattr(sock, "sendmsg"):  # Windows has no sendmsg
+        sock.sendall(b"".join(buffers))
+        return
+
+    while buffers:
+        sent: int = sock.sendmsg(buffers)
+        # drop the buffers that were sent completely, keep the rest of a partially sent one
+        while buffers and sent >= len(buffers[0]):
+            sent -= len(buffers[0])
+            buffers.pop(0)
+        if buffers and sent:
+            buffers[0] = memoryview(buffers[0])[sent:]
@@ -1,46 +1,89 @@
 import pygame
 import random
-import math
+import time
+from typing import Optional
 
+import protocol
+import tracing
+from assets import AssetCache, get_assets
+from frame_pacing import FramePacer
 from network import Network
+from network_worker import NetworkWorker
+from MatchSettings import MatchSettings
+from perf_metrics import (EVENTS, HUD_KEY, NETWORK, PHYSICS, RENDER, SERIALIZE, TARGET, TICKS, FrameMetrics,
+                          MetricsExporter, PerfHud)
+from renderer import SurfaceRenderer
+from interpolation import InterpolationBuffer
+from prediction import PaddlePredictor, SEQUENCE_MODULO
+from replay import ReplayRecorder, new_replay_path
+from rollback import RollbackSession, input_bits
 from SendData import SendData
+from simulation import PongSimulation
+from snapshot_delta import SnapshotDecoder, SnapshotEncoder
 from StartScreen import StartScreen
 
+# A frame that took longer than this is only simulated up to this time, so the game does not spiral
+MAX_FRAME_TIME: float = 0.25
+# Saves the trace while tracing is on (main.py --trace, see tracing.py)
+TRACE_KEY: int = pygame.K_F4
+# Without the start screen there is no handshake, both peers use this seed in rollback mode
+FIXED_ROLLBACK_SEED: int = 1
+
 
 class Game:
-    def __init__(self, screen_width: int, screen_height: int, network: Network = None):
+    def __init__(self, screen_width: int, screen_height: int, network: Network = None, tick_rate: int = 60,
+                 max_fps: int = 240, renderer=None, metrics_path: Optional[str] = None, transport: str = "tcp",
+                 network_options: Optional[dict] = None, rollback: bool = False):
+        """
+        Args:
+            screen_width (int): the width of the window
+            screen_height (int): the height of the window
+            network (Network, optional): a connected network, if None the start screen is shown
+            tick_rate (int, optional): simulation ticks per second, the server sends it to the client
+            max_fps (int, optional): upper limit for the rendered frames per second
+            renderer (SurfaceRenderer | TextureRenderer, optional): draws the game, see renderer.py,
+                None for a SurfaceRenderer
+            metrics_path (str, optional): write the metrics of every frame to this file (see perf_metrics.py)
+            transport (str, optional): "tcp" or "udp" for the network the start screen creates (see Network)
+            network_options (dict, optional): simulated network conditions for the network the start screen
+                creates, e.g. {"latency": 0.1, "packet_loss": 0.05} (see Network)
+            rollback (bool, optional): host the game in rollback mode (see rollback.py), the client gets it from
+                the handshake. With a network passed in, both peers have to set it.
+        """
         # Initialize the game
         pygame.init()
         self.screen_width: int = screen_width
         self.screen_height: int = screen_height
-        self.screen = pygame.display.set_mode((screen_width, screen_height))
+        self.renderer = renderer if renderer is not None else SurfaceRenderer((screen_width, screen_height))
+        self.renderer.set_size((screen_width, screen_height))
         self.clock = pygame.time.Clock()
+        # Only the playing state is drawn every frame, see frame_pacing.py
+        self.pacer: FramePacer = FramePacer()
 
-        # Game variables
-        self.paddle1_pos: int = self.screen_height // 2
-        self.paddle2_pos: int = self.screen_height // 2
+        # Game settings, the server sends them to the client
         self.player_speed: float = 8
-
         self.ball_speed: int = 5
-        self.reset_ball()
+        # The simulation runs with a fixed tick rate, rendering as fast as the display allows
+        self.tick_rate: int = tick_rate
+        self.max_fps: int = max_fps
+        self.ball_count: int = 1  # more than 1: chaos mode
 
-        self.ball_size: int = 20
-
-        self.player1_score: int = 0
-        self.player2_score: int = 0
-
-        self.game_state: str = "start"
+        # 0: the server simulates and sends snapshots, else the seed of the rollback mode
+        rollback_seed: int = 0
+        self.opponent_name: str = "Player"  # from the handshake
 
         if network is None:
             start_screen: StartScreen = StartScreen(
-                self.screen_width, self.screen_height, self.screen, self.clock)
+                self.screen_width, self.screen_height, self.renderer, self.clock)
+            start_screen.transport = transport
+            start_screen.network_options = network_options or {}
+            start_screen.rollback = rollback
             self.network = start_screen.run()
             if self.network.is_server:
                 if self.screen_width != start_screen.window_width or self.screen_height != start_screen.window_height:
                     self.screen_height = start_screen.window_height
                     self.screen_width = start_screen.window_width
-                    self.screen = pygame.display.set_mode(
-                        (self.screen_width, self.screen_height))
+                    self.renderer.set_size((self.screen_width, self.screen_height))
 
                 if self.player_speed != start_screen.player_speed:
                     self.player_speed = start_screen.player_speed
@@ -48,86 +91,166 @@ class Game:
                 if self.ball_speed != start_screen.ball_speed:
                     self.ball_speed = start_screen.ball_speed
 
-                print("sending player speed")
-                self.network.send_data(self.player_speed)
-                self.network.receive_data()
-                print("sending screen height")
-                self.network.send_data(self.screen_height)
-                self.network.receive_data()
-                print("sending screen width")
-                self.network.send_data(self.screen_width)
-                self.network.receive_data()
-            else:
-                self.player_speed: int = self.network.receive_data()
-                self.network.send_data("")
-
-                print(f"speed: {self.player_speed}")
-                screen_height_get: int = self.network.receive_data()
-                self.network.send_data("")
-
-                print(f"height: {screen_height_get}")
-                screen_width_get: int = self.network.receive_data()
-                self.network.send_data("")
+                if self.tick_rate != start_screen.tick_rate:
+                    self.tick_rate = start_screen.tick_rate
 
-                print(f"width: {screen_width_get}")
-                print(screen_height_get, screen_width_get, self.player_speed)
+                # The balls of the chaos mode are not part of the rollback state
+                if start_screen.rollback:
+                    rollback_seed = random.getrandbits(32) | 1
+                else:
+                    self.ball_count = start_screen.ball_count
 
-                if screen_height_get != self.screen_height or screen_width_get != self.screen_width:
-                    self.screen_height = int(screen_height_get)
-                    self.screen_width = int(screen_width_get)
-                    self.screen = pygame.display.set_mode(
-                        (self.screen_width, self.screen_height))
-
-            print("is server: self.network.is_server")
+                # All settings in one message, the client accepts or rejects them: one round trip
+                self.opponent_name = self.network.handshake_server(MatchSettings(
+                    self.screen_width, self.screen_height, self.player_speed, self.ball_speed, self.tick_rate,
+                    self.ball_count, rollback_seed, start_screen.player_name))
+            else:
+                settings: MatchSettings = self.network.handshake_client(start_screen.player_name)
+                self.opponent_name = settings.player_name
+                self.player_speed = settings.player_speed
+                # Both peers simulate the ball in rollback mode, so they need the same speed
+                self.ball_speed = settings.ball_speed
+                self.tick_rate = settings.tick_rate
+                self.ball_count = settings.ball_count
+                rollback_seed = settings.rollback_seed
+
+                if settings.height != self.screen_height or settings.width != self.screen_width:
+                    self.screen_height = settings.height
+                    self.screen_width = settings.width
+                    self.renderer.set_size((self.screen_width, self.screen_height))
+
+            print(f"playing against {self.opponent_name}")
+        else:
+            self.network = network
+            if rollback:
+                rollback_seed = FIXED_ROLLBACK_SEED
+
+        # The game itself, this class draws it and feeds it the keys and the network
+        self.simulation: PongSimulation = PongSimulation(
+            self.screen_width, self.screen_height, self.player_speed, self.ball_speed, self.tick_rate,
+            seed=rollback_seed or random.getrandbits(32))
+        if self.ball_count > 1:
+            self.simulation.add_balls(self.ball_count)
+        # Positions before the last tick, rendering interpolates between them and the current ones
+        self.previous_positions: tuple = self.simulation.positions()
+
+        # Reused every frame for encoding the game state (server)
+        self.snapshot: SendData = SendData(0, "start", 0, 0, 0, 0)
+        # Snapshots are sent as deltas against the newest one the client acknowledged
+        self.snapshot_encoder: SnapshotEncoder = SnapshotEncoder()
+        self.snapshot_decoder: SnapshotDecoder = SnapshotDecoder()
+
+        # Client: the own paddle is predicted, the ball and the server paddle are interpolated
+        self.predictor: PaddlePredictor = PaddlePredictor()
+        self.interpolation: InterpolationBuffer = InterpolationBuffer(tick_duration=self.simulation.tick_duration)
+        # Watches a match of a dedicated server, nothing is sent and both paddles come from the snapshots
+        self.spectator: bool = self.network.spectate_match is not None
+        # Server: the newest input sequence of the client that was applied
+        self.client_sequence: int = 0
+
+        # Rollback mode: both peers simulate and only exchange inputs
+        self.rollback: RollbackSession = None
+        self.space_pressed: bool = False  # space is an input in rollback mode, it is sent to the peer
+        if rollback_seed:
+            self.rollback = RollbackSession(self.simulation, self.network.is_server)
+            decode = protocol.decode_inputs
+        elif self.network.is_server:
+            decode = protocol.decode_paddle
+        else:
+            decode = self.decode_snapshot
+
+        # Server: every tick is written into a replay file (see replay.py), the rollback mode has no server state
+        self.recorder: ReplayRecorder = None
+        if self.network.is_server and self.rollback is None:
+            self.recorder = ReplayRecorder(
+                new_replay_path(), self.screen_width, self.screen_height, self.tick_rate, self.ball_count)
+
+        # After the handshake the network runs in the background, the game loop never waits for it
+        self.network_worker: NetworkWorker = NetworkWorker(self.network, decode)
+        self.network_worker.start()
+        self.received_version: int = 0  # version of the last message of the peer that was applied
+        self.sent_state: tuple = None  # (game_state, player1_score, player2_score) of the last sent snapshot
+
+        # Where the time of every frame goes, F3 shows it (see perf_metrics.py)
+        self.metrics: FrameMetrics = FrameMetrics()
+        self.hud: PerfHud = PerfHud(self.metrics)
+        self.metrics_exporter: Optional[MetricsExporter] = None
+        if metrics_path is not None:
+            self.metrics_exporter = MetricsExporter(self.metrics, metrics_path)
+            self.metrics_exporter.start()
+
+    def interpolate_positions(self, alpha: float) -> tuple:
+        """
+        Blends the positions of the previous and the current tick, so the movement is smooth
+        when more frames are rendered than ticks simulated. Jumps (e.g. the ball reset) are not blended.
+        """
+        return tuple(
+            current if abs(current - previous) > 100 else previous + (current - previous) * alpha
+            for previous, current in zip(self.previous_positions, self.simulation.positions())
+        )
 
-    def calculate_ball_angle(self, paddle_pos: float, ball_pos: float) -> float:
+    def decode_snapshot(self, message) -> SendData:
         """
-        Calculates the angle of the ball after it hits a paddle, based on the position of the ball and the paddle.
+        Decodes a snapshot on the client and adds it to the interpolation buffer.
+        Runs in the network thread, so the arrival time is taken when the snapshot arrived.
 
         Args:
-            paddle_pos (float): the position of the paddle
-            ball_pos (float): the position of the ball
+            message (bytes-like): the DELTA message
 
         Returns:
-            float: the angle of the ball after it hits a paddle
+            SendData: the snapshot, None if it could not be decoded
         """
-        relative_y: float = ball_pos - paddle_pos
-        normalized_relative_y: float = (relative_y - 25) / 25
-        max_angle: float = math.pi * 3 / 4
-        angle: float = math.sin(normalized_relative_y * math.pi / 2) * max_angle
-        return -angle
-
-    def reset_ball(self):
+        with tracing.span("decode snapshot"):
+            data: SendData = self.snapshot_decoder.decode(message)
+        if data is not None:
+            positions: tuple = (data.player_position, data.ball_x, data.ball_y)
+            if self.spectator:
+                positions += (data.client_position,)
+            self.interpolation.add(self.snapshot_decoder.tick, time.monotonic(), positions)
+        return data
+
+    def accept_client_paddle(self, position: float, sequence: int):
         """
-        Resets the ball to the center of the screen and gives it a random direction.
+        Applies the paddle position of the client on the server. The paddle can not move further
+        than the player speed per input of the client, the client corrects its prediction if it did.
+
+        Args:
+            position (float): the position the client sent
+            sequence (int): the input sequence of the position
         """
-        self.ball_x: int = self.screen_width // 2
-        self.ball_y: int = self.screen_height // 2
-        self.ball_dx: float = self.ball_speed if random.random() < 0.5 else - \
-            self.ball_speed
-        self.ball_dy: float = self.ball_speed if random.random() < 0.5 else - \
-            self.ball_speed
-
-    def handle_events(self):
+        steps: int = (sequence - self.client_sequence) % SEQUENCE_MODULO
+        if steps == 0 or steps > SEQUENCE_MODULO // 2:
+            return  # not newer than the last one
+        self.simulation.paddle2_pos = self.simulation.clamp_paddle(self.simulation.paddle2_pos, position, steps)
+        self.client_sequence = sequence
+
+    def handle_events(self, events: list):
         """
         Handles the events of the game. (e.g. key presses)
 
+        Args:
+            events (list): the events since the last frame
+
         Returns:
             bool: True if the game should continue running, False if the game should stop.
         """
-        for event in pygame.event.get():
+        for event in events:
+            self.pacer.handle_event(event)
             if event.type == pygame.QUIT:
                 return False
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self.renderer.invalidate()  # the window was covered, the display lost what was not updated
             elif event.type == pygame.KEYDOWN:
-                if self.game_state == "start":
+                if event.key == HUD_KEY:
+                    self.hud.toggle()
+                elif event.key == TRACE_KEY:
+                    tracing.save(background=True)
+                elif self.rollback is not None:
+                    # the state only changes in the simulation, so both peers change it in the same frame
                     if event.key == pygame.K_SPACE:
-                        self.game_state = "playing"
-                elif self.game_state == "game_over":
-                    if event.key == pygame.K_SPACE:
-                        self.game_state = "start"
-                        self.player1_score = 0
-                        self.player2_score = 0
-                        self.reset_ball()
+                        self.space_pressed = True
+                elif event.key == pygame.K_SPACE and not self.spectator:
+                    self.simulation.press_space()
         return True
 
     def update_game(self, keys):
@@ -137,105 +260,190 @@ class Game:
         Args:
             keys (_type_): _description_
         """
-        if self.game_state == "playing":
-            if self.network.is_server:
-                if keys[pygame.K_w] and self.paddle1_pos > 0:
-                    self.paddle1_pos -= self.player_speed
-                if keys[pygame.K_s] and self.paddle1_pos < self.screen_height - 50:
-                    self.paddle1_pos += self.player_speed
-            else:
-                if keys[pygame.K_UP] and self.paddle2_pos > 0:
-                    self.paddle2_pos -= self.player_speed
-                if keys[pygame.K_DOWN] and self.paddle2_pos < self.screen_height - 50:
-                    self.paddle2_pos += self.player_speed
-
-            if self.network.is_server:
-
-                self.ball_x += self.ball_dx
-                self.ball_y += self.ball_dy
-
-                if self.ball_x < 0:
-                    self.player2_score += 1
-                    self.reset_ball()
-                elif self.ball_x > self.screen_width:
-                    self.player1_score += 1
-                    self.reset_ball()
-
-                if self.player1_score >= 10 or self.player2_score >= 10:
-                    self.game_state = "game_over"
-
-                if self.ball_y <= self.ball_size // 2 or self.ball_y >= self.screen_height - 1 - self.ball_size // 2:
-                    self.ball_dy *= -1
-
-                if self.ball_x == 30 and self.paddle1_pos <= self.ball_y < self.paddle1_pos + 50:
-                    ball_angle = self.calculate_ball_angle(
-                        self.paddle1_pos, self.ball_y)
-                    self.ball_dx = abs(self.ball_dx)
-                    self.ball_dy = -math.sin(ball_angle) * self.ball_speed
-                    self.ball_dy += random.uniform(-1, 1)
-                if self.ball_x == self.screen_width - 50 and self.paddle2_pos <= self.ball_y < self.paddle2_pos + 50:
-                    ball_angle = self.calculate_ball_angle(
-                        self.paddle2_pos, self.ball_y)
-                    self.ball_dx = -abs(self.ball_dx)
-                    self.ball_dy = -math.sin(ball_angle) * self.ball_speed
-                    self.ball_dy += random.uniform(-1, 1)
-
-            # Send and receive player positions
+        if self.rollback is not None:
+            self.update_rollback(keys)
+            return
+        if self.spectator:
+            self.update_spectator()
+            return
+
+        simulation: PongSimulation = self.simulation
+        metrics: FrameMetrics = self.metrics
+        if simulation.game_state == "playing":
+            with tracing.span("physics"):
+                if self.network.is_server:
+                    # The client paddle is moved by the client, it arrives over the network
+                    server_input: int = input_bits(keys[pygame.K_w], keys[pygame.K_s])
+                    simulation.step(server_input, 0)
+                else:
+                    # The ball and the server paddle come from the server, only the own paddle is simulated
+                    simulation.move_paddles(0, input_bits(keys[pygame.K_UP], keys[pygame.K_DOWN]))
+            metrics.mark(PHYSICS)
+
+            # Send and receive player positions, without waiting for the network
+            self.network_worker.check()
+            version, received = self.network_worker.latest()
             if self.network.is_server:
-                data: SendData = SendData(
-                    self.paddle1_pos, self.game_state, self.ball_x, self.ball_y, self.player1_score, self.player2_score)
-                self.network.send_data(data)
-                self.paddle2_pos = self.network.receive_data()
+                if version != self.received_version:
+                    self.received_version = version
+                    position, acked_tick, sequence = received
+                    self.snapshot_encoder.acknowledge(acked_tick)
+                    self.accept_client_paddle(position, sequence)
+                metrics.mark(NETWORK)
+
+                state: tuple = (simulation.game_state, simulation.player1_score, simulation.player2_score)
+                self.snapshot.update(
+                    simulation.paddle1_pos, simulation.game_state, simulation.ball_x, simulation.ball_y,
+                    simulation.player1_score, simulation.player2_score, simulation.paddle2_pos, self.client_sequence,
+                    simulation.balls.pack() if simulation.balls is not None else None)
+                # Score and game state changes must reach the client, over udp a snapshot can get lost
+                changed: bool = state != self.sent_state
+                self.sent_state = state
+                # Reliable messages can arrive after newer ones, so they must not depend on a base
+                with tracing.span("encode snapshot"):
+                    message: bytes = self.snapshot_encoder.encode(self.snapshot, keyframe=changed)
+                metrics.mark(SERIALIZE)
+                self.network_worker.post(message, reliable=changed)
+                metrics.mark(NETWORK)
+                if self.recorder is not None:
+                    # The input of the client is not sent, only its paddle, so it is taken from the movement
+                    client_moved: float = simulation.paddle2_pos - self.previous_positions[1]
+                    self.recorder.record(self.snapshot, server_input, input_bits(client_moved < 0, client_moved > 0))
+                    metrics.mark(SERIALIZE)
 
             else:
-                data: SendData = self.network.receive_data()
-                self.paddle1_pos = data.player_position
-                self.ball_x = data.ball_x
-                self.ball_y = data.ball_y
-                self.game_state = data.game_state
-                self.player1_score = data.server_score
-                self.player2_score = data.client_score
-                self.network.send_data(self.paddle2_pos)
-
-    def render_game(self):
+                sequence: int = self.predictor.record(simulation.paddle2_pos)
+                if version != self.received_version:
+                    self.received_version = version
+                    data: SendData = received
+                    simulation.game_state = data.game_state
+                    simulation.player1_score = data.server_score
+                    simulation.player2_score = data.client_score
+                    simulation.paddle2_pos += self.predictor.reconcile(data.client_position, data.input_sequence)
+                    if data.balls is not None and simulation.balls is not None:
+                        simulation.balls.unpack(data.balls)
+                metrics.mark(NETWORK)
+
+                with tracing.span("interpolate"):
+                    positions = self.interpolation.sample(time.monotonic())
+                if positions is not None:
+                    simulation.paddle1_pos, simulation.ball_x, simulation.ball_y = positions
+                metrics.mark(PHYSICS)
+                with tracing.span("encode paddle"):
+                    message = protocol.encode_paddle(
+                        simulation.paddle2_pos, self.snapshot_decoder.acked_tick, sequence)
+                metrics.mark(SERIALIZE)
+                self.network_worker.post(message)
+                metrics.mark(NETWORK)
+
+    def update_spectator(self):
+        """
+        Updates the game of a spectator: everything comes from the snapshots, in every game state.
+        """
+        simulation: PongSimulation = self.simulation
+        self.network_worker.check()
+        version, received = self.network_worker.latest()
+        if version != self.received_version:
+            self.received_version = version
+            data: SendData = received
+            simulation.game_state = data.game_state
+            simulation.player1_score = data.server_score
+            simulation.player2_score = data.client_score
+        self.metrics.mark(NETWORK)
+
+        with tracing.span("interpolate"):
+            positions = self.interpolation.sample(time.monotonic())
+        if positions is not None:
+            simulation.paddle1_pos, simulation.ball_x, simulation.ball_y, simulation.paddle2_pos = positions
+        self.metrics.mark(PHYSICS)
+
+    def update_rollback(self, keys):
+        """
+        Updates the game in rollback mode: applies the inputs of the peer, rolls back if a prediction
+        was wrong, simulates the next frame and sends the own inputs.
+
+        Args:
+            keys (_type_): the pressed keys
+        """
+        self.network_worker.check()
+        version, received = self.network_worker.latest()
+        if version != self.received_version:
+            self.received_version = version
+            with tracing.span("rollback receive"):
+                self.rollback.receive(received)
+        self.metrics.mark(NETWORK)
+
+        if self.network.is_server:
+            local_input: int = input_bits(keys[pygame.K_w], keys[pygame.K_s], self.space_pressed)
+        else:
+            local_input = input_bits(keys[pygame.K_UP], keys[pygame.K_DOWN], self.space_pressed)
+
+        # Too far ahead of the peer, wait for its inputs instead of predicting even more
+        if self.rollback.can_advance():
+            self.space_pressed = False
+            with tracing.span("physics"):
+                self.rollback.advance(local_input)
+        self.metrics.mark(PHYSICS)
+
+        with tracing.span("encode inputs"):
+            message: bytes = protocol.encode_inputs(*self.rollback.message())
+        self.metrics.mark(SERIALIZE)
+        self.network_worker.post(message)
+        self.metrics.mark(NETWORK)
+
+    def render_game(self, alpha: float = 1.0):
         """
         Renders the game. (e.g. draws the paddles, ball, and score)
+
+        Args:
+            alpha (float, optional): how far the time is between the previous and the current tick (0 to 1)
         """
-        self.screen.fill((0, 0, 0))
-        if self.game_state == "start":
-            start_font = pygame.font.Font(None, 36)
-            start_text = start_font.render(
-                "Press SPACE to start", True, (255, 255, 255))
-            self.screen.blit(start_text, (self.screen_width // 2 -
-                             start_text.get_width() // 2, self.screen_height // 2))
-        elif self.game_state == "playing":
-            pygame.draw.rect(self.screen, (255, 255, 255),
-                             pygame.Rect(20, self.paddle1_pos, 10, 50))
-            pygame.draw.rect(self.screen, (255, 255, 255), pygame.Rect(
-                self.screen_width - 40, self.paddle2_pos, 10, 50))
-            pygame.draw.circle(self.screen, (255, 255, 255),
-                               (self.ball_x, self.ball_y), self.ball_size // 2)
-            score_font = pygame.font.Font(None, 36)
-            player1_text = score_font.render(
-                "Player 1: " + str(self.player1_score), True, (255, 255, 255))
-            player2_text = score_font.render(
-                "Player 2: " + str(self.player2_score), True, (255, 255, 255))
-            self.screen.blit(player1_text, (10, 10))
-            self.screen.blit(player2_text, (self.screen_width -
-                             player2_text.get_width() - 10, 10))
-        elif self.game_state == "game_over":
-            start_font = pygame.font.Font(None, 36)
-            game_over_font = pygame.font.Font(None, 48)
-            game_over_text = game_over_font.render(
-                "Game Over", True, (255, 255, 255))
-            self.screen.blit(game_over_text, (self.screen_width // 2 - game_over_text.get_width(
-            ) // 2, self.screen_height // 2 - game_over_text.get_height() // 2))
-            restart_text = start_font.render(
-                "Press SPACE to restart", True, (255, 255, 255))
-            self.screen.blit(restart_text, (self.screen_width // 2 - restart_text.get_width(
-            ) // 2, self.screen_height // 2 + restart_text.get_height() // 2))
-
-        pygame.display.flip()
+        simulation: PongSimulation = self.simulation
+        paddle1_pos, paddle2_pos, ball_x, ball_y = self.interpolate_positions(alpha)
+        assets: AssetCache = get_assets()
+        # The renderer decides how the frame gets to the window, e.g. only the changed rectangles
+        renderer = self.renderer
+        with tracing.span("render begin"):
+            renderer.begin(simulation.game_state)
+        if simulation.game_state == "start":
+            with tracing.span("render texts"):
+                start_text = assets.text("Press SPACE to start", 36)
+                renderer.blit(start_text, (self.screen_width // 2 - start_text.get_width() // 2,
+                                           self.screen_height // 2))
+        elif simulation.game_state == "playing":
+            with tracing.span("render paddles"):
+                paddle = assets.paddle(10, 50)
+                renderer.blit(paddle, (20, paddle1_pos))
+                renderer.blit(paddle, (self.screen_width - 40, paddle2_pos))
+            with tracing.span("render balls"):
+                radius: int = simulation.ball_size // 2
+                ball = assets.ball(simulation.ball_size)
+                renderer.blit(ball, (ball_x - radius, ball_y - radius))
+                if simulation.balls is not None:
+                    # Ball 0 is the normal ball and already drawn
+                    renderer.blits(ball, [(x - radius, y - radius) for x, y in zip(
+                        simulation.balls.x[1:].tolist(), simulation.balls.y[1:].tolist())])
+            with tracing.span("render score"):
+                player1_text = assets.text("Player 1: " + str(simulation.player1_score), 36)
+                player2_text = assets.text("Player 2: " + str(simulation.player2_score), 36)
+                renderer.blit(player1_text, (10, 10))
+                renderer.blit(player2_text, (self.screen_width - player2_text.get_width() - 10, 10))
+        elif simulation.game_state == "game_over":
+            with tracing.span("render texts"):
+                game_over_text = assets.text("Game Over", 48)
+                renderer.blit(game_over_text, (self.screen_width // 2 - game_over_text.get_width(
+                ) // 2, self.screen_height // 2 - game_over_text.get_height() // 2))
+                restart_text = assets.text("Press SPACE to restart", 36)
+                renderer.blit(restart_text, (self.screen_width // 2 - restart_text.get_width(
+                ) // 2, self.screen_height // 2 + restart_text.get_height() // 2))
+
+        # ReplayPlayer and benchmark_render.py reuse this method without a HUD
+        hud: Optional[PerfHud] = getattr(self, "hud", None)
+        if hud is not None:
+            with tracing.span("render hud"):
+                hud.draw(renderer)
+        with tracing.span("render present"):
+            renderer.present()
 
     def run(self):
         """
@@ -245,16 +453,68 @@ class Game:
             Network: The network object, which can be used to send and receive data.
         """
         running: bool = True
+        accumulator: float = 0
+        last_time: float = time.perf_counter()
+        events: list = []  # the events that woke up the loop
+        first_frame: bool = True
+        metrics: FrameMetrics = self.metrics
         while running:
+            # The sleep at the end of the last frame is part of it
+            metrics.next_frame(time.perf_counter(), self.network.bytes_sent, self.network.bytes_received,
+                               self.network_worker.decode_time)
             keys = pygame.key.get_pressed()
 
-            running = self.handle_events()
-
-            self.update_game(keys)
-
-            self.render_game()
-
-            self.clock.tick(60)
-
+            running = self.handle_events(events + pygame.event.get())
+            metrics.mark(EVENTS)
+
+            # The simulation advances in fixed ticks, however long the frame took
+            now: float = time.perf_counter()
+            accumulator += min(now - last_time, MAX_FRAME_TIME)
+            last_time = now
+            tick_duration: float = self.simulation.tick_duration
+            while accumulator >= tick_duration:
+                self.previous_positions = self.simulation.positions()
+                self.update_game(keys)
+                accumulator -= tick_duration
+                metrics.add(TICKS)
+            metrics.mark(PHYSICS)
+            if self.hud.update(now, self.network):
+                self.pacer.redraw = True
+
+            # The start and game over screens only change with the game state or after events
+            playing: bool = self.simulation.game_state == "playing"
+            if playing or self.pacer.redraw or self.simulation.game_state != self.renderer.state:
+                self.pacer.redraw = False
+                self.render_game(accumulator / tick_duration)
+                metrics.mark(RENDER)
+                if first_frame and self.network.connected_at is not None:
+                    print(f"first frame {(time.perf_counter() - self.network.connected_at) * 1000:.1f} ms "
+                          f"after connecting")
+                first_frame = False
+
+            if playing and not self.pacer.idle:
+                metrics.set(TARGET, 1000 / self.max_fps)
+                self.clock.tick(self.max_fps)
+                events = []
+            elif self.pacer.idle:
+                # The simulation still catches up on all ticks, MAX_FRAME_TIME is longer than an idle frame
+                metrics.set(TARGET, self.pacer.idle_timeout())
+                events = self.pacer.wait(self.pacer.idle_timeout())
+            else:
+                # Sleep until the next tick, but wake up at once for input (e.g. SPACE)
+                metrics.set(TARGET, (tick_duration - accumulator) * 1000)
+                events = self.pacer.wait((tick_duration - accumulator) * 1000)
+
+        self.network_worker.stop()
+        if self.network.rtt is not None:
+            print(f"Round trip time {self.network.rtt * 1000:.1f} ms, jitter {self.network.jitter * 1000:.1f} ms, "
+                  f"clock offset {self.network.clock_offset * 1000:.1f} ms")
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.close()
+        tracing.save()
+        if self.recorder is not None:
+            self.recorder.close()
+        self.renderer.close()
         pygame.quit()
+        get_assets().clear()  # the surfaces do not survive pygame.quit()
         return self.network
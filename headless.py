@@ -0,0 +1,72 @@
+"""
+Runs PongSimulation without a display, two bots play each other as fast as possible.
+Prints the result and how many ticks per second the simulation runs.
+
+Usage: python headless.py [ticks] [ball_speed] [player_speed]     (e.g. 1000000 5 8)
+"""
+import sys
+import time
+
+from rollback import INPUT_DOWN, INPUT_SPACE, INPUT_UP
+from simulation import PongSimulation
+
+
+def follow_ball(simulation: PongSimulation, paddle_pos: float, miss: float = 0) -> int:
+    """
+    A simple bot: moves the paddle towards the ball and starts the game when it is not running.
+
+    Args:
+        simulation (PongSimulation): the game
+        paddle_pos (float): the position of the paddle of the bot
+        miss (float, optional): the bot aims this many pixels next to the ball, so games end
+
+    Returns:
+        int: the input bits for this tick
+    """
+    if simulation.game_state != "playing":
+        return INPUT_SPACE
+    target: float = simulation.ball_y + miss - 25
+    if target < paddle_pos - simulation.paddle_step:
+        return INPUT_UP
+    if target > paddle_pos + simulation.paddle_step:
+        return INPUT_DOWN
+    return 0
+
+
+def run(simulation: PongSimulation, ticks: int) -> dict:
+    """
+    Lets two bots play for the given number of ticks.
+
+    Returns:
+        dict: the number of finished games and points of each player
+    """
+    results: dict = {"games": 0, "player1": 0, "player2": 0}
+    for tick in range(ticks):
+        was_over: bool = simulation.game_state == "game_over"
+        # Player 2 aims a bit off, so it loses points now and then
+        simulation.step(follow_ball(simulation, simulation.paddle1_pos),
+                        follow_ball(simulation, simulation.paddle2_pos, 20 if tick % 2000 < 400 else 0))
+        if simulation.game_state == "game_over" and not was_over:
+            results["games"] += 1
+            results["player1"] += simulation.player1_score
+            results["player2"] += simulation.player2_score
+    return results
+
+
+def main():
+    ticks: int = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    ball_speed: float = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    player_speed: float = float(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    simulation: PongSimulation = PongSimulation(ball_speed=ball_speed, player_speed=player_speed, seed=1)
+    start: float = time.perf_counter()
+    results: dict = run(simulation, ticks)
+    duration: float = time.perf_counter() - start
+
+    print(f"{ticks} ticks in {duration:.2f} s: {ticks / duration:,.0f} ticks/s "
+          f"({ticks / duration / simulation.tick_rate:,.0f}x real time)")
+    print(f"{results['games']} games finished, points player 1: {results['player1']}, player 2: {results['player2']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import collections
+from typing import Deque, Optional, Tuple
+
+TICK_MODULO: int = 1 << 16
+# If packets suddenly arrive this much later (e.g. the server paused sending), the timing starts over
+RESYNC_THRESHOLD: float = 0.5
+
+
+class InterpolationBuffer:
+    """
+    Jitter buffer for the entities the client does not control (ball and server paddle).
+
+    Snapshots are stored with the server tick and the local time they arrived. The client renders
+    a little in the past, between the two snapshots around the render time, so late or uneven packets
+    do not show up as stutter. The delay adapts to the measured jitter. If no newer snapshot has
+    arrived yet, the positions are extrapolated for a short time.
+
+    add() is called from the network thread and sample() from the game loop, appending to a deque
+    and copying it are atomic, so no lock is needed.
+    """
+
+    def __init__(self, tick_duration: float = 1 / 60, min_delay: float = 1 / 60, max_extrapolation: float = 0.1,
+                 snap_distance: float = 100, size: int = 32):
+        """
+        Args:
+            tick_duration (float, optional): time between two ticks of the server in seconds
+            min_delay (float, optional): the smallest render delay behind the newest snapshot
+            max_extrapolation (float, optional): how far to extrapolate when packets are late, in seconds
+            snap_distance (float, optional): jumps larger than this (e.g. the ball reset) are not interpolated
+            size (int, optional): number of snapshots kept
+        """
+        self.tick_duration: float = tick_duration
+        self.min_delay: float = min_delay
+        self.max_extrapolation: float = max_extrapolation
+        self.snap_distance: float = snap_distance
+        self.snapshots: Deque[Tuple[float, tuple]] = collections.deque(maxlen=size)  # (server time, values)
+
+        self.last_tick: Optional[int] = None
+        self.ticks: int = 0      # tick counter without the 16 bit wrap around
+        self.offset: Optional[float] = None  # local time - server time, of the fastest packets
+        self.jitter: float = 0
+        self.delay: float = min_delay
+
+    def add(self, tick: int, arrival: float, values: tuple) -> None:
+        """
+        Adds a snapshot.
+
+        Args:
+            tick (int): the server tick of the snapshot
+            arrival (float): the local time the snapshot arrived (time.monotonic())
+            values (tuple): the positions to interpolate
+        """
+        if self.last_tick is not None:
+            step: int = (tick - self.last_tick) % TICK_MODULO
+            if step == 0 or step > TICK_MODULO // 2:
+                return  # older than the newest one
+            self.ticks += step
+        self.last_tick = tick
+        server_time: float = self.ticks * self.tick_duration
+
+        # The offset follows the fastest packets right away and drifts up slowly,
+        # how much later than that the packets arrive is the jitter
+        offset: float = arrival - server_time
+        if self.offset is None or offset < self.offset or offset - self.offset > RESYNC_THRESHOLD:
+            self.offset = offset
+        else:
+            self.offset += (offset - self.offset) * 0.01
+        self.jitter += (abs(offset - self.offset) - self.jitter) * 0.1
+        self.delay = max(self.min_delay, self.tick_duration + 2 * self.jitter)
+
+        self.snapshots.append((server_time, values))
+
+    def sample(self, now: float) -> Optional[tuple]:
+        """
+        Returns the interpolated positions for the given local time.
+
+        Args:
+            now (float): the local time (time.monotonic())
+
+        Returns:
+            Optional[tuple]: the positions, None if no snapshot arrived yet
+        """
+        snapshots = list(self.snapshots)
+        if not snapshots:
+            return None
+        render_time: float = now - self.offset - self.delay
+
+        newest_time, newest = snapshots[-1]
+        if render_time >= newest_time:
+            if len(snapshots) < 2:
+                return newest
+            previous_time, previous = snapshots[-2]
+            # Late packet: continue the movement of the last two snapshots, but only for a short time
+            ahead: float = min(render_time - newest_time, self.max_extrapolation)
+            return self.blend(previous, newest, 1 + ahead / (newest_time - previous_time))
+
+        for index in range(len(snapshots) - 1, 0, -1):
+            previous_time, previous = snapshots[index - 1]
+            if previous_time <= render_time:
+                next_time, following = snapshots[index]
+                return self.blend(previous, following, (render_time - previous_time) / (next_time - previous_time))
+        return snapshots[0][1]
+
+    def blend(self, a: tuple, b: tuple, t: float) -> tuple:
+        """
+        Interpolates (0 <= t <= 1) or extrapolates (t > 1) between two snapshots.
+        Values that jumped (e.g. the ball after a point) are not blended, they switch once b is reached.
+        """
+        return tuple(
+            (y if t >= 1 else x) if abs(y - x) > self.snap_distance else x + (y - x) * t
+            for x, y in zip(a, b)
+        )
@@ -0,0 +1,373 @@
+"""
+Lobby: one address for all players, the matches run in worker processes on the other cpu cores.
+
+Players join the lobby with "JOIN GAME" and the ip of the lobby and wait in a queue. Every two players get a
+match: the lobby picks the worker with the lowest load, takes a port from its PortAllocator and tells the worker
+to open the match on that port. Then it sends both players the port (SettingCode.MATCH_PORT), they reconnect
+there and the worker runs the match like the dedicated server (see dedicated_server.py).
+The workers report their load every LOAD_INTERVAL seconds, that decides where the next match goes.
+
+Only tcp.
+
+Usage: python lobby.py [--port 5555] [--workers 3] [--first-match-port 5556] [--match-ports 1000] ...
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from multiprocessing.connection import Connection
+from typing import Dict, List, Optional
+
+import protocol
+from dedicated_server import DedicatedServer, Player
+from protocol import ProtocolError, SettingCode
+
+# Seconds the players have to connect to the port of their match, after that the worker closes it. Also the
+# time a worker has to answer when it is asked to open a port.
+JOIN_TIMEOUT: float = 10.0
+# A port the lobby heard nothing about for this long is given out again, e.g. after a worker died
+LEASE_TIMEOUT: float = 3 * JOIN_TIMEOUT
+LOAD_INTERVAL: float = 1.0
+# Tries with another port when a worker can not open one, e.g. because another program uses it
+PLACEMENT_ATTEMPTS: int = 5
+
+
+class PortAllocator:
+    """
+    Hands out the ports for the matches from a fixed range, without asking the system which ports are in use.
+
+    Free ports are a stack, so a port that was just released is given out again first, it is known to work.
+    A port is leased until the worker reports that the match started. A lease that neither started nor was
+    released in time is evicted, so a lost message does not lose the port. A port a worker could not open
+    is not given out again.
+    """
+
+    def __init__(self, first_port: int, count: int, lease_timeout: float = LEASE_TIMEOUT):
+        """
+        Args:
+            first_port (int): the first port of the range
+            count (int): the number of ports, this is the maximum number of matches
+            lease_timeout (float, optional): seconds until a lease that did not start is evicted
+        """
+        self.free: List[int] = list(reversed(range(first_port, first_port + count)))
+        self.leases: Dict[int, float] = {}  # port -> time the lease is evicted, inf when the match is running
+        self.lease_timeout: float = lease_timeout
+
+    def allocate(self, now: float) -> Optional[int]:
+        """
+        Returns a free port, or None if all ports are used.
+        """
+        if not self.free:
+            self.evict(now)
+            if not self.free:
+                return None
+        port: int = self.free.pop()
+        self.leases[port] = now + self.lease_timeout
+        return port
+
+    def confirm(self, port: int):
+        """
+        The match on the port started, it keeps the port until it is released.
+        """
+        if port in self.leases:
+            self.leases[port] = float("inf")
+
+    def release(self, port: int, broken: bool = False):
+        """
+        Gives the port back.
+
+        Args:
+            port (int): the port
+            broken (bool, optional): the port could not be opened, do not give it out again
+        """
+        if self.leases.pop(port, None) is not None and not broken:
+            self.free.append(port)
+
+    def evict(self, now: float):
+        expired: List[int] = [port for port, until in self.leases.items() if until < now]
+        for port in expired:
+            print(f"port {port} evicted")
+            self.release(port)
+
+
+class MatchWorker(DedicatedServer):
+    """
+    Runs in a worker process: opens one port per match when the lobby asks for it and reports the load.
+    """
+
+    def __init__(self, connection: Connection, host: str, **settings):
+        """
+        Args:
+            connection (Connection): the pipe to the lobby
+            host (str): the address to listen on
+            settings: the settings of DedicatedServer
+        """
+        super().__init__(host, 0, **settings)
+        self.connection: Connection = connection
+        self.listeners: Dict[int, asyncio.AbstractServer] = {}  # the match ports that wait for players
+        self.connections: Dict[int, int] = {}  # open connections per port
+
+    async def serve(self):
+        asyncio.get_running_loop().add_reader(self.connection.fileno(), self.handle_command)
+        await asyncio.gather(self.scheduler.run(), self.report_load())
+
+    def handle_command(self):
+        while self.connection.poll():
+            command, port = self.connection.recv()
+            if command == "open":
+                asyncio.ensure_future(self.open_match(port))
+
+    async def report_load(self):
+        while True:
+            slots: int = len(self.scheduler.matches) + len(self.listeners)
+            self.connection.send(("load", slots, self.scheduler.load))
+            await asyncio.sleep(LOAD_INTERVAL)
+
+    async def open_match(self, port: int):
+        try:
+            self.listeners[port] = await asyncio.start_server(self.handle_client, self.host, port)
+        except OSError as error:
+            print(f"can not open port {port}: {error!r}")
+            self.connection.send(("failed", port))
+            return
+        self.connection.send(("ready", port))
+
+        await asyncio.sleep(JOIN_TIMEOUT)
+        if port in self.listeners:
+            # Not both players came, send the one that is there away
+            self.listeners.pop(port).close()
+            waiting: Optional[Player] = self.waiting.get(port)
+            if waiting is not None:
+                waiting.close()
+            self.finish(port)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        port: int = writer.get_extra_info("sockname")[1]
+        self.connections[port] = self.connections.get(port, 0) + 1
+        await super().handle_client(reader, writer)
+
+    def start_match(self, player1: Player, player2: Player, port: int):
+        super().start_match(player1, player2, port)
+        self.listeners.pop(port).close()
+        self.connection.send(("started", port))
+
+    def player_left(self, player: Player, port: int):
+        super().player_left(player, port)
+        self.connections[port] -= 1
+        self.finish(port)
+
+    def finish(self, port: int):
+        """
+        Gives the port back to the lobby when nobody is connected anymore and nobody can connect.
+        """
+        if port not in self.listeners and not self.connections.get(port):
+            self.connections.pop(port, None)
+            self.connection.send(("closed", port))
+
+
+def run_worker(connection: Connection, core: Optional[int], host: str, settings: dict):
+    """
+    The main function of a worker process.
+
+    Args:
+        connection (Connection): the pipe to the lobby
+        core (int, optional): the cpu core to run on, None to let the system decide
+        host (str): the address to listen on
+        settings (dict): the settings of DedicatedServer
+    """
+    if core is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {core})
+    try:
+        asyncio.run(MatchWorker(connection, host, **settings).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+class WorkerHandle:
+    """
+    The lobby side of a worker process.
+    """
+
+    def __init__(self, index: int, core: Optional[int], host: str, settings: dict):
+        self.index: int = index
+        self.connection, worker_connection = multiprocessing.Pipe()
+        self.process: multiprocessing.Process = multiprocessing.Process(
+            target=run_worker, args=(worker_connection, core, host, settings), daemon=True)
+        self.process.start()
+        self.slots: int = 0  # matches and open match ports in the last report
+        self.load: float = 0  # the load in the last report, see TickScheduler.load
+        self.placed: int = 0  # matches placed since the last report
+
+    def expected_load(self) -> tuple:
+        """
+        The load with the matches placed since the last report, estimated with the load per match.
+        Workers without a measured load are ordered by the number of matches.
+        """
+        slots: int = self.slots + self.placed
+        if self.slots == 0 or self.load == 0:
+            return (0, slots)
+        return (self.load / self.slots * slots, slots)
+
+
+class Lobby:
+    def __init__(self, host: str, port: int, workers: int, first_match_port: int, match_ports: int,
+                 match_host: str, settings: dict):
+        """
+        Args:
+            host (str): the address of the lobby
+            port (int): the port of the lobby
+            workers (int): the number of worker processes
+            first_match_port (int): the first port for the matches
+            match_ports (int): the number of ports for the matches
+            match_host (str): the address the workers listen on
+            settings (dict): the settings of DedicatedServer
+        """
+        self.host: str = host
+        self.port: int = port
+        self.allocator: PortAllocator = PortAllocator(first_match_port, match_ports)
+        self.queue: deque = deque()  # the players that wait for an opponent
+        self.pending: Dict[int, asyncio.Future] = {}  # port -> the answer of the worker to "open"
+        self.match_workers: Dict[int, WorkerHandle] = {}  # port -> the worker of the match
+
+        cores: List[Optional[int]] = [None]
+        if hasattr(os, "sched_getaffinity"):
+            cores = sorted(os.sched_getaffinity(0))
+        self.workers: List[WorkerHandle] = [
+            WorkerHandle(index, cores[index % len(cores)], match_host, settings) for index in range(workers)]
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        for worker in self.workers:
+            loop.add_reader(worker.connection.fileno(), self.handle_worker, worker)
+        server = await asyncio.start_server(self.handle_client, self.host, self.port, backlog=128)
+        print(f"Lobby listening on {self.host}:{self.port} with {len(self.workers)} workers")
+        async with server:
+            await server.serve_forever()
+
+    def handle_worker(self, worker: WorkerHandle):
+        while worker.connection.poll():
+            try:
+                message: tuple = worker.connection.recv()
+            except EOFError:
+                self.remove_worker(worker)
+                return
+            if message[0] == "load":
+                _, worker.slots, worker.load = message
+                worker.placed = 0
+                continue
+            command, port = message
+            if command in ("ready", "failed") and port in self.pending:
+                self.pending.pop(port).set_result(command == "ready")
+            if command == "failed":
+                self.allocator.release(port, broken=True)
+                self.match_workers.pop(port, None)
+            elif command == "started":
+                self.allocator.confirm(port)
+            elif command == "closed":
+                self.allocator.release(port)
+                self.match_workers.pop(port, None)
+
+    def remove_worker(self, worker: WorkerHandle):
+        """
+        Forgets a worker whose process is gone. The ports of its matches are given back.
+        """
+        print(f"worker {worker.index} is gone")
+        asyncio.get_running_loop().remove_reader(worker.connection.fileno())
+        worker.connection.close()
+        self.workers.remove(worker)
+        for port in [port for port, match_worker in self.match_workers.items() if match_worker is worker]:
+            del self.match_workers[port]
+            self.allocator.release(port)
+            if port in self.pending:
+                self.pending.pop(port).set_result(False)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        player: Player = Player(reader, writer)
+        print(f"{player.name} is waiting, {len(self.queue) + 1} in the queue")
+        self.queue.append(player)
+        # Players that left while waiting are only noticed here, the client sends nothing until it has a match
+        while len(self.queue) >= 2:
+            players: list = [self.queue.popleft() for _ in range(2)]
+            waiting: list = [player for player in players if not player.reader.at_eof()]
+            if len(waiting) < 2:
+                self.queue.extendleft(waiting)
+                continue
+            await self.place_match(waiting)
+
+    async def place_match(self, players: list):
+        """
+        Opens a match on the worker with the lowest load and sends both players there.
+        """
+        loop = asyncio.get_running_loop()
+        port: Optional[int] = None
+        slow: List[WorkerHandle] = []  # workers that did not answer in time, the next try goes elsewhere
+        for _ in range(PLACEMENT_ATTEMPTS):
+            workers: List[WorkerHandle] = [worker for worker in self.workers if worker not in slow]
+            port = self.allocator.allocate(time.monotonic()) if workers else None
+            if port is None:
+                break
+            worker: WorkerHandle = min(workers, key=WorkerHandle.expected_load)
+            worker.placed += 1
+            self.match_workers[port] = worker
+            self.pending[port] = loop.create_future()
+            try:
+                worker.connection.send(("open", port))
+                if await asyncio.wait_for(self.pending[port], JOIN_TIMEOUT):
+                    break
+            except BrokenPipeError:
+                self.remove_worker(worker)
+            except asyncio.TimeoutError:
+                print(f"worker {worker.index} did not open port {port} in time")
+                self.pending.pop(port, None)
+                self.match_workers.pop(port, None)
+                self.allocator.release(port, broken=True)
+                slow.append(worker)
+            port = None
+
+        if port is None:
+            print("no worker could open a port for the match")
+            for player in players:
+                player.close()
+            return
+
+        print(f"match {players[0].name} vs {players[1].name} on port {port} (worker {worker.index})")
+        try:
+            for player in players:
+                player.send(protocol.encode_setting(SettingCode.MATCH_PORT, port))
+            for player in players:
+                protocol.decode_ack(await player.read_frame())
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError) as error:
+            # The other player waits on the match port until the worker closes it
+            print(f"a player left before the match: {error!r}")
+        for player in players:
+            player.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pairs players and runs the matches in worker processes.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--first-match-port", type=int, default=5556)
+    parser.add_argument("--match-ports", type=int, default=1000)
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=600)
+    parser.add_argument("--player-speed", type=int, default=8)
+    parser.add_argument("--ball-speed", type=int, default=5)
+    parser.add_argument("--tick-rate", type=int, default=60)
+    args = parser.parse_args()
+
+    settings: dict = {"width": args.width, "height": args.height, "player_speed": args.player_speed,
+                      "ball_speed": args.ball_speed, "tick_rate": args.tick_rate}
+    lobby: Lobby = Lobby(args.host, args.port, args.workers, args.first_match_port, args.match_ports,
+                         args.host, settings)
+    try:
+        asyncio.run(lobby.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,23 @@
+import argparse
+
 import pygame
 
+import tracing
 from game import Game
 from network import Network
+from renderer import BACKENDS, create_renderer
 
 debug: bool = False
 
 
-def ask_for_start_choice_and_creat_network() -> Network:
+def ask_for_start_choice_and_creat_network(transport: str = "tcp", **network_options) -> Network:
     """
     Asks the user if they want to start a game or join a game and creates a network object.
 
+    Args:
+        transport (str, optional): "tcp" or "udp", see Network
+        network_options: simulated network conditions, passed to Network (e.g. latency)
+
     Returns:
         Network: The network object.
     """
@@ -21,33 +29,78 @@ def ask_for_start_choice_and_creat_network() -> Network:
             "Choose '1' to start a game or '2' to join a game: ")
 
     if start_choice == "1":
-        network = Network(is_server=True)
+        network = Network(is_server=True, transport=transport, **network_options)
         print("Server IP address:", network.host)
 
     elif start_choice == "2":
         server_ip: str = input("Enter the server IP address: ")
-        network = Network(is_server=False, server_ip=server_ip)
+        network = Network(is_server=False, server_ip=server_ip, transport=transport, **network_options)
 
     return network
 
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pong over the network.")
+    parser.add_argument("--transport", choices=("tcp", "udp"), default="tcp",
+                        help="udp drops late snapshots instead of delaying the newer ones (see udp_transport.py), "
+                             "both players need the same one")
+    parser.add_argument("--rollback", action="store_true",
+                        help="host the game in rollback mode: both players simulate and only send their inputs "
+                             "(see rollback.py), the other player gets it from the host")
+    # Simulated network conditions, to try the prediction and interpolation on one machine
+    parser.add_argument("--latency", type=float, default=0.0, metavar="MS",
+                        help="delay every received message by MS milliseconds")
+    parser.add_argument("--jitter", type=float, default=0.0, metavar="MS",
+                        help="delay every received message by up to MS milliseconds more, at random")
+    parser.add_argument("--loss", type=float, default=0.0, metavar="P",
+                        help="udp only: drop an outgoing datagram with the probability P (0 to 1)")
+    parser.add_argument("--reorder", type=float, default=0.0, metavar="P",
+                        help="udp only: send an outgoing datagram after the next one with the probability P (0 to 1)")
+    parser.add_argument("--renderer", choices=BACKENDS, default="surface",
+                        help="surface: software blits, texture: SDL2 textures (see renderer.py)")
+    parser.add_argument("--window", default=None,
+                        help="texture renderer: a fixed window size like 1920x1080, the game is scaled into it")
+    parser.add_argument("--software", action="store_true",
+                        help="texture renderer: use SDL's software renderer instead of the gpu")
+    parser.add_argument("--metrics", default=None, metavar="FILE",
+                        help="write the metrics of every frame to FILE, CSV for a .csv file, else JSON lines")
+    parser.add_argument("--trace", nargs="?", const="", default=None, metavar="FILE",
+                        help="record tracing spans and save them as a Chrome trace to FILE (default: traces/) "
+                             "at the end and on F4")
+    return parser.parse_args()
+
+
 def main():
+    args: argparse.Namespace = parse_args()
+    if args.trace is not None:
+        tracing.enable(args.trace or None)
     pygame.init()
 
     screen_width, screen_height = 800, 600
     game: Game = None
 
+    options: dict = {}
+    if args.renderer == "texture":
+        options["software"] = args.software
+        if args.window is not None:
+            options["window_size"] = tuple(int(value) for value in args.window.lower().split("x"))
+    renderer = create_renderer(args.renderer, (screen_width, screen_height), **options)
+    network_options: dict = {"latency": args.latency / 1000, "latency_jitter": args.jitter / 1000,
+                             "packet_loss": args.loss, "packet_reorder": args.reorder}
+
     if debug:
-        network: Network = ask_for_start_choice_and_creat_network()
+        network: Network = ask_for_start_choice_and_creat_network(args.transport, **network_options)
 
         if network is None:
             print("Invalid input. (network is None)")
             return
 
-        game: Game = Game(screen_width, screen_height, network)
+        game: Game = Game(screen_width, screen_height, network, renderer=renderer, metrics_path=args.metrics,
+                          rollback=args.rollback)
 
     else:
-        game: Game = Game(screen_width, screen_height)
+        game: Game = Game(screen_width, screen_height, renderer=renderer, metrics_path=args.metrics,
+                          transport=args.transport, network_options=network_options, rollback=args.rollback)
 
     if game is None:
         print("Game is None")
@@ -0,0 +1,303 @@
+"""
+Chaos mode: many balls at once, which also bounce off each other.
+
+The balls are stored as NumPy arrays (one per value) and stepped together. Which balls can touch each other
+or a paddle is found with a uniform grid (SpatialGrid), so a tick costs about O(n) instead of
+comparing every pair of balls.
+
+Needs numpy (pip install numpy), it is only imported when the chaos mode is used.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+QUANTIZATION: int = 4  # positions are sent in 1/4 pixel, like in snapshot_delta.py
+# Neighbour cells that are checked for every cell. Only half of them, so every pair is found once
+_HALF_NEIGHBOURS: Tuple[Tuple[int, int], ...] = ((1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+class SpatialGrid:
+    """
+    Uniform grid over the field. The balls are kept sorted by the cell they are in, so the balls of a cell
+    are one slice of the order and a range of cells is found with a binary search.
+
+    Balls move only a few pixels per tick and most stay in their cell, so update() sorts the order of the
+    last tick again. That order is almost sorted already and the sort (timsort) only moves the balls that
+    changed their cell.
+    """
+
+    def __init__(self, width: float, height: float, cell_size: float):
+        """
+        Args:
+            width (float): the width of the field
+            height (float): the height of the field
+            cell_size (float): the size of a cell, at least the diameter of a ball
+        """
+        self.cell_size: float = cell_size
+        self.columns: int = max(1, int(np.ceil(width / cell_size)))
+        self.rows: int = max(1, int(np.ceil(height / cell_size)))
+        self.order: np.ndarray = np.zeros(0, dtype=np.int64)  # ball indices sorted by cell
+        self.sorted_cells: np.ndarray = np.zeros(0, dtype=np.int64)  # the cell of each ball in the order
+
+    def cell_coordinates(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        columns: np.ndarray = np.clip((xs // self.cell_size).astype(np.int64), 0, self.columns - 1)
+        rows: np.ndarray = np.clip((ys // self.cell_size).astype(np.int64), 0, self.rows - 1)
+        return columns, rows
+
+    def update(self, xs: np.ndarray, ys: np.ndarray) -> None:
+        """
+        Sorts the balls into the cells of their new positions.
+        """
+        columns, rows = self.cell_coordinates(xs, ys)
+        cells: np.ndarray = rows * self.columns + columns
+        if self.order.size != cells.size:
+            self.order = np.arange(cells.size)
+        self.order = self.order[np.argsort(cells[self.order], kind="stable")]
+        self.sorted_cells = cells[self.order]
+
+    def pairs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the pairs of balls in the same or in neighbouring cells, the candidates for a collision.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: the indices of the first and of the second ball of each pair
+        """
+        count: int = self.sorted_cells.size
+        positions: np.ndarray = np.arange(count)
+        columns: np.ndarray = self.sorted_cells % self.columns
+        rows: np.ndarray = self.sorted_cells // self.columns
+        firsts: list = []
+        seconds: list = []
+
+        # Same cell: every ball with the balls after it in the order
+        end: np.ndarray = np.searchsorted(self.sorted_cells, self.sorted_cells, side="right")
+        self._collect_pairs(positions, positions + 1, end, firsts, seconds)
+        for column_offset, row_offset in _HALF_NEIGHBOURS:
+            neighbour_columns: np.ndarray = columns + column_offset
+            neighbour_rows: np.ndarray = rows + row_offset
+            valid: np.ndarray = ((neighbour_columns >= 0) & (neighbour_columns < self.columns)
+                                 & (neighbour_rows < self.rows))
+            neighbours: np.ndarray = neighbour_rows * self.columns + neighbour_columns
+            start: np.ndarray = np.searchsorted(self.sorted_cells, neighbours, side="left")
+            end = np.where(valid, np.searchsorted(self.sorted_cells, neighbours, side="right"), start)
+            self._collect_pairs(positions, start, end, firsts, seconds)
+
+        if not firsts:
+            empty: np.ndarray = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        return self.order[np.concatenate(firsts)], self.order[np.concatenate(seconds)]
+
+    @staticmethod
+    def _collect_pairs(positions: np.ndarray, start: np.ndarray, end: np.ndarray, firsts: list, seconds: list):
+        """
+        Adds the pairs (position, start..end) of every position, without a loop over the balls.
+        """
+        counts: np.ndarray = np.maximum(end - start, 0)
+        total: int = int(counts.sum())
+        if total == 0:
+            return
+        group_starts: np.ndarray = np.repeat(np.cumsum(counts) - counts, counts)
+        firsts.append(np.repeat(positions, counts))
+        seconds.append(np.repeat(start, counts) + np.arange(total) - group_starts)
+
+    def query(self, left: float, top: float, right: float, bottom: float) -> np.ndarray:
+        """
+        Returns the balls in the cells that overlap the rectangle.
+        """
+        (first_column, last_column), (first_row, last_row) = self.cell_coordinates(
+            np.array([left, right]), np.array([top, bottom]))
+        slices: list = []
+        for row in range(first_row, last_row + 1):
+            start: int = int(np.searchsorted(self.sorted_cells, row * self.columns + first_column, side="left"))
+            end: int = int(np.searchsorted(self.sorted_cells, row * self.columns + last_column, side="right"))
+            slices.append(self.order[start:end])
+        return np.concatenate(slices) if slices else np.zeros(0, dtype=np.int64)
+
+
+class MultiBall:
+    """
+    The balls of the chaos mode. They bounce off the walls, the paddles and each other, a ball that leaves
+    the field counts a point and starts again in the center. Ball 0 is also written to ball_x, ball_y,
+    ball_dx and ball_dy of the simulation, so everything that only knows one ball keeps working.
+    """
+
+    def __init__(self, simulation, count: int, seed: Optional[int] = None):
+        """
+        Args:
+            simulation (PongSimulation): the game, for the field, the paddles, the speeds and the score
+            count (int): the number of balls
+            seed (int, optional): seed of the random numbers
+        """
+        self.simulation = simulation
+        self.count: int = count
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        self.radius: float = simulation.ball_size / 2
+        self.grid: SpatialGrid = SpatialGrid(simulation.width, simulation.height, simulation.ball_size)
+
+        self.x: np.ndarray = np.zeros(count)
+        self.y: np.ndarray = np.zeros(count)
+        self.dx: np.ndarray = np.zeros(count)
+        self.dy: np.ndarray = np.zeros(count)
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Spreads the balls over the middle of the field.
+        """
+        width, height = self.simulation.width, self.simulation.height
+        self.x[:] = self.rng.uniform(width / 4, width * 3 / 4, self.count)
+        self.y[:] = self.rng.uniform(self.radius, height - 1 - self.radius, self.count)
+        self.x[0], self.y[0] = width // 2, height // 2
+        self.launch(np.ones(self.count, dtype=bool))
+        self.grid.update(self.x, self.y)
+        self.write_first_ball()
+
+    def launch(self, mask: np.ndarray) -> None:
+        """
+        Gives the selected balls a random direction, like PongSimulation.reset_ball.
+        """
+        step: float = self.simulation.ball_step
+        selected: int = int(mask.sum())
+        self.dx[mask] = np.where(self.rng.random(selected) < 0.5, step, -step)
+        self.dy[mask] = np.where(self.rng.random(selected) < 0.5, step, -step)
+
+    def write_first_ball(self) -> None:
+        simulation = self.simulation
+        simulation.ball_x, simulation.ball_y = float(self.x[0]), float(self.y[0])
+        simulation.ball_dx, simulation.ball_dy = float(self.dx[0]), float(self.dy[0])
+
+    def step(self) -> None:
+        """
+        Moves all balls one tick and counts the points.
+        """
+        simulation = self.simulation
+        old_x: np.ndarray = self.x.copy()
+        old_y: np.ndarray = self.y.copy()
+        self.x += self.dx
+        self.y += self.dy
+
+        # Walls: mirror the part of the movement behind the wall
+        top: float = self.radius
+        bottom: float = simulation.height - 1 - self.radius
+        above: np.ndarray = self.y < top
+        self.y[above] = 2 * top - self.y[above]
+        self.dy[above] = np.abs(self.dy[above])
+        below: np.ndarray = self.y > bottom
+        self.y[below] = 2 * bottom - self.y[below]
+        self.dy[below] = -np.abs(self.dy[below])
+
+        self.grid.update(self.x, self.y)
+        reach: float = float(np.abs(self.dx).max(initial=0)) + self.radius
+        self.bounce_off_paddle(old_x, old_y, 30, simulation.paddle1_pos, 1, reach)
+        self.bounce_off_paddle(old_x, old_y, simulation.width - 50, simulation.paddle2_pos, -1, reach)
+        self.collide()
+
+        left_out: np.ndarray = self.x < 0
+        right_out: np.ndarray = self.x > simulation.width
+        simulation.player2_score += int(left_out.sum())
+        simulation.player1_score += int(right_out.sum())
+        scored: np.ndarray = left_out | right_out
+        if scored.any():
+            # Back to the center line, at random heights so they do not start on top of each other
+            self.x[scored] = simulation.width // 2
+            self.y[scored] = self.rng.uniform(self.radius, simulation.height - 1 - self.radius, int(scored.sum()))
+            self.launch(scored)
+        self.write_first_ball()
+
+    def bounce_off_paddle(self, old_x: np.ndarray, old_y: np.ndarray, plane: float, paddle_pos: float,
+                          direction: int, reach: float) -> None:
+        """
+        Sends back the balls that crossed the paddle column in this tick at the height of the paddle.
+        Only the balls in the grid cells around the paddle are checked.
+
+        Args:
+            old_x (np.ndarray): the x positions before the tick
+            old_y (np.ndarray): the y positions before the tick
+            plane (float): the x position of the paddle column, where the single ball bounces as well
+            paddle_pos (float): the position of the paddle
+            direction (int): 1 for the left paddle (balls bounce to the right), -1 for the right paddle
+            reach (float): how far a ball can move in a tick, plus its radius
+        """
+        candidates: np.ndarray = self.grid.query(plane - reach, paddle_pos - reach, plane + reach,
+                                                 paddle_pos + 50 + reach)
+        if candidates.size == 0:
+            return
+        before: np.ndarray = (old_x[candidates] - plane) * direction
+        after: np.ndarray = (self.x[candidates] - plane) * direction
+        crossed: np.ndarray = (before > 0) & (after <= 0)
+        candidates, before, after = candidates[crossed], before[crossed], after[crossed]
+        if candidates.size == 0:
+            return
+        # Where the ball was when it reached the column
+        hit_y: np.ndarray = old_y[candidates] + self.dy[candidates] * (before / (before - after))
+        caught: np.ndarray = (paddle_pos <= hit_y) & (hit_y < paddle_pos + 50)
+        candidates, after, hit_y = candidates[caught], after[caught], hit_y[caught]
+        if candidates.size == 0:
+            return
+
+        simulation = self.simulation
+        angles: np.ndarray = -np.sin((hit_y - paddle_pos - 25) / 25 * np.pi / 2) * (np.pi * 3 / 4)
+        self.x[candidates] = plane - after * direction
+        self.dx[candidates] = direction * np.abs(self.dx[candidates])
+        self.dy[candidates] = (-np.sin(angles) * simulation.ball_step
+                               + self.rng.uniform(-1, 1, candidates.size) * simulation.tick_scale)
+
+    def collide(self) -> None:
+        """
+        Elastic collisions between touching balls that move towards each other. All balls weigh the same,
+        so they swap the parts of their velocities along the line between them. Touching balls are also
+        pushed apart, so they do not stick together.
+        """
+        first, second = self.grid.pairs()
+        if first.size == 0:
+            return
+        offset_x: np.ndarray = self.x[second] - self.x[first]
+        offset_y: np.ndarray = self.y[second] - self.y[first]
+        distance_squared: np.ndarray = offset_x * offset_x + offset_y * offset_y
+        touching: np.ndarray = (distance_squared < (2 * self.radius) ** 2) & (distance_squared > 0)
+        first, second = first[touching], second[touching]
+        offset_x, offset_y, distance_squared = offset_x[touching], offset_y[touching], distance_squared[touching]
+
+        distance: np.ndarray = np.sqrt(distance_squared)
+        normal_x: np.ndarray = offset_x / distance
+        normal_y: np.ndarray = offset_y / distance
+        # A ball can touch more than one other ball, add.at sums up all of its collisions
+        push: np.ndarray = (2 * self.radius - distance) / 2
+        np.add.at(self.x, first, -push * normal_x)
+        np.add.at(self.y, first, -push * normal_y)
+        np.add.at(self.x, second, push * normal_x)
+        np.add.at(self.y, second, push * normal_y)
+
+        approach: np.ndarray = ((self.dx[first] - self.dx[second]) * normal_x
+                                + (self.dy[first] - self.dy[second]) * normal_y)
+        closing: np.ndarray = approach > 0
+        if not closing.any():
+            return
+        first, second = first[closing], second[closing]
+        normal_x, normal_y, approach = normal_x[closing], normal_y[closing], approach[closing]
+        # In a cluster the collisions of a ball share one exchange, else the cluster would gain speed
+        contacts: np.ndarray = np.bincount(np.concatenate((first, second)), minlength=self.count)
+        approach = approach / np.maximum(contacts[first], contacts[second])
+        np.add.at(self.dx, first, -approach * normal_x)
+        np.add.at(self.dy, first, -approach * normal_y)
+        np.add.at(self.dx, second, approach * normal_x)
+        np.add.at(self.dy, second, approach * normal_y)
+
+    def pack(self) -> bytes:
+        """
+        Returns the positions for a snapshot (see snapshot_delta.py): x then y of every ball,
+        in 1/QUANTIZATION pixel as 16 bit big endian numbers.
+        """
+        positions: np.ndarray = np.concatenate((self.x, self.y)) * QUANTIZATION
+        return np.clip(np.rint(positions), 0, 0xFFFF).astype(">u2").tobytes()
+
+    def unpack(self, data: bytes) -> None:
+        """
+        Sets the positions from a snapshot of the server (client).
+        """
+        positions: np.ndarray = np.frombuffer(data, dtype=">u2").astype(np.float64) / QUANTIZATION
+        count: int = positions.size // 2
+        if count != self.count:
+            self.count = count
+            self.dx, self.dy = np.zeros(count), np.zeros(count)
+        self.x, self.y = positions[:count], positions[count:]
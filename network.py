@@ -1,15 +1,68 @@
 import socket
-import pickle
+import threading
+import time
+from typing import Optional
+
+import protocol
+import tracing
+from clock_sync import ClockSync
+from framing import FRAME_HEADER, FrameReader, send_frames
+from MatchSettings import MatchSettings
+from SendData import SendData
+from udp_transport import UdpChannel
+
+# The dedicated server accepts spectators on this port (see dedicated_server.py)
+SPECTATOR_PORT: int = 5554
+# Seconds between two PINGs while the NetworkWorker runs
+PING_INTERVAL: float = 0.5
 
 
 class Network:
-    def __init__(self, is_server=False, server_ip=None, start_now=True):
+    def __init__(self, is_server=False, server_ip=None, start_now=True, transport: str = "tcp",
+                 packet_loss: float = 0.0, packet_reorder: float = 0.0, latency: float = 0.0,
+                 latency_jitter: float = 0.0, spectate_match: int = None, ping_interval: float = PING_INTERVAL):
+        """
+        Args:
+            is_server (bool, optional): host the game and wait for a client
+            server_ip (str, optional): the ip of the server, for clients
+            start_now (bool, optional): start the server or connect to it right away
+            transport (str, optional): "tcp" for one reliable stream, "udp" for sequenced datagrams
+                where late snapshots are dropped instead of delaying the newer ones
+            packet_loss (float, optional): udp only, probability to drop an outgoing datagram (for testing)
+            packet_reorder (float, optional): udp only, probability to reorder an outgoing datagram (for testing)
+            latency (float, optional): artificial delay in seconds for received messages during the game,
+                to test the smoothing on localhost (see NetworkWorker)
+            latency_jitter (float, optional): a random extra delay of up to this many seconds
+            spectate_match (int, optional): watch this match of a dedicated server instead of playing,
+                0 for the newest match, tcp only
+            ping_interval (float, optional): seconds between two PINGs that measure the round trip time and the
+                clock offset (see clock_sync.py), 0 sends none. The peer always answers.
+        """
+        if transport not in ("tcp", "udp"):
+            raise ValueError(f"unknown transport \"{transport}\", use \"tcp\" or \"udp\"")
         self.is_server = is_server
         self.server_ip = server_ip
         self.host = None
         self.server_socket = None
         self.client_socket = None
-        self.port = 5555
+        self.port = 5555 if spectate_match is None else SPECTATOR_PORT
+        self.spectate_match: int = spectate_match
+        self.transport: str = transport
+        self.packet_loss: float = packet_loss
+        self.packet_reorder: float = packet_reorder
+        self.latency: float = latency
+        self.latency_jitter: float = latency_jitter
+        self.connected_at: Optional[float] = None  # time.perf_counter() when connecting started, or accepted
+        self.ping_interval: float = ping_interval
+        self.clock: ClockSync = ClockSync()
+        # The receive thread answers PINGs while the send thread sends, two tcp frames must not get mixed up
+        self.send_lock: threading.Lock = threading.Lock()
+        self.tcp_bytes_sent: int = 0  # with the length prefixes, see bytes_sent
+        self.reader: FrameReader = None  # tcp
+        self.channel: UdpChannel = None  # udp
+        # reused for every snapshot, so sending does not allocate, the length prefix is packed in front of it
+        self.send_buffer = bytearray(FRAME_HEADER.size + protocol.SNAPSHOT.size)
+        FRAME_HEADER.pack_into(self.send_buffer, 0, protocol.SNAPSHOT.size)
 
         if start_now:
             if self.is_server:
@@ -23,18 +76,238 @@ class Network:
 
     def connect_to_server(self):
         self.host = self.server_ip
-        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.client_socket.connect((self.host,  self.port))
+        self.connected_at = time.perf_counter()
+        if self.transport == "udp":
+            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.client_socket.connect((self.host,  self.port))
+            self.setup_connection()
+            # The server only knows the client after the first datagram, it gets resent until acknowledged
+            self.send_data(protocol.encode_hello(), reliable=True)
+        else:
+            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.client_socket.connect((self.host,  self.port))
+            self.setup_connection()
+            if self.spectate_match is not None:
+                self.send_data(protocol.encode_spectate(self.spectate_match))
         print("Connected to", self.host)
 
-    def send_data(self, data):
-        data_bytes = pickle.dumps(data)
-        self.client_socket.send(data_bytes)
+    def setup_connection(self):
+        """
+        Prepares the connected socket.
+        tcp: disables Nagle's algorithm, so small messages are sent right away,
+        and creates the reader for the length-prefixed frames.
+        udp: creates the channel that adds sequence numbers and the reliable messages.
+        """
+        if self.transport == "udp":
+            self.channel = UdpChannel(self.client_socket, self.packet_loss, self.packet_reorder,
+                                      control=self.handle_control)
+        else:
+            self.client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.reader = FrameReader(self.client_socket, control=self.handle_control)
+
+    def send_data(self, data_bytes: bytes, reliable: bool = False):
+        """
+        Sends one encoded message (see protocol.py).
+        tcp: as a length-prefixed frame, every message is reliable.
+        udp: as a datagram, only resent until it arrived if reliable is set.
+
+        Args:
+            data_bytes (bytes): the encoded message
+            reliable (bool, optional): the message must arrive (handshake, score changes, game state changes)
+        """
+        with tracing.span("Network.send_data"):
+            if self.transport == "udp":
+                self.channel.send(data_bytes, reliable)
+            else:
+                with self.send_lock:
+                    send_frames(self.client_socket, [data_bytes])
+                    self.tcp_bytes_sent += FRAME_HEADER.size + len(data_bytes)
+
+    def send_many(self, messages: list, reliable: bool = False):
+        """
+        Sends several encoded messages, over tcp with one syscall.
+
+        Args:
+            messages (list): the encoded messages
+            reliable (bool, optional): see send_data
+        """
+        with tracing.span("Network.send_many"):
+            if self.transport == "udp":
+                for message in messages:
+                    self.channel.send(message, reliable)
+            else:
+                with self.send_lock:
+                    send_frames(self.client_socket, messages)
+                    self.tcp_bytes_sent += sum(FRAME_HEADER.size + len(message) for message in messages)
+
+    def receive_data(self, latest: bool = False) -> memoryview:
+        """
+        Receives one encoded message (see protocol.py). Blocks until a complete message arrived.
+        Over udp reliable messages are returned in order, unreliable ones are always only the newest.
+
+        Args:
+            latest (bool, optional): skip all queued messages except the newest one
+
+        Returns:
+            memoryview: the encoded message, only valid until the next receive
+        """
+        # The span includes the time the thread waits for the message
+        with tracing.span("Network.receive_data"):
+            if self.transport == "udp":
+                return self.channel.receive()
+            if latest:
+                return self.reader.read_latest()
+            return self.reader.read_frame()
+
+    def send_snapshot(self, data: SendData, reliable: bool = False):
+        if self.transport == "udp":
+            self.send_data(protocol.encode_snapshot(data), reliable)
+            return
+        with self.send_lock:
+            protocol.encode_snapshot(data, self.send_buffer, FRAME_HEADER.size)
+            self.client_socket.sendall(self.send_buffer)
+            self.tcp_bytes_sent += len(self.send_buffer)
+
+    def receive_snapshot(self, out: SendData = None, latest: bool = False) -> SendData:
+        return protocol.decode_snapshot(self.receive_data(latest), out)
+
+    def send_paddle(self, position: float, acked_tick: int = 0, input_sequence: int = 0):
+        self.send_data(protocol.encode_paddle(position, acked_tick, input_sequence))
+
+    def receive_paddle(self, latest: bool = False) -> tuple:
+        return protocol.decode_paddle(self.receive_data(latest))
+
+    def ping(self):
+        """
+        Sends a PING now, the round trip time and the clock offset are updated when the PONG arrives.
+        Only the thread that receives handles the PONG, so something has to receive (e.g. the NetworkWorker).
+        """
+        self.clock.last_ping = self.clock.now()
+        self.send_data(protocol.encode_ping(self.clock.last_ping))
+
+    def ping_if_due(self):
+        """
+        Sends a PING if the last one is ping_interval ago, the NetworkWorker calls it from its send thread.
+        """
+        if self.ping_interval and self.clock.now() - self.clock.last_ping >= self.ping_interval:
+            self.ping()
+
+    def handle_control(self, message: memoryview) -> bool:
+        """
+        Answers PINGs and measures PONGs as soon as they are read, before any message is skipped for a newer one.
+
+        Returns:
+            bool: True if the message was a PING or PONG, the game does not get it then
+        """
+        if not protocol.is_control(message):
+            return False
+        received: float = self.clock.now()
+        if message[1] == protocol.MessageType.PING:
+            self.send_data(protocol.encode_pong(protocol.decode_ping(message), received, self.clock.now()))
+        else:
+            self.clock.add_sample(*protocol.decode_pong(message), received)
+        return True
+
+    @property
+    def rtt(self) -> Optional[float]:
+        """
+        The smoothed round trip time in seconds, None until the first PONG arrived.
+        """
+        return self.clock.rtt
+
+    @property
+    def jitter(self) -> float:
+        """
+        How much the round trip time varies, in seconds.
+        """
+        return self.clock.jitter
+
+    @property
+    def clock_offset(self) -> Optional[float]:
+        """
+        The time.monotonic() of the peer minus ours in seconds, None until the first PONG arrived.
+        """
+        return self.clock.offset
+
+    @property
+    def bytes_sent(self) -> int:
+        """
+        All bytes sent on the connection, with the framing (tcp) or datagram headers and resends (udp).
+        """
+        if self.channel is not None:
+            return self.channel.bytes_sent
+        return self.tcp_bytes_sent
+
+    @property
+    def bytes_received(self) -> int:
+        if self.channel is not None:
+            return self.channel.bytes_received
+        return self.reader.bytes_received if self.reader is not None else 0
+
+    def handshake_server(self, settings: MatchSettings) -> str:
+        """
+        The server side of the handshake: sends all settings in one message and waits for the reply,
+        so the match is set up after one round trip.
+
+        Args:
+            settings (MatchSettings): the settings of the match, with the name of the player
+
+        Raises:
+            ProtocolError: if the client rejected the match
+
+        Returns:
+            str: the name of the other player
+        """
+        self.send_data(protocol.encode_handshake(settings), reliable=True)
+        reason, features, name = protocol.decode_handshake_reply(self.receive_data())
+        if reason != protocol.RejectReason.ACCEPTED:
+            raise protocol.ProtocolError(f"{name} rejected the match: {reason.name}")
+        return name
+
+    def handshake_client(self, player_name: str) -> MatchSettings:
+        """
+        The client side of the handshake: receives the settings and accepts them, or rejects them if the protocol
+        version is another one or the match needs a feature this version does not have.
+        A redirect of the lobby is followed on the way.
+
+        Args:
+            player_name (str): the name of the player, the other player gets it
+
+        Raises:
+            ProtocolError: if the match was rejected or the message can not be decoded
+
+        Returns:
+            MatchSettings: the settings of the match
+        """
+        message: memoryview = self.receive_data()
+        if len(message) >= protocol.HEADER.size and message[1] == protocol.MessageType.SETTING:
+            code, value = protocol.decode_setting(message)
+            if code != protocol.SettingCode.MATCH_PORT or self.transport != "tcp":
+                raise protocol.ProtocolError(f"unexpected setting {code.name}")
+            # A lobby found an opponent and sends us to the match, the handshake goes on there
+            self.send_ack()
+            self.client_socket.close()
+            self.port = value
+            self.connect_to_server()
+            return self.handshake_client(player_name)
+
+        try:
+            settings: MatchSettings = protocol.decode_handshake(message)
+        except protocol.VersionError:
+            self.send_data(protocol.encode_handshake_reply(protocol.RejectReason.VERSION, player_name), reliable=True)
+            raise
+        missing: int = settings.features & ~int(protocol.SUPPORTED_FEATURES)
+        if missing:
+            self.send_data(protocol.encode_handshake_reply(protocol.RejectReason.FEATURES, player_name), reliable=True)
+            raise protocol.ProtocolError(f"the match needs features this version does not have: {missing}")
+        self.send_data(protocol.encode_handshake_reply(protocol.RejectReason.ACCEPTED, player_name), reliable=True)
+        return settings
+
+    def send_ack(self):
+        self.send_data(protocol.encode_ack(), reliable=True)
 
-    def receive_data(self):
-        data_bytes = self.client_socket.recv(4096)
-        data = pickle.loads(data_bytes)
-        return data
+    def receive_ack(self):
+        protocol.decode_ack(self.receive_data())
 
     def close_connection(self):
         self.client_socket.close()
@@ -42,18 +315,33 @@ class Network:
             self.server_socket.close()
 
     def start_socket(self):
-        self.host = socket.gethostbyname(self.get_ip_address())
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.host is None:
+            self.host = socket.gethostbyname(self.get_ip_address())
+        socket_type = socket.SOCK_DGRAM if self.transport == "udp" else socket.SOCK_STREAM
+        self.server_socket = socket.socket(socket.AF_INET, socket_type)
         self.server_socket.setsockopt(
             socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_socket.bind((self.host,  self.port))
-        # 1 is the maximum number of connections
-        self.server_socket.listen(1)
+        self.port = self.server_socket.getsockname()[1]  # port 0 picks a free port
+        if self.transport == "tcp":
+            # 1 is the maximum number of connections
+            self.server_socket.listen(1)
         print(f"Waiting for a connection...{self.host}")
         return self.host
 
     def accept_connection(self):
-        self.client_socket, addr = self.server_socket.accept()
+        if self.transport == "udp":
+            # The first datagram tells who the client is, after that the socket only talks to that client
+            datagram, addr = self.server_socket.recvfrom(2048)
+            self.server_socket.connect(addr)
+            self.client_socket = self.server_socket
+            self.setup_connection()
+            self.channel.handle(datagram)
+            protocol.decode_hello(self.receive_data())
+        else:
+            self.client_socket, addr = self.server_socket.accept()
+            self.setup_connection()
+        self.connected_at = time.perf_counter()
         print("Connected to", addr)
 
     def get_ip_address(self):
@@ -69,6 +357,7 @@ class Network:
         ret += f"server_ip={self.server_ip},"
         ret += f"host={self.host},"
         ret += f"port={self.port},"
+        ret += f"transport={self.transport},"
         ret += f"server_socket={self.server_socket},"
         ret += f"client_socket={self.client_socket}"
         ret += ')'
@@ -0,0 +1,195 @@
+import collections
+import random
+import threading
+import time
+from typing import Any, Callable, Deque, Optional, Tuple
+
+from network import Network
+
+
+class Mailbox:
+    """
+    Holds only the newest value that was put into it.
+
+    The value and its version are stored together in one tuple, replacing a reference is atomic in CPython,
+    so reading and writing from different threads needs no lock and never blocks.
+    """
+
+    def __init__(self):
+        self.slot: Tuple[int, Any] = (0, None)
+
+    def put(self, value: Any) -> int:
+        """
+        Replaces the value. Only one thread should write to a mailbox.
+
+        Returns:
+            int: the version of the new value
+        """
+        version: int = self.slot[0] + 1
+        self.slot = (version, value)
+        return version
+
+    def get(self) -> Tuple[int, Any]:
+        """
+        Returns:
+            Tuple[int, Any]: (version, value), the version is 0 and the value None if nothing was put yet
+        """
+        return self.slot
+
+
+class NetworkWorker:
+    """
+    Sends and receives in background threads, so the game loop never waits for the network.
+
+    The game loop posts its newest encoded message with post() and reads the newest decoded message
+    of the peer with latest(). Messages that are not sent yet when a newer one is posted are skipped,
+    and received messages only replace the previous one, so slow links never build up a queue.
+    Messages posted as reliable are never skipped.
+
+    If the network has an artificial latency, received messages are held back in a delay line
+    and handed on by a third thread when they are due.
+
+    The send thread also sends a PING every network.ping_interval, the receive thread answers the PINGs of the
+    peer and measures the PONGs (see clock_sync.py). Both happen before the delay line, so the artificial
+    latency is not part of the measured round trip time.
+    """
+
+    def __init__(self, network: Network, decode: Callable[[memoryview], Any]):
+        """
+        Args:
+            network (Network): the connected network, the handshake has to be finished
+            decode (Callable[[memoryview], Any]): decodes a received message (e.g. protocol.decode_snapshot),
+                messages it returns None for are ignored
+        """
+        self.network: Network = network
+        self.decode = decode
+
+        self.outbox: Mailbox = Mailbox()
+        self.inbox: Mailbox = Mailbox()
+        self.reliable_queue: Deque[bytes] = collections.deque()
+        self.outbox_changed: threading.Event = threading.Event()
+        self.running: bool = False
+        # The first exception of one of the threads, raised in the game loop by check()
+        self.error: Optional[BaseException] = None
+        # Seconds the receive thread spent in decode, the game shows it in its metrics (see perf_metrics.py)
+        self.decode_time: float = 0.0
+
+        # Artificial latency: (time to hand on, message), in order
+        self.delayed: Deque[Tuple[float, bytes]] = collections.deque()
+        self.delayed_changed: threading.Condition = threading.Condition()
+        self.delay_enabled: bool = network.latency > 0 or network.latency_jitter > 0
+
+        self.send_thread: threading.Thread = threading.Thread(target=self.send_loop, daemon=True)
+        self.receive_thread: threading.Thread = threading.Thread(target=self.receive_loop, daemon=True)
+        self.delay_thread: threading.Thread = threading.Thread(target=self.delay_loop, daemon=True)
+
+    def start(self):
+        self.running = True
+        self.send_thread.start()
+        self.receive_thread.start()
+        if self.delay_enabled:
+            self.delay_thread.start()
+
+    def stop(self):
+        """
+        Stops the send thread. The receive thread ends when the connection gets closed.
+        """
+        self.running = False
+        self.outbox_changed.set()
+        with self.delayed_changed:
+            self.delayed_changed.notify()
+
+    def post(self, message: bytes, reliable: bool = False):
+        """
+        Queues a message for sending, replaces the previous one if it was not sent yet.
+
+        Args:
+            message (bytes): the encoded message
+            reliable (bool, optional): the message must arrive (e.g. a score or game state change),
+                it is not replaced by newer ones and sent on the reliable channel
+        """
+        if reliable:
+            self.reliable_queue.append(message)
+            self.outbox.put(None)  # an older message that was not sent yet must not follow this one
+        else:
+            self.outbox.put(message)
+        self.outbox_changed.set()
+
+    def latest(self) -> Tuple[int, Any]:
+        """
+        Returns the newest received message without blocking.
+
+        Returns:
+            Tuple[int, Any]: (version, decoded message), compare the version to see if something new arrived
+        """
+        return self.inbox.get()
+
+    def check(self):
+        """
+        Raises the error of a network thread in the calling thread (e.g. the connection was closed).
+        """
+        if self.error is not None:
+            raise ConnectionError("network worker stopped") from self.error
+
+    def send_loop(self):
+        sent_version: int = 0
+        try:
+            while self.running:
+                # Wakes up for the PINGs even while nothing is posted (e.g. on the start screen)
+                self.outbox_changed.wait(self.network.ping_interval or None)
+                self.outbox_changed.clear()
+                while self.reliable_queue and self.running:
+                    self.network.send_data(self.reliable_queue.popleft(), reliable=True)
+                version, message = self.outbox.get()
+                if version != sent_version and message is not None and self.running:
+                    self.network.send_data(message)
+                sent_version = version
+                if self.running:
+                    self.network.ping_if_due()
+        except Exception as e:
+            self.fail(e)
+
+    def receive_loop(self):
+        release: float = 0
+        try:
+            while self.running:
+                message = self.network.receive_data(latest=True)
+                if not self.delay_enabled:
+                    self.publish(message)
+                    continue
+                # Later messages are never handed on before earlier ones, like on a real connection
+                delay: float = self.network.latency + random.uniform(0, self.network.latency_jitter)
+                release = max(release, time.monotonic() + delay)
+                with self.delayed_changed:
+                    self.delayed.append((release, bytes(message)))
+                    self.delayed_changed.notify()
+        except Exception as e:
+            self.fail(e)
+
+    def delay_loop(self):
+        try:
+            while self.running:
+                with self.delayed_changed:
+                    if not self.delayed:
+                        self.delayed_changed.wait()
+                        continue
+                    wait: float = self.delayed[0][0] - time.monotonic()
+                    if wait > 0:
+                        self.delayed_changed.wait(wait)
+                        continue
+                    message: bytes = self.delayed.popleft()[1]
+                self.publish(message)
+        except Exception as e:
+            self.fail(e)
+
+    def publish(self, message):
+        started: float = time.perf_counter()
+        decoded = self.decode(message)
+        self.decode_time += time.perf_counter() - started
+        if decoded is not None:
+            self.inbox.put(decoded)
+
+    def fail(self, error: BaseException):
+        if self.running and self.error is None:
+            self.error = error
+        self.stop()
@@ -0,0 +1,282 @@
+"""
+Performance metrics of the game loop, so lag can be measured instead of guessed.
+
+For every frame the game records where the time went (events, physics, talking to the network thread, encoding,
+drawing, sleeping), how long the frame really took compared to its target, and the bytes the connection moved.
+The game loop only adds numbers to the current frame and copies them into a preallocated ring buffer when the
+frame ends, nothing is allocated or written to a file there.
+
+- PerfHud: an overlay with the p50 and p99 of the last frames, toggled with F3 (HUD_KEY)
+- MetricsExporter: writes the frames to a file in a background thread, JSON lines or CSV (for a .csv path),
+  the file is rotated when it gets too large
+
+"network" is only the time the game loop spends with the NetworkWorker (reading the newest message, posting the
+next one), it never waits for the network. "decode" is measured in the receive thread.
+"""
+import json
+import os
+import threading
+import time
+from array import array
+from typing import List, Optional, Tuple
+
+import pygame
+
+from assets import get_assets
+
+COLUMNS: Tuple[str, ...] = ("time", "interval_ms", "target_ms", "events_ms", "physics_ms", "network_ms",
+                            "serialize_ms", "decode_ms", "render_ms", "wait_ms", "ticks", "bytes_sent",
+                            "bytes_received")
+(TIME, INTERVAL, TARGET, EVENTS, PHYSICS, NETWORK, SERIALIZE, DECODE, RENDER, WAIT, TICKS, BYTES_SENT,
+ BYTES_RECEIVED) = range(len(COLUMNS))
+
+# Frames kept in the ring buffer, about 17 seconds at 240 frames per second
+CAPACITY: int = 4096
+
+HUD_KEY: int = pygame.K_F3
+# The HUD shows the percentiles of this many frames and computes them again every HUD_INTERVAL seconds
+HUD_FRAMES: int = 600
+HUD_INTERVAL: float = 0.5
+HUD_FONT_SIZE: int = 20
+HUD_COLOR: Tuple[int, int, int] = (255, 255, 0)
+HUD_ROWS: Tuple[Tuple[str, int], ...] = (("frame", INTERVAL), ("target", TARGET), ("events", EVENTS),
+                                         ("physics", PHYSICS), ("network", NETWORK), ("serialize", SERIALIZE),
+                                         ("decode", DECODE), ("render", RENDER), ("wait", WAIT))
+
+EXPORT_INTERVAL: float = 1.0
+MAX_FILE_BYTES: int = 10 * 1024 * 1024
+BACKUP_FILES: int = 3
+
+
+def format_row(row: array) -> list:
+    """
+    Rounds the values of a frame for the file: the time to microseconds, the milliseconds to 0.1 microseconds,
+    the counts to integers.
+    """
+    return [round(row[TIME], 6)] + [round(value, 4) for value in row[TIME + 1:TICKS]] + [
+        int(value) for value in row[TICKS:]]
+
+
+class FrameMetrics:
+    """
+    The ring buffer of the frames. The game loop calls next_frame() at the start of every frame and mark() after
+    every part of it. Readers (the HUD, the exporter thread) use rows() and only see finished frames.
+    """
+
+    def __init__(self, capacity: int = CAPACITY):
+        self.capacity: int = capacity
+        self.width: int = len(COLUMNS)
+        self.rows_buffer: array = array("d", bytes(8 * capacity * self.width))
+        self.count: int = 0  # finished frames, frame i is at i % capacity
+        self.current: List[float] = [0.0] * self.width
+        self.started: Optional[float] = None  # time.perf_counter() when the current frame started
+        self.last_mark: float = 0.0
+        # The network totals at the start of the current frame
+        self.totals: Tuple[int, int, float] = (0, 0, 0.0)
+
+    def next_frame(self, now: float, bytes_sent: int = 0, bytes_received: int = 0, decode_time: float = 0.0):
+        """
+        Finishes the current frame and starts the next one. The time since the last mark was spent waiting.
+
+        Args:
+            now (float): time.perf_counter()
+            bytes_sent (int, optional): all bytes the connection sent so far
+            bytes_received (int, optional): all bytes the connection received so far
+            decode_time (float, optional): all seconds the receive thread spent decoding so far
+        """
+        current: List[float] = self.current
+        if self.started is not None:
+            current[WAIT] += (now - self.last_mark) * 1000
+            current[INTERVAL] = (now - self.started) * 1000
+            current[BYTES_SENT] = bytes_sent - self.totals[0]
+            current[BYTES_RECEIVED] = bytes_received - self.totals[1]
+            current[DECODE] = (decode_time - self.totals[2]) * 1000
+            rows_buffer: array = self.rows_buffer
+            start: int = (self.count % self.capacity) * self.width
+            for column in range(self.width):
+                rows_buffer[start + column] = current[column]
+                current[column] = 0.0
+            self.count += 1
+        self.totals = (bytes_sent, bytes_received, decode_time)
+        current[TIME] = time.time()
+        self.started = self.last_mark = now
+
+    def mark(self, column: int):
+        """
+        Adds the time since the last mark to the column, e.g. mark(PHYSICS) after the simulation stepped.
+        """
+        now: float = time.perf_counter()
+        self.current[column] += (now - self.last_mark) * 1000
+        self.last_mark = now
+
+    def add(self, column: int, value: float = 1.0):
+        self.current[column] += value
+
+    def set(self, column: int, value: float):
+        self.current[column] = value
+
+    def rows(self, first: int, end: int) -> List[array]:
+        """
+        Returns copies of the finished frames first to end - 1, the ones that were overwritten already are left
+        out. Other threads can call it while the game loop goes on, the copy is taken with one slice per part
+        of the ring, which the game loop can not interrupt.
+        """
+        # The slot of the oldest frame is the next one the game loop writes
+        first = max(first, end - self.capacity + 1, 0)
+        if first >= end:
+            return []
+        start: int = (first % self.capacity) * self.width
+        stop: int = (end % self.capacity) * self.width
+        copied: array = self.rows_buffer[start:stop] if start < stop else (
+            self.rows_buffer[start:] + self.rows_buffer[:stop])
+        # Frames the game loop finished while copying can have overwritten the oldest ones
+        skip: int = max(0, self.count - self.capacity + 1 - first)
+        return [copied[row * self.width:(row + 1) * self.width] for row in range(skip, end - first)]
+
+    def percentiles(self, column: int, frames: int = HUD_FRAMES) -> Tuple[float, float]:
+        """
+        Returns:
+            Tuple[float, float]: the p50 and p99 of the column over the last frames, zeros without frames
+        """
+        end: int = self.count
+        values: List[float] = sorted(row[column] for row in self.rows(end - frames, end))
+        if not values:
+            return 0.0, 0.0
+        return values[len(values) // 2], values[min(len(values) - 1, int(len(values) * 0.99))]
+
+
+class PerfHud:
+    """
+    Shows the p50 and p99 of the frame times, the traffic and the round trip time in the top left corner.
+    """
+
+    def __init__(self, metrics: FrameMetrics):
+        self.metrics: FrameMetrics = metrics
+        self.visible: bool = False
+        self.lines: List[str] = []
+        self.updated: float = float("-inf")
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.updated = float("-inf")
+
+    def update(self, now: float, network=None) -> bool:
+        """
+        Computes the lines again every HUD_INTERVAL seconds while visible.
+
+        Args:
+            now (float): time.perf_counter()
+            network (Network, optional): for the round trip time
+
+        Returns:
+            bool: True if the lines changed and the frame has to be drawn again
+        """
+        if not self.visible or now - self.updated < HUD_INTERVAL:
+            return False
+        self.updated = now
+        metrics: FrameMetrics = self.metrics
+        lines: List[str] = ["ms          p50     p99"]
+        for name, column in HUD_ROWS:
+            p50, p99 = metrics.percentiles(column)
+            lines.append(f"{name:<10}{p50:>7.2f} {p99:>7.2f}")
+        frames: List[array] = metrics.rows(metrics.count - HUD_FRAMES, metrics.count)
+        seconds: float = sum(row[INTERVAL] for row in frames) / 1000
+        if seconds > 0:
+            lines.append(f"fps {len(frames) / seconds:.0f}, "
+                         f"up {sum(row[BYTES_SENT] for row in frames) / seconds / 1024:.1f} KiB/s, "
+                         f"down {sum(row[BYTES_RECEIVED] for row in frames) / seconds / 1024:.1f} KiB/s")
+        if network is not None and network.rtt is not None:
+            lines.append(f"rtt {network.rtt * 1000:.1f} ms, jitter {network.jitter * 1000:.1f} ms")
+        self.lines = lines
+        return True
+
+    def draw(self, renderer):
+        if not self.visible:
+            return
+        assets = get_assets()
+        y: int = 50
+        for line in self.lines:
+            text: pygame.Surface = assets.text(line, HUD_FONT_SIZE, HUD_COLOR)
+            renderer.blit(text, (10, y))
+            y += text.get_height()
+
+
+class MetricsExporter:
+    """
+    Writes the finished frames of the metrics to a file every EXPORT_INTERVAL seconds, in its own thread.
+    When the file is larger than max_bytes it is renamed to path.1 (path.1 to path.2 and so on) and a new one is
+    started, at most backups old files are kept.
+    """
+
+    def __init__(self, metrics: FrameMetrics, path: str, max_bytes: int = MAX_FILE_BYTES,
+                 backups: int = BACKUP_FILES):
+        """
+        Args:
+            metrics (FrameMetrics): the metrics of the game
+            path (str): the file, CSV if it ends with .csv, else one JSON object per line
+            max_bytes (int, optional): the size at which the file is rotated
+            backups (int, optional): the number of old files that are kept
+        """
+        self.metrics: FrameMetrics = metrics
+        self.path: str = path
+        self.csv: bool = path.lower().endswith(".csv")
+        self.max_bytes: int = max_bytes
+        self.backups: int = backups
+        self.exported: int = 0  # frames written (or lost because the ring buffer overwrote them)
+        self.lost: int = 0
+        self.stopped: threading.Event = threading.Event()
+        self.file = None
+        self.thread: threading.Thread = threading.Thread(target=self.write_loop, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def close(self):
+        """
+        Writes the remaining frames and closes the file.
+        """
+        self.stopped.set()
+        self.thread.join()
+        print(f"Metrics of {self.exported - self.lost} frames saved to {self.path}"
+              + (f", {self.lost} lost" if self.lost else ""))
+
+    def write_loop(self):
+        try:
+            self.open()
+            while not self.stopped.wait(EXPORT_INTERVAL):
+                self.write()
+            self.write()
+        except OSError as e:
+            print(f"Writing the metrics failed: {e!r}")
+        finally:
+            if self.file is not None:
+                self.file.close()
+
+    def open(self):
+        self.file = open(self.path, "w", encoding="utf-8")
+        if self.csv:
+            self.file.write(",".join(COLUMNS) + "\n")
+
+    def write(self):
+        end: int = self.metrics.count
+        rows: List[array] = self.metrics.rows(self.exported, end)
+        self.lost += end - self.exported - len(rows)
+        self.exported = end
+        for row in rows:
+            values: list = format_row(row)
+            if self.csv:
+                self.file.write(",".join(map(str, values)) + "\n")
+            else:
+                self.file.write(json.dumps(dict(zip(COLUMNS, values))) + "\n")
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self.file.close()
+        for number in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{number}"):
+                os.replace(f"{self.path}.{number}", f"{self.path}.{number + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        self.open()
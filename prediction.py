@@ -0,0 +1,63 @@
+from typing import List, Optional, Tuple
+
+SEQUENCE_MODULO: int = 1 << 16
+
+
+class PaddlePredictor:
+    """
+    Client-side prediction for the own paddle.
+
+    The client moves its paddle right away and numbers every position it sends to the server.
+    The server accepts the position (or corrects it, e.g. if it moved too far) and sends it back
+    with the number. If the accepted position differs from what the client predicted for that number,
+    the difference is applied to the current position, so the inputs after it are not lost.
+    """
+
+    def __init__(self, history_size: int = 128, tolerance: float = 0.5):
+        """
+        Args:
+            history_size (int, optional): number of predicted positions that are kept
+            tolerance (float, optional): differences up to this many pixels are ignored (quantization)
+        """
+        self.sequence: int = 0
+        self.history: List[Optional[Tuple[int, float]]] = [None] * history_size  # (sequence, position)
+        self.tolerance: float = tolerance
+        self.corrections: int = 0
+
+    def record(self, position: float) -> int:
+        """
+        Records the predicted position of this frame.
+
+        Returns:
+            int: the sequence number to send with the position
+        """
+        self.sequence = (self.sequence + 1) % SEQUENCE_MODULO
+        self.history[self.sequence % len(self.history)] = (self.sequence, position)
+        return self.sequence
+
+    def reconcile(self, server_position: float, sequence: int) -> float:
+        """
+        Compares the position the server accepted with the prediction.
+
+        Args:
+            server_position (float): the position of the client paddle on the server
+            sequence (int): the sequence number the server position belongs to
+
+        Returns:
+            float: the correction to add to the current position, 0 if the prediction was right
+        """
+        entry = self.history[sequence % len(self.history)]
+        if entry is None or entry[0] != sequence:
+            return 0
+        error: float = server_position - entry[1]
+        if abs(error) <= self.tolerance:
+            return 0
+
+        # The predictions after this one were based on the wrong position as well
+        self.corrections += 1
+        for offset in range((self.sequence - sequence) % SEQUENCE_MODULO + 1):
+            index: int = (sequence + offset) % SEQUENCE_MODULO
+            entry = self.history[index % len(self.history)]
+            if entry is not None and entry[0] == index:
+                self.history[index % len(self.history)] = (index, entry[1] + error)
+        return error
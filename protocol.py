@@ -0,0 +1,381 @@
+import struct
+from enum import IntEnum, IntFlag
+
+from MatchSettings import MatchSettings
+from SendData import SendData
+
+# Increase this when the layout of a message changes
+PROTOCOL_VERSION: int = 10
+
+
+class ProtocolError(Exception):
+    """
+    Raised when a received message can not be decoded.
+    """
+
+
+class VersionError(ProtocolError):
+    """
+    Raised when the HANDSHAKE of the peer has another protocol version, so the match can be rejected.
+    """
+
+    def __init__(self, version: int):
+        super().__init__(f"the peer uses protocol version {version}, expected {PROTOCOL_VERSION}")
+        self.version: int = version
+
+
+class MessageType(IntEnum):
+    SNAPSHOT = 1    # server -> client, the full game state of one frame
+    PADDLE = 2      # client -> server, the client paddle, the newest decoded DELTA tick and the input sequence
+    SETTING = 3     # server -> client, one setting outside of the handshake (the lobby redirect)
+    ACK = 4         # acknowledges a setting
+    HELLO = 5       # client -> server, the first message over UDP, so the server learns the address of the client
+    DELTA = 6       # server -> client, the changed fields of the game state (see snapshot_delta.py)
+    INPUTS = 7      # both ways in rollback mode, the inputs of the sender (see rollback.py)
+    SPECTATE = 8    # spectator -> server, the first message, the match to watch (see dedicated_server.py)
+    HANDSHAKE = 9   # server -> client, all match settings, the name of the player and the needed features
+    HANDSHAKE_REPLY = 10    # client -> server, accepts or rejects the HANDSHAKE, with the name of the player
+    PING = 11       # both ways, the send time, the peer answers with PONG (see clock_sync.py)
+    PONG = 12       # the send time of the PING, when it arrived and when the PONG was sent
+
+
+class GameStateCode(IntEnum):
+    START = 0
+    PLAYING = 1
+    GAME_OVER = 2
+
+
+class SettingCode(IntEnum):
+    # 1 to 7 were the match settings, they are sent in the HANDSHAKE since protocol version 9
+    MATCH_PORT = 8      # from the lobby: the match is on this port of the same host, see lobby.py
+
+
+class Feature(IntFlag):
+    """
+    Features a match can need, the HANDSHAKE lists them so a peer without one rejects the match right away.
+    """
+    ROLLBACK = 1    # the peers only exchange inputs, see rollback.py
+    MULTIBALL = 2   # more than one ball, see multiball.py
+
+
+# What this version of the game can play
+SUPPORTED_FEATURES: Feature = Feature.ROLLBACK | Feature.MULTIBALL
+
+
+class RejectReason(IntEnum):
+    ACCEPTED = 0
+    VERSION = 1     # another protocol version
+    FEATURES = 2    # the match needs a feature the peer does not support
+
+
+# Plain ints, so the hot path does not pay for enum lookups
+GAME_STATE_TO_CODE = {
+    "start": int(GameStateCode.START),
+    "playing": int(GameStateCode.PLAYING),
+    "game_over": int(GameStateCode.GAME_OVER),
+}
+CODE_TO_GAME_STATE = {v: k for k, v in GAME_STATE_TO_CODE.items()}
+
+# All messages start with the protocol version and the message type
+HEADER = struct.Struct("!BB")
+# game_state, player_position, ball_x, ball_y, server_score, client_score, client_position, input_sequence
+SNAPSHOT = struct.Struct("!BBBfffHHfH")
+PADDLE = struct.Struct("!BBfHH")
+SETTING = struct.Struct("!BBBi")
+ACK = HEADER
+HELLO = HEADER
+# first frame, confirmed frame of the peer, hash frame, hash, number of inputs, then one byte per input
+INPUTS = struct.Struct("!BBHHHIB")
+# the id of the match, 0 for the newest one
+SPECTATE = struct.Struct("!BBI")
+# width, height, player speed, ball speed, tick rate, ball count, rollback seed, features,
+# the length of the player name, then the name (utf-8)
+HANDSHAKE = struct.Struct("!BBHHHHHHIIB")
+# RejectReason, the supported features, the length of the player name, then the name (utf-8)
+HANDSHAKE_REPLY = struct.Struct("!BBBIB")
+MAX_NAME_BYTES: int = 255
+# times in seconds on the clock of the sender
+PING = struct.Struct("!BBd")
+PONG = struct.Struct("!BBddd")
+# Answered by the network layer itself, the game never sees them
+CONTROL_TYPES: frozenset = frozenset((int(MessageType.PING), int(MessageType.PONG)))
+
+_SNAPSHOT_TYPE: int = int(MessageType.SNAPSHOT)
+
+MAX_MESSAGE_SIZE: int = max(SNAPSHOT.size, PADDLE.size, SETTING.size, ACK.size, HELLO.size)
+
+
+def encode_snapshot(data: SendData, buffer: bytearray = None, offset: int = 0) -> bytes:
+    """
+    Encodes a snapshot. If a buffer is given the message is packed into it and nothing is allocated.
+
+    Args:
+        data (SendData): the snapshot to encode
+        buffer (bytearray, optional): the buffer to pack the message into
+        offset (int, optional): the offset in the buffer
+
+    Returns:
+        bytes: the encoded message, or the buffer if one was given
+    """
+    values = (
+        PROTOCOL_VERSION, _SNAPSHOT_TYPE, GAME_STATE_TO_CODE[data.game_state],
+        data.player_position, data.ball_x, data.ball_y, data.server_score, data.client_score,
+        data.client_position, data.input_sequence
+    )
+    if buffer is None:
+        return SNAPSHOT.pack(*values)
+    SNAPSHOT.pack_into(buffer, offset, *values)
+    return buffer
+
+
+def encode_paddle(position: float, acked_tick: int = 0, input_sequence: int = 0) -> bytes:
+    return PADDLE.pack(PROTOCOL_VERSION, MessageType.PADDLE, position, acked_tick, input_sequence)
+
+
+def encode_setting(code: SettingCode, value: int) -> bytes:
+    return SETTING.pack(PROTOCOL_VERSION, MessageType.SETTING, code, value)
+
+
+def encode_ack() -> bytes:
+    return ACK.pack(PROTOCOL_VERSION, MessageType.ACK)
+
+
+def encode_hello() -> bytes:
+    return HEADER.pack(PROTOCOL_VERSION, MessageType.HELLO)
+
+
+def encode_spectate(match_id: int = 0) -> bytes:
+    return SPECTATE.pack(PROTOCOL_VERSION, MessageType.SPECTATE, match_id)
+
+
+def _encode_name(name: str) -> bytes:
+    return name.encode("utf-8")[:MAX_NAME_BYTES]
+
+
+def _decode_name(data, start: int, length: int, message: str) -> str:
+    name: bytes = bytes(data[start:start + length])
+    if len(name) != length:
+        raise ProtocolError(f"{message} message too short, the name is cut off")
+    return name.decode("utf-8", errors="replace")
+
+
+def required_features(settings: MatchSettings) -> Feature:
+    """
+    Returns the features a match with these settings needs.
+    """
+    features: Feature = Feature(0)
+    if settings.rollback_seed:
+        features |= Feature.ROLLBACK
+    if settings.ball_count > 1:
+        features |= Feature.MULTIBALL
+    return features
+
+
+def encode_handshake(settings: MatchSettings) -> bytes:
+    """
+    Encodes the settings of a match. The needed features are taken from the settings (see required_features).
+    """
+    name: bytes = _encode_name(settings.player_name)
+    return HANDSHAKE.pack(
+        PROTOCOL_VERSION, MessageType.HANDSHAKE, settings.width, settings.height, settings.player_speed,
+        settings.ball_speed, settings.tick_rate, settings.ball_count, settings.rollback_seed,
+        required_features(settings) | settings.features, len(name)) + name
+
+
+def encode_handshake_reply(reason: RejectReason, player_name: str, features: int = SUPPORTED_FEATURES) -> bytes:
+    name: bytes = _encode_name(player_name)
+    return HANDSHAKE_REPLY.pack(PROTOCOL_VERSION, MessageType.HANDSHAKE_REPLY, reason, features, len(name)) + name
+
+
+def encode_ping(sent: float) -> bytes:
+    return PING.pack(PROTOCOL_VERSION, MessageType.PING, sent)
+
+
+def encode_pong(ping_sent: float, ping_received: float, sent: float) -> bytes:
+    return PONG.pack(PROTOCOL_VERSION, MessageType.PONG, ping_sent, ping_received, sent)
+
+
+def is_control(data) -> bool:
+    """
+    Returns True for PING and PONG, without checking the rest of the message.
+    """
+    return len(data) >= HEADER.size and data[1] in CONTROL_TYPES
+
+
+def encode_inputs(start_frame: int, ack_frame: int, hash_frame: int, state_hash: int, inputs: bytes) -> bytes:
+    """
+    Encodes the inputs of the rollback mode (see RollbackSession.message).
+    """
+    return INPUTS.pack(PROTOCOL_VERSION, MessageType.INPUTS, start_frame, ack_frame, hash_frame, state_hash,
+                       len(inputs)) + inputs
+
+
+def read_header(data, offset: int = 0) -> MessageType:
+    """
+    Reads and checks the header of a message.
+
+    Args:
+        data (bytes-like): the received message
+        offset (int, optional): where the message starts in data
+
+    Raises:
+        ProtocolError: if the message is too short, has another version or an unknown type
+
+    Returns:
+        MessageType: the type of the message
+    """
+    if len(data) - offset < HEADER.size:
+        raise ProtocolError(f"message too short: {len(data) - offset} bytes")
+    version, message_type = HEADER.unpack_from(data, offset)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"unsupported protocol version {version}, expected {PROTOCOL_VERSION}")
+    try:
+        return MessageType(message_type)
+    except ValueError:
+        raise ProtocolError(f"unknown message type {message_type}") from None
+
+
+def _unpack(data, offset: int, expected: MessageType, layout: struct.Struct) -> tuple:
+    """
+    Unpacks a message of a known type and checks its header. Only reads the header again if something is wrong,
+    so the common path is a single unpack_from.
+    """
+    if len(data) - offset >= layout.size:
+        values = layout.unpack_from(data, offset)
+        if values[0] == PROTOCOL_VERSION and values[1] == expected:
+            return values
+    message_type = read_header(data, offset)
+    if message_type != expected:
+        raise ProtocolError(f"expected {expected.name} message, got {message_type.name}")
+    raise ProtocolError(f"{expected.name} message too short: {len(data) - offset} bytes")
+
+
+def decode_snapshot(data, out: SendData = None, offset: int = 0) -> SendData:
+    """
+    Decodes a snapshot. If out is given its fields are overwritten instead of creating a new object.
+
+    Args:
+        data (bytes-like): the received message
+        out (SendData, optional): the object to decode into
+        offset (int, optional): where the message starts in data
+
+    Returns:
+        SendData: the decoded snapshot
+    """
+    values = _unpack(data, offset, MessageType.SNAPSHOT, SNAPSHOT)
+    game_state = CODE_TO_GAME_STATE.get(values[2])
+    if game_state is None:
+        raise ProtocolError(f"unknown game state code {values[2]}")
+    if out is None:
+        return SendData(values[3], game_state, *values[4:])
+    out.update(values[3], game_state, *values[4:])
+    return out
+
+
+def decode_paddle(data, offset: int = 0) -> tuple:
+    """
+    Decodes the paddle position of the client.
+
+    Returns:
+        tuple: (position, the newest DELTA tick the client decoded, input sequence of the position)
+    """
+    return _unpack(data, offset, MessageType.PADDLE, PADDLE)[2:]
+
+
+def decode_setting(data, offset: int = 0) -> tuple:
+    """
+    Decodes a setting.
+
+    Returns:
+        tuple: (SettingCode, value)
+    """
+    _, _, code, value = _unpack(data, offset, MessageType.SETTING, SETTING)
+    try:
+        return SettingCode(code), value
+    except ValueError:
+        raise ProtocolError(f"unknown setting code {code}") from None
+
+
+def decode_ack(data, offset: int = 0) -> None:
+    _unpack(data, offset, MessageType.ACK, ACK)
+
+
+def decode_hello(data, offset: int = 0) -> None:
+    _unpack(data, offset, MessageType.HELLO, HELLO)
+
+
+def decode_spectate(data, offset: int = 0) -> int:
+    """
+    Decodes the first message of a spectator.
+
+    Returns:
+        int: the id of the match to watch, 0 for the newest one
+    """
+    return _unpack(data, offset, MessageType.SPECTATE, SPECTATE)[2]
+
+
+def decode_handshake(data, offset: int = 0) -> MatchSettings:
+    """
+    Decodes the settings of a match.
+
+    Raises:
+        VersionError: if the peer uses another protocol version, the HANDSHAKE is the first message of a match
+        ProtocolError: if the message can not be decoded
+
+    Returns:
+        MatchSettings: the settings, features are the features the match needs
+    """
+    if len(data) - offset >= HEADER.size:
+        version, message_type = HEADER.unpack_from(data, offset)
+        if message_type == MessageType.HANDSHAKE and version != PROTOCOL_VERSION:
+            raise VersionError(version)
+    values = _unpack(data, offset, MessageType.HANDSHAKE, HANDSHAKE)
+    width, height, player_speed, ball_speed, tick_rate, ball_count, rollback_seed, features, length = values[2:]
+    name: str = _decode_name(data, offset + HANDSHAKE.size, length, "HANDSHAKE")
+    return MatchSettings(width, height, player_speed, ball_speed, tick_rate, ball_count, rollback_seed, name,
+                         features)
+
+
+def decode_handshake_reply(data, offset: int = 0) -> tuple:
+    """
+    Decodes the reply to a HANDSHAKE.
+
+    Returns:
+        tuple: (RejectReason, the features the peer supports, the name of the player)
+    """
+    _, _, reason, features, length = _unpack(data, offset, MessageType.HANDSHAKE_REPLY, HANDSHAKE_REPLY)
+    name: str = _decode_name(data, offset + HANDSHAKE_REPLY.size, length, "HANDSHAKE_REPLY")
+    try:
+        return RejectReason(reason), features, name
+    except ValueError:
+        raise ProtocolError(f"unknown reject reason {reason}") from None
+
+
+def decode_ping(data, offset: int = 0) -> float:
+    """
+    Returns:
+        float: the time the PING was sent, on the clock of the peer
+    """
+    return _unpack(data, offset, MessageType.PING, PING)[2]
+
+
+def decode_pong(data, offset: int = 0) -> tuple:
+    """
+    Returns:
+        tuple: (PING sent on our clock, PING received and PONG sent on the clock of the peer)
+    """
+    return _unpack(data, offset, MessageType.PONG, PONG)[2:]
+
+
+def decode_inputs(data, offset: int = 0) -> tuple:
+    """
+    Decodes the inputs of the rollback mode.
+
+    Returns:
+        tuple: (first frame, confirmed frame, hash frame, hash, inputs), see RollbackSession.receive
+    """
+    _, _, start_frame, ack_frame, hash_frame, state_hash, count = _unpack(data, offset, MessageType.INPUTS, INPUTS)
+    inputs: bytes = bytes(data[offset + INPUTS.size:offset + INPUTS.size + count])
+    if len(inputs) != count:
+        raise ProtocolError(f"INPUTS message too short: {len(data) - offset} bytes")
+    return start_frame, ack_frame, hash_frame, state_hash, inputs
@@ -0,0 +1,232 @@
+"""
+Renderers own the window and draw the game and the menus. There are two backends with the same methods:
+
+- SurfaceRenderer: software blits onto the surface of pygame.display.set_mode, with dirty rectangles
+  (see dirty_rects.py). This is how the game always drew.
+- TextureRenderer: the SDL2 Renderer API (pygame._sdl2.video). The surfaces from assets.py (texts, paddles, balls)
+  are uploaded once as textures and drawn by SDL, on the gpu if there is one. It draws at a logical resolution
+  (the size of the game field) that SDL scales to the window, so the window can have any size, e.g. 1920x1080 on
+  a kiosk while the game is 800x600. With software=True it uses SDL's software renderer, e.g. in CI without a gpu.
+
+The drawing code only passes surfaces and rectangles, so it does not know the backend:
+begin() starts a frame, blit/blits/rect draw, present() shows the frame.
+"""
+import weakref
+from typing import List, Optional, Sequence, Tuple
+
+import pygame
+from pygame._sdl2.video import Renderer as SDLRenderer
+from pygame._sdl2.video import Texture, Window
+
+from dirty_rects import DirtyRects
+
+BACKENDS: Tuple[str, ...] = ("surface", "texture")
+BLACK: Tuple[int, int, int] = (0, 0, 0)
+
+
+class SurfaceRenderer:
+    """
+    Draws with software blits onto the display surface, only the changed rectangles are sent to the display.
+    """
+
+    name: str = "surface"
+
+    def __init__(self, size: Tuple[int, int], title: str = "Pong", dirty: bool = True):
+        """
+        Args:
+            size (Tuple[int, int]): the size of the window
+            title (str, optional): the title of the window
+            dirty (bool, optional): False clears and flips the whole window every frame
+        """
+        self.size: Tuple[int, int] = tuple(size)
+        self.screen: pygame.Surface = pygame.display.set_mode(self.size)
+        self.dirty_rects: DirtyRects = DirtyRects(BLACK, enabled=dirty)
+        self.state: Optional[str] = None  # the state of the last frame
+        pygame.display.set_caption(title)
+
+    def set_size(self, size: Tuple[int, int]):
+        if tuple(size) != self.size:
+            self.size = tuple(size)
+            self.screen = pygame.display.set_mode(self.size)
+
+    def set_title(self, title: str):
+        pygame.display.set_caption(title)
+
+    def mouse_position(self) -> Tuple[int, int]:
+        return pygame.mouse.get_pos()
+
+    def invalidate(self):
+        """
+        Redraws the whole window in the next frame (e.g. the window was covered).
+        """
+        self.dirty_rects.invalidate()
+
+    def begin(self, state: Optional[str] = None):
+        """
+        Starts a frame and clears what has to be drawn again.
+
+        Args:
+            state (str, optional): the game state, None for screens that draw everything every frame (menus)
+        """
+        if state is None:
+            self.dirty_rects.invalidate()
+        self.state = state
+        self.dirty_rects.begin(self.screen, state)
+
+    def blit(self, surface: pygame.Surface, position: Sequence[float]) -> pygame.Rect:
+        """
+        Draws the surface with its top left corner at position.
+        The surface must not change after it was drawn once, the texture backend keeps a copy.
+
+        Returns:
+            pygame.Rect: where it was drawn
+        """
+        rect: pygame.Rect = self.screen.blit(surface, position)
+        self.dirty_rects.add(rect)
+        return rect
+
+    def blits(self, surface: pygame.Surface, positions: List[Tuple[float, float]]):
+        """
+        Draws the surface at all positions (e.g. the balls of the chaos mode).
+        """
+        for rect in self.screen.blits([(surface, position) for position in positions]):
+            self.dirty_rects.add(rect)
+
+    def rect(self, color: Tuple[int, int, int], rect: pygame.Rect, width: int = 0) -> pygame.Rect:
+        """
+        Draws a rectangle like pygame.draw.rect, filled if width is 0.
+        """
+        rect = pygame.draw.rect(self.screen, color, rect, width)
+        self.dirty_rects.add(rect)
+        return rect
+
+    def present(self):
+        self.dirty_rects.present()
+
+    def to_surface(self) -> pygame.Surface:
+        """
+        Returns the frame, e.g. for saving it. For this backend it is the display surface itself.
+        """
+        return self.screen
+
+    def close(self):
+        pass  # the display closes with pygame.quit()
+
+
+class TextureRenderer:
+    """
+    Draws with the SDL2 Renderer API, the surfaces are kept as textures. Every frame is drawn completely,
+    the renderer swaps buffers so dirty rectangles would not help.
+    """
+
+    name: str = "texture"
+
+    def __init__(self, size: Tuple[int, int], title: str = "Pong", window_size: Optional[Tuple[int, int]] = None,
+                 software: bool = False, vsync: bool = False):
+        """
+        Args:
+            size (Tuple[int, int]): the logical resolution, the coordinates the drawing code uses
+            title (str, optional): the title of the window
+            window_size (Tuple[int, int], optional): a fixed size of the window, None: the logical resolution
+            software (bool, optional): use SDL's software renderer instead of the gpu
+            vsync (bool, optional): wait for the display refresh in present()
+        """
+        self.size: Tuple[int, int] = tuple(size)
+        self.fixed_window: bool = window_size is not None
+        self.window: Window = Window(title, tuple(window_size or size), resizable=True)
+        self.renderer: SDLRenderer = SDLRenderer(self.window, accelerated=0 if software else -1, vsync=vsync)
+        self.renderer.logical_size = self.size
+        # One texture per surface, it is freed when the surface is evicted from the asset cache
+        self.textures: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self.state: Optional[str] = None
+
+    def set_size(self, size: Tuple[int, int]):
+        self.size = tuple(size)
+        self.renderer.logical_size = self.size
+        if not self.fixed_window:
+            self.window.size = self.size
+
+    def set_title(self, title: str):
+        self.window.title = title
+
+    def mouse_position(self) -> Tuple[int, int]:
+        """
+        Returns the mouse position in the logical resolution, the window can be scaled and have black bars.
+        """
+        x, y = pygame.mouse.get_pos()
+        scale_x, scale_y = self.renderer.scale
+        viewport: pygame.Rect = self.renderer.get_viewport()
+        return int(x / scale_x) - viewport.x, int(y / scale_y) - viewport.y
+
+    def invalidate(self):
+        pass  # every frame is drawn completely
+
+    def begin(self, state: Optional[str] = None):
+        self.state = state
+        self.renderer.draw_color = pygame.Color(BLACK)
+        self.renderer.clear()
+
+    def texture(self, surface: pygame.Surface) -> Texture:
+        texture: Optional[Texture] = self.textures.get(surface)
+        if texture is None:
+            texture = Texture.from_surface(self.renderer, surface)
+            self.textures[surface] = texture
+        return texture
+
+    def blit(self, surface: pygame.Surface, position: Sequence[float]) -> pygame.Rect:
+        rect: pygame.Rect = pygame.Rect((position[0], position[1]), surface.get_size())
+        if rect.width and rect.height:  # SDL has no empty textures, e.g. for an empty text
+            self.texture(surface).draw(dstrect=(position[0], position[1]))
+        return rect
+
+    def blits(self, surface: pygame.Surface, positions: List[Tuple[float, float]]):
+        if not surface.get_width() or not surface.get_height():
+            return
+        draw = self.texture(surface).draw
+        for position in positions:
+            draw(dstrect=position)
+
+    def rect(self, color: Tuple[int, int, int], rect: pygame.Rect, width: int = 0) -> pygame.Rect:
+        rect = pygame.Rect(rect)
+        self.renderer.draw_color = pygame.Color(color)
+        if width == 0:
+            self.renderer.fill_rect(rect)
+        else:
+            # The border of pygame.draw.rect grows inwards
+            for inset in range(width):
+                self.renderer.draw_rect(rect.inflate(-2 * inset, -2 * inset))
+        return rect
+
+    def present(self):
+        self.renderer.present()
+
+    def to_surface(self) -> pygame.Surface:
+        """
+        Returns a copy of the frame in the size of the window.
+        """
+        # Without a target surface pygame crashes when a logical size is set
+        return self.renderer.to_surface(pygame.Surface(self.window.size))
+
+    def close(self):
+        self.textures.clear()
+        self.window.destroy()
+
+
+def create_renderer(backend: str, size: Tuple[int, int], title: str = "Pong", **options):
+    """
+    Creates a renderer.
+
+    Args:
+        backend (str): "surface" or "texture"
+        size (Tuple[int, int]): the size of the window, the logical resolution for the texture backend
+        title (str, optional): the title of the window
+        options: passed to the backend (e.g. window_size and software for the texture backend)
+
+    Returns:
+        SurfaceRenderer | TextureRenderer: the renderer
+    """
+    if backend == "texture":
+        return TextureRenderer(size, title, **options)
+    if backend == "surface":
+        return SurfaceRenderer(size, title, **options)
+    raise ValueError(f"unknown renderer {backend}, use one of {BACKENDS}")
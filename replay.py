@@ -0,0 +1,256 @@
+"""
+Replays: the server records every tick of a match into a file, the replay player shows it again.
+
+File layout (big endian):
+- header: magic, version, width, height, tick rate, number of balls
+- one record per tick: the length of the message, the input bits of both players, then the game state as a
+  DELTA message (see snapshot_delta.py) against the tick before, every KEYFRAME_INTERVAL ticks a keyframe
+- when the recording is closed: the index with (tick, offset) of every keyframe, then the footer with the
+  offset of the index, the number of keyframes and INDEX_MAGIC
+
+Recording writes in a background thread, the game loop only puts the values of the tick into a queue.
+The player maps the file into memory (mmap), so a long recording is not read into RAM, and seeks with a binary
+search over the index to the keyframe before a tick. A file without index (the game was killed) is indexed by
+reading it once.
+
+The replay player is in replay_player.py.
+"""
+import bisect
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from typing import Optional, Tuple
+
+from SendData import SendData
+from snapshot_delta import BroadcastEncoder, SnapshotDecoder
+
+MAGIC: bytes = b"PONGRPL"
+INDEX_MAGIC: bytes = b"PONGIDX1"
+FORMAT_VERSION: int = 1
+# magic, version, width, height, tick rate, number of balls
+HEADER = struct.Struct("!7sBHHHH")
+# length of the DELTA message, input bits of player 1 and player 2
+RECORD = struct.Struct("!HBB")
+# tick, offset of the record in the file
+INDEX_ENTRY = struct.Struct("!IQ")
+# offset of the index, number of entries, INDEX_MAGIC
+FOOTER = struct.Struct("!QI8s")
+
+KEYFRAME_INTERVAL: int = 300  # ticks between two keyframes, seeking decodes at most this many records
+REPLAY_DIRECTORY: str = "replays"
+
+
+def new_replay_path() -> str:
+    """
+    Returns a new file name in REPLAY_DIRECTORY, from the current time.
+    """
+    os.makedirs(REPLAY_DIRECTORY, exist_ok=True)
+    return os.path.join(REPLAY_DIRECTORY, time.strftime("replay-%Y%m%d-%H%M%S.pongreplay"))
+
+
+class ReplayRecorder:
+    """
+    Writes a replay file. record() only copies the values into a queue, encoding and writing happen
+    in a background thread.
+    """
+
+    def __init__(self, path: str, width: int, height: int, tick_rate: int, ball_count: int = 1):
+        """
+        Args:
+            path (str): the file to write, see new_replay_path()
+            width (int): the width of the field
+            height (int): the height of the field
+            tick_rate (int): ticks per second
+            ball_count (int, optional): the number of balls, more than 1 in the chaos mode
+        """
+        self.path: str = path
+        self.file = open(path, "wb", buffering=1 << 16)
+        self.file.write(HEADER.pack(MAGIC, FORMAT_VERSION, width, height, tick_rate, ball_count))
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.index: bytearray = bytearray()
+        self.ticks: int = 0  # written records, only used by the thread until close()
+        self.error: Optional[BaseException] = None
+        self.thread: threading.Thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    def record(self, data: SendData, input1: int = 0, input2: int = 0):
+        """
+        Records one tick. The values are copied, data can be changed right after.
+
+        Args:
+            data (SendData): the state of the tick, as the server sends it
+            input1 (int, optional): the input bits of player 1 (see rollback.py)
+            input2 (int, optional): the input bits of player 2
+        """
+        self.queue.put((data.player_position, data.game_state, data.ball_x, data.ball_y, data.server_score,
+                        data.client_score, data.client_position, data.input_sequence, data.balls, input1, input2))
+
+    def close(self):
+        """
+        Writes the rest of the queue and the index and closes the file.
+        """
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is None:
+            index_offset: int = self.file.tell()
+            self.file.write(self.index)
+            self.file.write(FOOTER.pack(index_offset, len(self.index) // INDEX_ENTRY.size, INDEX_MAGIC))
+        self.file.close()
+        print(f"Replay with {self.ticks} ticks saved to {self.path}")
+
+    def write_loop(self):
+        encoder: BroadcastEncoder = BroadcastEncoder()
+        snapshot: SendData = SendData(0, "start", 0, 0, 0, 0)
+        try:
+            while True:
+                values: Optional[tuple] = self.queue.get()
+                if values is None:
+                    return
+                snapshot.update(*values[:9])
+                encoder.encode(snapshot)
+                if self.ticks % KEYFRAME_INTERVAL == 0 or encoder.delta is None:
+                    message: bytes = encoder.keyframe()
+                    self.index += INDEX_ENTRY.pack(self.ticks, self.file.tell())
+                else:
+                    message = encoder.delta
+                self.file.write(RECORD.pack(len(message), values[9], values[10]))
+                self.file.write(message)
+                self.ticks += 1
+        except Exception as e:
+            print(f"Recording the replay failed: {e!r}")
+            self.error = e
+
+
+class KeyframeIndex:
+    """
+    The keyframe ticks and offsets, read from the packed entries only when they are needed.
+    Indexing returns the tick, so bisect can search it directly.
+    """
+
+    def __init__(self, data, offset: int, count: int):
+        self.data = data
+        self.offset: int = offset
+        self.count: int = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> int:
+        return INDEX_ENTRY.unpack_from(self.data, self.offset + i * INDEX_ENTRY.size)[0]
+
+    def record_offset(self, i: int) -> int:
+        return INDEX_ENTRY.unpack_from(self.data, self.offset + i * INDEX_ENTRY.size)[1]
+
+
+class ReplayFile:
+    """
+    Reads a replay file tick by tick. The current tick is in snapshot and inputs, step() moves to the next one
+    and seek() jumps to any tick.
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.data: mmap.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < HEADER.size:
+            raise ValueError(f"{path} is not a replay")
+        magic, version, self.width, self.height, self.tick_rate, self.ball_count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a replay of version {FORMAT_VERSION}")
+
+        self.end: int = len(self.data)  # end of the records
+        footer_start: int = len(self.data) - FOOTER.size
+        if footer_start >= HEADER.size and self.data[-len(INDEX_MAGIC):] == INDEX_MAGIC:
+            index_offset, count, _ = FOOTER.unpack_from(self.data, footer_start)
+            self.end = index_offset
+            self.index: KeyframeIndex = KeyframeIndex(self.data, index_offset, count)
+        else:
+            print(f"{path} has no index, reading it once")
+            self.index = self.build_index()
+
+        self.snapshot: SendData = SendData(0, "start", 0, 0, 0, 0)
+        self.inputs: Tuple[int, int] = (0, 0)
+        self.tick: int = -1  # the tick in snapshot, -1 before the first step()
+        self.offset: int = HEADER.size  # the next record
+        self.decoder: SnapshotDecoder = SnapshotDecoder()
+        self.ticks: int = self.count_ticks()
+
+    def build_index(self) -> KeyframeIndex:
+        entries: bytearray = bytearray()
+        tick: int = 0
+        offset: int = HEADER.size
+        record = self.read_record(offset)
+        while record is not None:
+            if tick % KEYFRAME_INTERVAL == 0:
+                entries += INDEX_ENTRY.pack(tick, offset)
+            offset = record[3]
+            record = self.read_record(offset)
+            tick += 1
+        return KeyframeIndex(entries, 0, len(entries) // INDEX_ENTRY.size)
+
+    def count_ticks(self) -> int:
+        """
+        Counts the ticks, only the records after the last keyframe are read.
+        """
+        if len(self.index) == 0:
+            return 0
+        tick: int = self.index[len(self.index) - 1]
+        offset: int = self.index.record_offset(len(self.index) - 1)
+        while True:
+            record = self.read_record(offset)
+            if record is None:
+                return tick
+            offset = record[3]
+            tick += 1
+
+    def read_record(self, offset: int) -> Optional[tuple]:
+        """
+        Returns:
+            Optional[tuple]: (input1, input2, message, offset of the next record), None at the end
+                or if the record is incomplete
+        """
+        if offset + RECORD.size > self.end:
+            return None
+        length, input1, input2 = RECORD.unpack_from(self.data, offset)
+        start: int = offset + RECORD.size
+        if start + length > self.end:
+            return None
+        return input1, input2, memoryview(self.data)[start:start + length], start + length
+
+    def step(self) -> bool:
+        """
+        Moves to the next tick.
+
+        Returns:
+            bool: False at the end of the replay
+        """
+        record = self.read_record(self.offset)
+        if record is None:
+            return False
+        input1, input2, message, self.offset = record
+        self.decoder.decode(message, self.snapshot)
+        message.release()
+        self.inputs = (input1, input2)
+        self.tick += 1
+        return True
+
+    def seek(self, tick: int):
+        """
+        Moves to the tick: finds the keyframe before it with a binary search over the index
+        and decodes the records from there on.
+        """
+        tick = min(max(tick, 0), self.ticks - 1)
+        i: int = bisect.bisect_right(self.index, tick) - 1
+        if i < 0:
+            return
+        self.offset = self.index.record_offset(i)
+        self.tick = self.index[i] - 1
+        self.decoder = SnapshotDecoder()
+        while self.tick < tick and self.step():
+            pass
+
+    def close(self):
+        self.data.close()
+        self.file.close()
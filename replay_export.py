@@ -0,0 +1,123 @@
+"""
+Renders a replay (see replay.py) into image files without a window, with the drawing code of the game.
+
+The ticks are split into ranges and the ranges are rendered by a pool of processes, each one opens the replay
+itself, seeks to the start of its range and saves one frame per tick. Prints the frames per second at the end.
+
+Usage: python replay_export.py <file> <output directory> [--format png|rgb] [--workers 4] [--start 0] [--end 600]
+       [--every 1]
+       rgb writes the raw pixels, 3 bytes per pixel, row by row (e.g. for ffmpeg -f rawvideo -pix_fmt rgb24)
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+from replay import ReplayFile
+
+# More ranges than workers, so a worker that is done early takes the next one
+RANGES_PER_WORKER: int = 4
+
+
+def use_dummy_display():
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+
+
+def render_range(path: str, output: str, image_format: str, ticks: range) -> int:
+    """
+    Renders the ticks of the range into output. Runs in a worker process.
+
+    Returns:
+        int: the number of frames
+    """
+    use_dummy_display()
+    import pygame
+
+    from assets import get_assets
+    from replay_player import ReplayPlayer
+
+    replay: ReplayFile = ReplayFile(path)
+    player: ReplayPlayer = ReplayPlayer(replay)
+    player.seek(ticks.start)
+    frames: int = 0
+    for tick in ticks:
+        while replay.tick < tick and replay.step():
+            pass
+        if replay.tick != tick:
+            break  # the end of the replay
+        player.apply()
+        player.previous_positions = player.simulation.positions()  # nothing to blend, every frame is a tick
+        player.render_game()
+        name: str = os.path.join(output, f"frame_{tick:07d}.{image_format}")
+        if image_format == "png":
+            pygame.image.save(player.renderer.to_surface(), name)
+        else:
+            with open(name, "wb") as file:
+                file.write(pygame.image.tobytes(player.renderer.to_surface(), "RGB"))
+        frames += 1
+    pygame.quit()
+    get_assets().clear()  # the surfaces do not survive pygame.quit()
+    replay.close()
+    return frames
+
+
+def split_ticks(start: int, end: int, every: int, count: int) -> List[range]:
+    """
+    Splits the ticks from start to end (every n-th one) into about count ranges of the same length.
+    """
+    ticks: range = range(start, end, every)
+    size: int = max(1, -(-len(ticks) // count))
+    return [ticks[i:i + size] for i in range(0, len(ticks), size)]
+
+
+def export(path: str, output: str, image_format: str = "png", workers: int = None, start: int = 0,
+           end: int = None, every: int = 1) -> Tuple[int, float]:
+    """
+    Renders the ticks from start to end of the replay into output.
+
+    Args:
+        path (str): the replay file
+        output (str): the directory for the frames
+        image_format (str, optional): "png" or "rgb"
+        workers (int, optional): the number of processes, None for one per cpu core
+        start (int, optional): the first tick
+        end (int, optional): the tick after the last one, None for the end of the replay
+        every (int, optional): render every n-th tick
+
+    Returns:
+        Tuple[int, float]: the number of frames and the seconds it took
+    """
+    replay: ReplayFile = ReplayFile(path)
+    end = replay.ticks if end is None else min(end, replay.ticks)
+    replay.close()
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output, exist_ok=True)
+    use_dummy_display()
+
+    started: float = time.perf_counter()
+    ranges: List[range] = split_ticks(start, end, every, workers * RANGES_PER_WORKER)
+    with ProcessPoolExecutor(workers) as pool:
+        frames: int = sum(pool.map(render_range, *zip(*[(path, output, image_format, ticks) for ticks in ranges])))
+    return frames, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Renders a replay into image files.")
+    parser.add_argument("replay")
+    parser.add_argument("output")
+    parser.add_argument("--format", choices=("png", "rgb"), default="png")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--start", type=int, default=0)
+    parser.add_argument("--end", type=int, default=None)
+    parser.add_argument("--every", type=int, default=1)
+    args = parser.parse_args()
+
+    frames, seconds = export(args.replay, args.output, args.format, args.workers, args.start, args.end, args.every)
+    print(f"{frames} frames in {seconds:.2f} s, {frames / seconds:.0f} frames per second")
+
+
+if __name__ == "__main__":
+    main()
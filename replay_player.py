@@ -0,0 +1,150 @@
+"""
+Shows a replay file (see replay.py) with the renderer of the game.
+
+Usage: python replay_player.py <file> [speed] [renderer]     (e.g. replays/replay-20240101-120000.pongreplay 2)
+       renderer: surface (default) or texture, see renderer.py
+       Space: pause, up/down: faster/slower, left/right: 5 seconds back/forward, home: back to the start
+"""
+import sys
+import time
+
+import pygame
+
+from assets import get_assets
+from game import MAX_FRAME_TIME, Game
+from renderer import SurfaceRenderer, create_renderer
+from replay import ReplayFile
+from SendData import SendData
+from simulation import PongSimulation
+
+SEEK_SECONDS: float = 5.0
+MAX_SPEED: float = 64.0
+
+
+class ReplayPlayer:
+    """
+    Shows a replay with the renderer of the game, at a variable speed.
+    """
+
+    # The same drawing code as the game
+    render_game = Game.render_game
+    interpolate_positions = Game.interpolate_positions
+
+    def __init__(self, replay: ReplayFile, speed: float = 1.0, max_fps: int = 240, renderer=None):
+        """
+        Args:
+            replay (ReplayFile): the replay
+            speed (float, optional): 2 plays twice as fast, 0.5 half as fast
+            max_fps (int, optional): upper limit for the rendered frames per second
+            renderer (SurfaceRenderer | TextureRenderer, optional): None for a SurfaceRenderer
+        """
+        pygame.init()
+        self.replay: ReplayFile = replay
+        self.speed: float = speed
+        self.max_fps: int = max_fps
+        self.paused: bool = False
+        self.screen_width: int = replay.width
+        self.screen_height: int = replay.height
+        if renderer is None:
+            renderer = SurfaceRenderer((self.screen_width, self.screen_height))
+        self.renderer = renderer
+        self.renderer.set_size((self.screen_width, self.screen_height))
+        self.clock = pygame.time.Clock()
+        self.simulation: PongSimulation = PongSimulation(replay.width, replay.height, tick_rate=replay.tick_rate)
+        if replay.ball_count > 1:
+            self.simulation.add_balls(replay.ball_count)
+        self.replay.step()
+        self.apply()
+        self.previous_positions: tuple = self.simulation.positions()
+
+    def apply(self):
+        """
+        Copies the state of the current tick into the simulation, which is only used for drawing.
+        """
+        data: SendData = self.replay.snapshot
+        simulation: PongSimulation = self.simulation
+        simulation.paddle1_pos = data.player_position
+        simulation.paddle2_pos = data.client_position
+        simulation.ball_x = data.ball_x
+        simulation.ball_y = data.ball_y
+        simulation.player1_score = data.server_score
+        simulation.player2_score = data.client_score
+        simulation.game_state = data.game_state
+        if data.balls is not None and simulation.balls is not None:
+            simulation.balls.unpack(data.balls)
+
+    def seek(self, tick: int):
+        self.replay.seek(tick)
+        self.apply()
+        self.previous_positions = self.simulation.positions()
+
+    def handle_events(self) -> bool:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self.renderer.invalidate()
+            if event.type != pygame.KEYDOWN:
+                continue
+            seek_ticks: int = round(SEEK_SECONDS * self.replay.tick_rate)
+            if event.key == pygame.K_SPACE:
+                self.paused = not self.paused
+            elif event.key == pygame.K_UP:
+                self.speed = min(self.speed * 2, MAX_SPEED)
+            elif event.key == pygame.K_DOWN:
+                self.speed = max(self.speed / 2, 1 / MAX_SPEED)
+            elif event.key == pygame.K_LEFT:
+                self.seek(self.replay.tick - seek_ticks)
+            elif event.key == pygame.K_RIGHT:
+                self.seek(self.replay.tick + seek_ticks)
+            elif event.key == pygame.K_HOME:
+                self.seek(0)
+        return True
+
+    def run(self):
+        running: bool = True
+        accumulator: float = 0
+        last_time: float = time.perf_counter()
+        tick_duration: float = 1 / self.replay.tick_rate
+        while running:
+            running = self.handle_events()
+
+            now: float = time.perf_counter()
+            if not self.paused:
+                accumulator += min(now - last_time, MAX_FRAME_TIME) * self.speed
+            last_time = now
+            while accumulator >= tick_duration:
+                accumulator -= tick_duration
+                self.previous_positions = self.simulation.positions()
+                if not self.replay.step():
+                    self.paused = True
+                    accumulator = 0
+                    break
+                self.apply()
+
+            self.render_game(accumulator / tick_duration)
+            seconds: float = self.replay.tick / self.replay.tick_rate
+            self.renderer.set_title(
+                f"Replay {seconds:.1f}/{self.replay.ticks / self.replay.tick_rate:.1f} s, "
+                f"{self.speed:g}x{' (paused)' if self.paused else ''}")
+            self.clock.tick(self.max_fps)
+        self.renderer.close()
+        pygame.quit()
+        get_assets().clear()  # the surfaces do not survive pygame.quit()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    replay: ReplayFile = ReplayFile(sys.argv[1])
+    speed: float = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    backend: str = sys.argv[3] if len(sys.argv) > 3 else "surface"
+    print(f"{replay.ticks} ticks at {replay.tick_rate} Hz, {len(replay.index)} keyframes")
+    pygame.init()
+    ReplayPlayer(replay, speed, renderer=create_renderer(backend, (replay.width, replay.height), "Replay")).run()
+    replay.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Rollback netcode.
+
+Both peers run the same deterministic simulation and only exchange their inputs. When the input of
+the peer for a frame has not arrived yet, it is predicted (the peer keeps doing what it did last).
+When it arrives and the prediction was wrong, the simulation goes back to the state saved before that
+frame and simulates the frames up to now again with the right inputs.
+Every HASH_INTERVAL frames a hash of the state is exchanged, to detect when the peers went out of sync.
+"""
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+# Input bits of one player for one frame
+INPUT_UP: int = 1
+INPUT_DOWN: int = 2
+INPUT_SPACE: int = 4
+
+HASH_INTERVAL: int = 30
+FRAME_MODULO: int = 1 << 16  # frames are sent as 16 bit numbers
+
+
+def input_bits(up: bool, down: bool, space: bool = False) -> int:
+    return (INPUT_UP if up else 0) | (INPUT_DOWN if down else 0) | (INPUT_SPACE if space else 0)
+
+
+def unwrap_frame(frame: int, reference: int) -> int:
+    """
+    Turns a 16 bit frame number from a message back into a full frame number, close to the reference.
+    """
+    return reference + ((frame - reference + FRAME_MODULO // 2) % FRAME_MODULO) - FRAME_MODULO // 2
+
+
+class DeterministicRandom:
+    """
+    Small xorshift random number generator. Both peers seed it the same way and get the same numbers,
+    and its whole state is one int, so saving it for every frame costs nothing.
+    """
+
+    def __init__(self, seed: int):
+        self.state: int = (seed & 0xFFFFFFFF) or 1
+
+    def random(self) -> float:
+        x: int = self.state
+        x ^= (x << 13) & 0xFFFFFFFF
+        x ^= x >> 17
+        x ^= (x << 5) & 0xFFFFFFFF
+        self.state = x
+        return x / 0x100000000
+
+    def uniform(self, a: float, b: float) -> float:
+        return a + (b - a) * self.random()
+
+
+class RollbackSession:
+    """
+    Keeps the inputs of both players and the saved states, and rolls back when a prediction was wrong.
+
+    The simulation has to provide:
+    - step(input_server, input_client): simulates one frame
+    - save_state() -> tuple: everything step() reads or changes
+    - load_state(state): restores a saved state
+    """
+
+    def __init__(self, simulation, is_server: bool, max_prediction: int = 8):
+        """
+        Args:
+            simulation: the deterministic simulation (see above)
+            is_server (bool): the local player controls the server paddle
+            max_prediction (int, optional): how many frames the simulation may run ahead of the peer's inputs
+        """
+        self.simulation = simulation
+        self.is_server: bool = is_server
+        self.max_prediction: int = max_prediction
+
+        self.frame: int = 0  # the next frame to simulate
+        self.local_inputs: Dict[int, int] = {}
+        self.remote_inputs: Dict[int, int] = {}
+        self.predicted: Dict[int, int] = {}  # remote inputs that were guessed
+        self.confirmed_frame: int = -1  # the remote inputs up to this frame are known
+        self.remote_ack: int = -1  # the peer knows our inputs up to this frame
+
+        # states[frame % len] = (frame, state before simulating the frame)
+        self.states: List[Optional[Tuple[int, tuple]]] = [None] * (2 * max_prediction + 2)
+        self.hashes: Dict[int, int] = {}
+        self.remote_hashes: Dict[int, int] = {}
+        self.desync_frame: Optional[int] = None
+
+        self.rollbacks: int = 0
+        self.resimulated_frames: int = 0
+
+    def can_advance(self) -> bool:
+        """
+        Returns False if the simulation is too far ahead of the peer, then the game waits.
+        """
+        return self.frame - self.confirmed_frame <= self.max_prediction
+
+    def advance(self, local_input: int) -> None:
+        """
+        Simulates the next frame with the local input and the (maybe predicted) input of the peer.
+        """
+        self.local_inputs[self.frame] = local_input
+        self.simulate(self.frame)
+        self.frame += 1
+        self.update_hashes()
+
+    def simulate(self, frame: int) -> None:
+        remote_input: Optional[int] = self.remote_inputs.get(frame)
+        if remote_input is None:
+            # The peer most likely still holds the same keys, but does not press space again
+            remote_input = self.remote_inputs.get(self.confirmed_frame, 0) & ~INPUT_SPACE
+            self.predicted[frame] = remote_input
+        self.states[frame % len(self.states)] = (frame, self.simulation.save_state())
+        local_input: int = self.local_inputs[frame]
+        if self.is_server:
+            self.simulation.step(local_input, remote_input)
+        else:
+            self.simulation.step(remote_input, local_input)
+
+    def receive(self, message: tuple) -> None:
+        """
+        Handles an INPUTS message of the peer (see protocol.decode_inputs).
+        """
+        start, ack, hash_frame, state_hash, inputs = message
+        start = unwrap_frame(start, self.confirmed_frame + 1)
+        self.remote_ack = max(self.remote_ack, unwrap_frame(ack, self.frame))
+
+        rollback_frame: Optional[int] = None
+        for offset, remote_input in enumerate(inputs):
+            frame: int = start + offset
+            if frame <= self.confirmed_frame:
+                continue
+            if frame != self.confirmed_frame + 1:
+                break  # a gap, the inputs in between are sent again
+            self.remote_inputs[frame] = remote_input
+            self.confirmed_frame = frame
+            predicted: Optional[int] = self.predicted.pop(frame, None)
+            if rollback_frame is None and predicted is not None and predicted != remote_input:
+                rollback_frame = frame
+
+        if rollback_frame is not None:
+            self.rollback(rollback_frame)
+
+        if hash_frame:
+            self.remote_hashes[unwrap_frame(hash_frame, self.frame)] = state_hash
+        self.update_hashes()
+        self.forget_old_frames()
+
+    def rollback(self, frame: int) -> None:
+        """
+        Loads the state before the frame and simulates up to the current frame again.
+        """
+        entry = self.states[frame % len(self.states)]
+        if entry is None or entry[0] != frame:
+            raise RuntimeError(f"no saved state for frame {frame}, cannot roll back")
+        self.rollbacks += 1
+        self.simulation.load_state(entry[1])
+        for resimulate in range(frame, self.frame):
+            self.predicted.pop(resimulate, None)
+            self.simulate(resimulate)
+            self.resimulated_frames += 1
+
+    def update_hashes(self) -> None:
+        """
+        Hashes the states that can not change anymore and compares them with the hashes of the peer.
+        """
+        # The state before frame f is final once all inputs before f are known
+        final: int = min(self.confirmed_frame + 1, self.frame - 1)
+        frame: int = final - final % HASH_INTERVAL
+        if frame > 0 and frame not in self.hashes:
+            entry = self.states[frame % len(self.states)]
+            if entry is not None and entry[0] == frame:
+                self.hashes[frame] = zlib.crc32(repr(entry[1]).encode())
+        for frame, remote_hash in self.remote_hashes.items():
+            if frame in self.hashes and self.hashes[frame] != remote_hash and self.desync_frame is None:
+                self.desync_frame = frame
+                print(f"Desync detected at frame {frame}")
+
+    def forget_old_frames(self) -> None:
+        oldest: int = min(self.confirmed_frame, self.remote_ack) - len(self.states)
+        for inputs in (self.local_inputs, self.remote_inputs):
+            for frame in [frame for frame in inputs if frame < oldest]:
+                del inputs[frame]
+        for hashes in (self.hashes, self.remote_hashes):
+            for frame in [frame for frame in hashes if frame < oldest - HASH_INTERVAL]:
+                del hashes[frame]
+
+    def message(self) -> tuple:
+        """
+        Returns what the peer needs: all local inputs it has not confirmed yet and the newest state hash.
+
+        Returns:
+            tuple: (first frame, confirmed remote frame, hash frame, hash, inputs) for protocol.encode_inputs
+        """
+        start: int = max(self.remote_ack + 1, self.frame - 255)
+        inputs: bytes = bytes(self.local_inputs[frame] for frame in range(start, self.frame))
+        hash_frame: int = max(self.hashes) if self.hashes else 0
+        return (start % FRAME_MODULO, self.confirmed_frame % FRAME_MODULO, hash_frame % FRAME_MODULO,
+                self.hashes.get(hash_frame, 0), inputs)
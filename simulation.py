@@ -0,0 +1,248 @@
+"""
+The rules of the game without pygame and without the network: paddles, ball, collisions and the score.
+
+Game draws it and feeds it the keys, the server and the rollback mode step it, and it can run headless
+(see headless.py) for tests and bots.
+"""
+import math
+import random
+from typing import Optional
+
+from rollback import INPUT_DOWN, INPUT_SPACE, INPUT_UP, DeterministicRandom
+
+# The speeds in the settings are in pixels per 1/60 second, they get scaled to the tick rate
+BASE_TICK_RATE: int = 60
+# Walls and paddles the ball can bounce off in one tick, more only happens if it is stuck in a corner
+MAX_BOUNCES: int = 8
+WINNING_SCORE: int = 10
+
+
+class PongSimulation:
+    def __init__(self, width: int = 800, height: int = 600, player_speed: float = 8, ball_speed: float = 5,
+                 tick_rate: int = 60, seed: Optional[int] = None):
+        """
+        Args:
+            width (int, optional): the width of the field
+            height (int, optional): the height of the field
+            player_speed (float, optional): paddle speed in pixels per 1/60 second
+            ball_speed (float, optional): ball speed in pixels per 1/60 second
+            tick_rate (int, optional): ticks per second
+            seed (int, optional): seed of the random numbers, the same seed and inputs give the same game
+        """
+        self.width: int = width
+        self.height: int = height
+        self.player_speed: float = player_speed
+        self.ball_speed: float = ball_speed
+        self.set_tick_rate(tick_rate)
+
+        self.paddle1_pos: float = height // 2
+        self.paddle2_pos: float = height // 2
+        self.ball_size: int = 20
+
+        self.player1_score: int = 0
+        self.player2_score: int = 0
+        self.game_state: str = "start"
+
+        # All randomness of the game, in rollback mode both peers use the same seed
+        self.rng: DeterministicRandom = DeterministicRandom(random.getrandbits(32) if seed is None else seed)
+        self.reset_ball()
+        # Chaos mode: many balls, see add_balls()
+        self.balls = None
+
+    def set_tick_rate(self, tick_rate: int):
+        """
+        Sets the simulation rate and scales the speeds, so the game runs equally fast at any tick rate.
+        """
+        self.tick_rate: int = tick_rate
+        self.tick_duration: float = 1 / tick_rate
+        self.tick_scale: float = BASE_TICK_RATE / tick_rate
+        self.paddle_step: float = self.player_speed * self.tick_scale
+        self.ball_step: float = self.ball_speed * self.tick_scale
+
+    def add_balls(self, count: int):
+        """
+        Switches to the chaos mode with this many balls, ball 0 is the normal ball. Needs numpy.
+        The balls are not part of save_state(), so the chaos mode does not work with the rollback mode.
+        """
+        from multiball import MultiBall  # only the chaos mode needs numpy
+
+        self.balls = MultiBall(self, count, seed=self.rng.state)
+
+    def positions(self) -> tuple:
+        return (self.paddle1_pos, self.paddle2_pos, self.ball_x, self.ball_y)
+
+    def calculate_ball_angle(self, paddle_pos: float, ball_pos: float) -> float:
+        """
+        Calculates the angle of the ball after it hits a paddle, based on the position of the ball and the paddle.
+
+        Args:
+            paddle_pos (float): the position of the paddle
+            ball_pos (float): the position of the ball
+
+        Returns:
+            float: the angle of the ball after it hits a paddle
+        """
+        relative_y: float = ball_pos - paddle_pos
+        normalized_relative_y: float = (relative_y - 25) / 25
+        max_angle: float = math.pi * 3 / 4
+        angle: float = math.sin(normalized_relative_y * math.pi / 2) * max_angle
+        return -angle
+
+    def reset_ball(self):
+        """
+        Resets the ball to the center of the field and gives it a random direction.
+        """
+        self.ball_x: float = self.width // 2
+        self.ball_y: float = self.height // 2
+        self.ball_dx: float = self.ball_step if self.rng.random() < 0.5 else - \
+            self.ball_step
+        self.ball_dy: float = self.ball_step if self.rng.random() < 0.5 else - \
+            self.ball_step
+
+    def press_space(self):
+        """
+        Starts the game, or goes back to the start after the game is over.
+        """
+        if self.game_state == "start":
+            self.game_state = "playing"
+        elif self.game_state == "game_over":
+            self.game_state = "start"
+            self.player1_score = 0
+            self.player2_score = 0
+            self.reset_ball()
+            if self.balls is not None:
+                self.balls.reset()
+
+    def step(self, input1: int, input2: int):
+        """
+        Simulates one tick with the inputs of both players. Deterministic, the rollback mode runs it on both peers
+        and again after a rollback.
+
+        Args:
+            input1 (int): the input bits of the server player (see rollback.py)
+            input2 (int): the input bits of the client player
+        """
+        if self.game_state != "playing":
+            if (input1 | input2) & INPUT_SPACE:
+                self.press_space()
+        else:
+            self.move_paddles(input1, input2)
+            self.step_ball()
+
+    def move_paddles(self, input1: int, input2: int):
+        if input1 & INPUT_UP and self.paddle1_pos > 0:
+            self.paddle1_pos -= self.paddle_step
+        if input1 & INPUT_DOWN and self.paddle1_pos < self.height - 50:
+            self.paddle1_pos += self.paddle_step
+        if input2 & INPUT_UP and self.paddle2_pos > 0:
+            self.paddle2_pos -= self.paddle_step
+        if input2 & INPUT_DOWN and self.paddle2_pos < self.height - 50:
+            self.paddle2_pos += self.paddle_step
+
+    def clamp_paddle(self, current: float, position: float, steps: int) -> float:
+        """
+        Limits a paddle position sent by a client to what the player speed allows.
+
+        Args:
+            current (float): the position of the paddle on the server
+            position (float): the position the client sent
+            steps (int): the number of inputs of the client since the current position
+
+        Returns:
+            float: the position the server accepts
+        """
+        max_move: float = self.paddle_step * steps
+        position = min(max(position, current - max_move), current + max_move)
+        # The client moves while it is inside the screen, so it can stop up to one step outside
+        return min(max(position, -self.paddle_step), self.height - 50 + self.paddle_step)
+
+    def step_ball(self):
+        """
+        Moves the ball, checks for collisions with the walls and paddles and counts the points.
+
+        The movement of one tick is swept: the ball bounces at the exact time it reaches a wall or a paddle
+        and moves on for the rest of the tick, so a fast ball cannot pass through a paddle.
+        """
+        if self.balls is not None:
+            self.balls.step()
+            self.check_game_over()
+            return
+
+        top: float = self.ball_size // 2
+        bottom: float = self.height - 1 - self.ball_size // 2
+        left_paddle: float = 30
+        right_paddle: float = self.width - 50
+
+        remaining: float = 1.0  # part of the tick that is not simulated yet
+        for _ in range(MAX_BOUNCES):
+            hit_time: float = remaining
+            hit = None
+            if self.ball_dy < 0:
+                hit_time, hit = self.earliest_hit(hit_time, hit, (top - self.ball_y) / self.ball_dy, "wall")
+            elif self.ball_dy > 0:
+                hit_time, hit = self.earliest_hit(hit_time, hit, (bottom - self.ball_y) / self.ball_dy, "wall")
+            # A ball that is on or behind the paddle column already hit or missed the paddle
+            if self.ball_dx < 0 and self.ball_x > left_paddle:
+                hit_time, hit = self.earliest_hit(hit_time, hit, (left_paddle - self.ball_x) / self.ball_dx, 1)
+            elif self.ball_dx > 0 and self.ball_x < right_paddle:
+                hit_time, hit = self.earliest_hit(hit_time, hit, (right_paddle - self.ball_x) / self.ball_dx, 2)
+
+            self.ball_x += self.ball_dx * hit_time
+            self.ball_y += self.ball_dy * hit_time
+            remaining -= hit_time
+            if hit is None:
+                break
+            if hit == "wall":
+                self.ball_dy *= -1
+            else:
+                paddle_pos: float = self.paddle1_pos if hit == 1 else self.paddle2_pos
+                if paddle_pos <= self.ball_y < paddle_pos + 50:
+                    self.bounce_off_paddle(paddle_pos, 1 if hit == 1 else -1)
+
+        if self.ball_x < 0:
+            self.player2_score += 1
+            self.reset_ball()
+        elif self.ball_x > self.width:
+            self.player1_score += 1
+            self.reset_ball()
+
+        self.check_game_over()
+
+    def check_game_over(self):
+        if self.player1_score >= WINNING_SCORE or self.player2_score >= WINNING_SCORE:
+            self.game_state = "game_over"
+
+    @staticmethod
+    def earliest_hit(hit_time: float, hit, time_to_hit: float, obstacle) -> tuple:
+        """
+        Returns (time, obstacle) of the earlier of the two hits. A ball that is already behind the obstacle
+        hits it right away.
+        """
+        time_to_hit = max(time_to_hit, 0.0)
+        if time_to_hit <= hit_time:
+            return time_to_hit, obstacle
+        return hit_time, hit
+
+    def bounce_off_paddle(self, paddle_pos: float, direction: int):
+        """
+        Sends the ball back, the angle depends on where it hit the paddle.
+
+        Args:
+            paddle_pos (float): the position of the paddle that was hit
+            direction (int): 1 if the ball now moves to the right, -1 if to the left
+        """
+        ball_angle = self.calculate_ball_angle(paddle_pos, self.ball_y)
+        self.ball_dx = direction * abs(self.ball_dx)
+        self.ball_dy = -math.sin(ball_angle) * self.ball_step
+        self.ball_dy += self.rng.uniform(-1, 1) * self.tick_scale
+
+    def save_state(self) -> tuple:
+        """
+        Returns everything step() reads or changes, for the rollback mode.
+        """
+        return (self.paddle1_pos, self.paddle2_pos, self.ball_x, self.ball_y, self.ball_dx, self.ball_dy,
+                self.player1_score, self.player2_score, self.game_state, self.rng.state)
+
+    def load_state(self, state: tuple):
+        (self.paddle1_pos, self.paddle2_pos, self.ball_x, self.ball_y, self.ball_dx, self.ball_dy,
+         self.player1_score, self.player2_score, self.game_state, self.rng.state) = state
@@ -0,0 +1,282 @@
+"""
+Delta-compressed snapshots.
+
+Instead of all fields, a DELTA message only carries the fields that changed compared to a base snapshot
+the client has acknowledged. Positions are quantized to 1/QUANTIZATION pixel and sent as a one byte
+difference to the base if it fits. Every KEYFRAME_INTERVAL ticks, or when there is no usable base,
+a keyframe with all fields is sent, so the stream recovers from lost messages.
+
+Layout: version, type, tick, ticks since the base, mask, then the fields that are set in the mask.
+In the chaos mode the positions of all balls follow (see multiball.py), always complete and not as a delta:
+the number of balls, then their packed positions.
+"""
+import struct
+from typing import Dict, List, Optional, Tuple
+
+import protocol
+from protocol import CODE_TO_GAME_STATE, GAME_STATE_TO_CODE, PROTOCOL_VERSION, MessageType, ProtocolError
+from SendData import SendData
+
+QUANTIZATION: int = 4           # positions are sent in 1/4 pixel
+KEYFRAME_INTERVAL: int = 60     # ticks between two keyframes
+HISTORY_SIZE: int = 64          # snapshots kept to be used as base, by the encoder and the decoder
+TICK_MODULO: int = 1 << 16
+
+DELTA_HEADER = struct.Struct("!BBHBH")
+_HEADER_VALUES: int = 5
+
+# Field order of a quantized state, also the order in which the fields are written
+(PLAYER_POSITION, BALL_X, BALL_Y, CLIENT_POSITION, INPUT_SEQUENCE,
+ SERVER_SCORE, CLIENT_SCORE, GAME_STATE) = range(8)
+FIELD_COUNT: int = 8
+# Fields that can be sent as a one byte difference to the base
+SMALL_FIELDS = (PLAYER_POSITION, BALL_X, BALL_Y, CLIENT_POSITION, INPUT_SEQUENCE)
+POSITION_FIELDS = (PLAYER_POSITION, BALL_X, BALL_Y, CLIENT_POSITION)
+
+# Mask bits 0-7: the field is in the message, 8: keyframe, 9-13: the field is a one byte difference,
+# 14: the positions of the balls follow
+KEYFRAME_BIT: int = 1 << FIELD_COUNT
+SMALL_SHIFT: int = FIELD_COUNT + 1
+BALLS_BIT: int = 1 << 14
+BALL_COUNT = struct.Struct("!H")
+BALL_SIZE: int = 4  # bytes per ball, x and y
+
+_FULL_MASK: int = (1 << FIELD_COUNT) - 1
+_LAYOUTS: Dict[int, struct.Struct] = {}
+
+
+def _layout(mask: int) -> struct.Struct:
+    """
+    Returns the struct for a combination of fields, so encoding and decoding is one pack/unpack.
+    The structs are compiled on first use, only a few combinations occur in a game.
+    """
+    key: int = mask & ~(KEYFRAME_BIT | BALLS_BIT)  # these bits do not change the layout
+    layout: Optional[struct.Struct] = _LAYOUTS.get(key)
+    if layout is None:
+        fmt: str = DELTA_HEADER.format
+        for field in range(FIELD_COUNT):
+            if not key & (1 << field):
+                continue
+            if key & (1 << (SMALL_SHIFT + field)):
+                fmt += "b"
+            elif field in POSITION_FIELDS:
+                fmt += "h"
+            elif field == GAME_STATE:
+                fmt += "B"
+            else:
+                fmt += "H"
+        layout = _LAYOUTS[key] = struct.Struct(fmt)
+    return layout
+
+
+def quantize(data: SendData) -> Tuple[int, ...]:
+    return (
+        round(data.player_position * QUANTIZATION),
+        round(data.ball_x * QUANTIZATION),
+        round(data.ball_y * QUANTIZATION),
+        round(data.client_position * QUANTIZATION),
+        data.input_sequence,
+        data.server_score,
+        data.client_score,
+        GAME_STATE_TO_CODE[data.game_state],
+    )
+
+
+def pack_state(tick: int, state: tuple, base: Optional[tuple], base_age: int, balls: Optional[bytes]) -> bytes:
+    """
+    Packs a quantized state into a DELTA message.
+
+    Args:
+        tick (int): the tick of the state
+        state (tuple): the quantized state (see quantize())
+        base (tuple, optional): the quantized state the delta is based on, None for a keyframe
+        base_age (int): the number of ticks between the base and the state
+        balls (bytes, optional): the packed positions of the balls in the chaos mode
+
+    Returns:
+        bytes: the DELTA message
+    """
+    values: list = []
+    balls_mask: int = BALLS_BIT if balls is not None else 0
+    if base is None:
+        mask: int = KEYFRAME_BIT | _FULL_MASK
+        base_age = 0
+        values.extend(state)
+    else:
+        mask = 0
+        for field in range(FIELD_COUNT):
+            value: int = state[field]
+            if value == base[field]:
+                continue
+            mask |= 1 << field
+            if field in SMALL_FIELDS and -128 <= value - base[field] <= 127:
+                mask |= 1 << (SMALL_SHIFT + field)
+                value -= base[field]
+            values.append(value)
+
+    message: bytes = _layout(mask).pack(
+        PROTOCOL_VERSION, MessageType.DELTA, tick, base_age, mask | balls_mask, *values)
+    if balls_mask:
+        message += BALL_COUNT.pack(len(balls) // BALL_SIZE) + balls
+    return message
+
+
+class SnapshotEncoder:
+    """
+    Encodes the snapshots of the server as deltas against the newest snapshot the client acknowledged.
+    """
+
+    def __init__(self):
+        self.tick: int = 0
+        self.history: List[Optional[Tuple[int, tuple]]] = [None] * HISTORY_SIZE  # (tick, quantized state)
+        self.acked_tick: Optional[int] = None
+        self.last_keyframe: int = -KEYFRAME_INTERVAL
+        self.ticks_sent: int = 0
+        self.bytes_sent: int = 0
+
+    def acknowledge(self, tick: int) -> None:
+        """
+        Called when the client confirmed it has decoded the snapshot of this tick.
+        """
+        self.acked_tick = tick
+
+    def encode(self, data: SendData, keyframe: bool = False) -> bytes:
+        """
+        Encodes the next snapshot.
+
+        Args:
+            data (SendData): the current game state
+            keyframe (bool, optional): send all fields, e.g. for messages that can arrive out of order
+
+        Returns:
+            bytes: the DELTA message
+        """
+        self.tick = (self.tick + 1) % TICK_MODULO
+        state: tuple = quantize(data)
+        self.history[self.tick % HISTORY_SIZE] = (self.tick, state)
+
+        base: Optional[tuple] = None
+        base_age: int = 0
+        if not keyframe and self.ticks_sent - self.last_keyframe < KEYFRAME_INTERVAL and self.acked_tick is not None:
+            base_age = (self.tick - self.acked_tick) % TICK_MODULO
+            entry = self.history[self.acked_tick % HISTORY_SIZE]
+            if 0 < base_age < HISTORY_SIZE // 2 and entry is not None and entry[0] == self.acked_tick:
+                base = entry[1]
+
+        message: bytes = pack_state(self.tick, state, base, base_age, data.balls)
+        if base is None:
+            self.last_keyframe = self.ticks_sent
+        self.ticks_sent += 1
+        self.bytes_sent += len(message)
+        return message
+
+
+class BroadcastEncoder:
+    """
+    Encodes the snapshots for many receivers that do not acknowledge, e.g. spectators.
+
+    Every tick is encoded once as a delta to the tick before, all receivers get the same message.
+    A receiver that can not decode the delta (it just joined or skipped a tick) gets a keyframe instead,
+    it is only encoded when a receiver needs it, and then only once per tick.
+    """
+
+    def __init__(self):
+        self.tick: int = 0
+        self.state: Optional[tuple] = None
+        self.balls: Optional[bytes] = None
+        self.delta: Optional[bytes] = None  # None if there is no tick before
+        self._keyframe: Optional[bytes] = None
+
+    def encode(self, data: SendData) -> None:
+        """
+        Encodes the snapshot of the next tick, see delta and keyframe().
+        """
+        previous: Optional[tuple] = self.state
+        self.tick = (self.tick + 1) % TICK_MODULO
+        self.state = quantize(data)
+        self.balls = data.balls
+        self.delta = None if previous is None else pack_state(self.tick, self.state, previous, 1, self.balls)
+        self._keyframe = None
+
+    def keyframe(self) -> bytes:
+        if self._keyframe is None:
+            self._keyframe = pack_state(self.tick, self.state, None, 0, self.balls)
+        return self._keyframe
+
+
+class SnapshotDecoder:
+    """
+    Decodes DELTA messages on the client. Keeps the decoded snapshots, so later deltas can use them as base.
+    """
+
+    def __init__(self):
+        self.history: List[Optional[Tuple[int, tuple]]] = [None] * HISTORY_SIZE
+        # The newest tick that was decoded, sent back to the server as acknowledgement
+        self.acked_tick: int = 0
+        self.tick: int = 0  # the tick of the last decoded message
+
+    def decode(self, data, out: SendData = None) -> Optional[SendData]:
+        """
+        Decodes a DELTA message.
+
+        Args:
+            data (bytes-like): the received message
+            out (SendData, optional): the object to decode into
+
+        Returns:
+            Optional[SendData]: the snapshot, None if the base is not known (anymore), then it waits for a keyframe
+        """
+        if len(data) < DELTA_HEADER.size:
+            raise ProtocolError(f"DELTA message too short: {len(data)} bytes")
+        version, message_type, tick, base_age, mask = DELTA_HEADER.unpack_from(data)
+        if version != PROTOCOL_VERSION or message_type != MessageType.DELTA:
+            protocol.read_header(data)  # raises the matching error
+            raise ProtocolError(f"expected DELTA message, got {MessageType(message_type).name}")
+        layout: struct.Struct = _layout(mask)
+        if len(data) < layout.size:
+            raise ProtocolError(f"DELTA message too short: {len(data)} bytes")
+        values = layout.unpack_from(data)
+        balls: Optional[bytes] = None
+        if mask & BALLS_BIT:
+            if len(data) < layout.size + BALL_COUNT.size:
+                raise ProtocolError(f"DELTA message too short: {len(data)} bytes")
+            end: int = layout.size + BALL_COUNT.size + BALL_COUNT.unpack_from(data, layout.size)[0] * BALL_SIZE
+            if len(data) < end:
+                raise ProtocolError(f"DELTA message too short for the balls: {len(data)} bytes")
+            balls = bytes(data[layout.size + BALL_COUNT.size:end])  # the received data is reused
+
+        if mask & KEYFRAME_BIT:
+            state: tuple = values[_HEADER_VALUES:]
+        else:
+            base_tick: int = (tick - base_age) % TICK_MODULO
+            entry = self.history[base_tick % HISTORY_SIZE]
+            if entry is None or entry[0] != base_tick:
+                return None
+            state_list: list = list(entry[1])
+            index: int = _HEADER_VALUES
+            for field in range(FIELD_COUNT):
+                if not mask & (1 << field):
+                    continue
+                if mask & (1 << (SMALL_SHIFT + field)):
+                    state_list[field] += values[index]
+                else:
+                    state_list[field] = values[index]
+                index += 1
+            state = tuple(state_list)
+
+        game_state = CODE_TO_GAME_STATE.get(state[GAME_STATE])
+        if game_state is None:
+            raise ProtocolError(f"unknown game state code {state[GAME_STATE]}")
+
+        self.history[tick % HISTORY_SIZE] = (tick, state)
+        self.tick = tick
+        if (tick - self.acked_tick) % TICK_MODULO < TICK_MODULO // 2:
+            self.acked_tick = tick  # only move forward, older keyframes can arrive late
+
+        if out is None:
+            out = SendData(0, game_state, 0, 0, 0, 0)
+        out.update(
+            state[PLAYER_POSITION] / QUANTIZATION, game_state, state[BALL_X] / QUANTIZATION,
+            state[BALL_Y] / QUANTIZATION, state[SERVER_SCORE], state[CLIENT_SCORE],
+            state[CLIENT_POSITION] / QUANTIZATION, state[INPUT_SEQUENCE], balls)
+        return out
@@ -0,0 +1,162 @@
+"""
+Opt-in tracing: named spans (a start and an end time) around the interesting parts of the game, saved as a Chrome
+trace that chrome://tracing or https://ui.perfetto.dev shows as a timeline, one row per thread.
+
+    with tracing.span("render paddles"):
+        ...
+
+Every thread writes its spans into its own ring buffer, so threads never wait for each other and a long session
+only keeps the newest TRACE_CAPACITY spans per thread. The buffers are preallocated when a thread records its
+first span, recording a span allocates nothing.
+While tracing is off (the default), span() returns a shared context manager that does nothing, a span costs one
+function call then.
+
+main.py --trace enables it, the game saves the trace when it ends and when F4 is pressed (see game.py).
+"""
+import json
+import os
+import threading
+import time
+from array import array
+from typing import List, Optional
+
+TRACE_CAPACITY: int = 65536
+TRACE_DIRECTORY: str = "traces"
+
+enabled: bool = False
+_path: Optional[str] = None
+_origin: float = 0.0  # perf_counter() of the trace start, the timestamps are relative to it
+_buffers: List["ThreadBuffer"] = []
+_buffers_lock: threading.Lock = threading.Lock()
+_local: threading.local = threading.local()
+
+
+class ThreadBuffer:
+    """
+    The spans of one thread. Each span has a slot in the ring, the open ones are on a stack so spans can nest.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity: int = capacity
+        self.names: list = [None] * capacity
+        self.starts: array = array("d", bytes(8 * capacity))
+        self.ends: array = array("d", bytes(8 * capacity))
+        self.count: int = 0
+        self.open: List[int] = []  # the slots of the open spans
+        self.name: str = ""  # the name of the span that span() prepared
+        self.thread_id: int = threading.get_ident()
+        self.thread_name: str = threading.current_thread().name
+
+    def __enter__(self):
+        slot: int = self.count % self.capacity
+        self.names[slot] = self.name
+        self.ends[slot] = -1.0  # still open, not exported
+        self.open.append(slot)
+        self.count += 1
+        self.starts[slot] = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.ends[self.open.pop()] = time.perf_counter()
+        return False
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN: NullSpan = NullSpan()
+
+
+def span(name: str):
+    """
+    Returns a context manager that records the time of its block as a span with this name.
+    Use a string constant for the name, a formatted one would allocate even while tracing is off.
+    """
+    if not enabled:
+        return NULL_SPAN
+    buffer: Optional[ThreadBuffer] = getattr(_local, "buffer", None)
+    if buffer is None:
+        buffer = ThreadBuffer(TRACE_CAPACITY)
+        _local.buffer = buffer
+        with _buffers_lock:
+            _buffers.append(buffer)
+    buffer.name = name
+    return buffer
+
+
+def new_trace_path() -> str:
+    """
+    Returns a new file name in TRACE_DIRECTORY, from the current time.
+    """
+    os.makedirs(TRACE_DIRECTORY, exist_ok=True)
+    return os.path.join(TRACE_DIRECTORY, time.strftime("trace-%Y%m%d-%H%M%S.json"))
+
+
+def enable(path: Optional[str] = None):
+    """
+    Starts recording spans.
+
+    Args:
+        path (str, optional): the file save() writes to, None for a new file in TRACE_DIRECTORY per save
+    """
+    global enabled, _path, _origin
+    _path = path
+    _origin = time.perf_counter()
+    enabled = True
+
+
+def events() -> List[dict]:
+    """
+    Returns the finished spans of all threads as Chrome trace events, with the names of the threads.
+    Can be called while other threads record, each buffer is copied with a few slices first.
+    """
+    with _buffers_lock:
+        buffers: List[ThreadBuffer] = list(_buffers)
+    pid: int = os.getpid()
+    trace_events: List[dict] = []
+    for buffer in buffers:
+        count: int = buffer.count
+        first: int = max(0, count - buffer.capacity)
+        names, starts, ends = buffer.names[:], buffer.starts[:], buffer.ends[:]
+        trace_events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": buffer.thread_id,
+                             "args": {"name": buffer.thread_name}})
+        for frame in range(first, count):
+            slot: int = frame % buffer.capacity
+            if ends[slot] < starts[slot]:
+                continue  # still open, or overwritten while copying
+            trace_events.append({"name": names[slot], "ph": "X", "pid": pid, "tid": buffer.thread_id,
+                                 "ts": (starts[slot] - _origin) * 1e6, "dur": (ends[slot] - starts[slot]) * 1e6})
+    return trace_events
+
+
+def save(background: bool = False) -> Optional[str]:
+    """
+    Writes the spans recorded so far as a Chrome trace, nothing if tracing is off.
+
+    Args:
+        background (bool, optional): write the file in a new thread (e.g. for a hotkey during the game),
+            the spans are still collected right away
+
+    Returns:
+        Optional[str]: the path of the file
+    """
+    if not enabled:
+        return None
+    path: str = _path or new_trace_path()
+    trace: dict = {"traceEvents": events(), "displayTimeUnit": "ms"}
+
+    def write():
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(trace, file)
+        print(f"Trace with {len(trace['traceEvents'])} events saved to {path}")
+
+    if background:
+        threading.Thread(target=write, daemon=True).start()
+    else:
+        write()
+    return path
@@ -0,0 +1,214 @@
+import collections
+import random
+import select
+import socket
+import struct
+import threading
+import time
+from enum import IntEnum
+from typing import Callable, Deque, Dict, List, Optional
+
+# kind, sequence, reliable sequence (for ACK datagrams: the acknowledged reliable sequence)
+DATAGRAM_HEADER = struct.Struct("!BII")
+MAX_DATAGRAM_SIZE: int = 1400  # stays below the usual MTU, so datagrams are not fragmented
+
+# Resend a reliable message if it was not acknowledged within this time (seconds)
+RETRANSMIT_TIMEOUT: float = 0.1
+
+
+class DatagramKind(IntEnum):
+    UNRELIABLE = 0  # snapshots and inputs, only the newest one matters
+    RELIABLE = 1    # handshake, score changes and game state transitions, resent until acknowledged
+    ACK = 2
+
+
+class UdpChannel:
+    """
+    Sends messages as datagrams over a connected UDP socket.
+
+    Every datagram carries a sequence number. Unreliable messages that arrive out of order or after a
+    newer one are dropped, so a lost datagram never delays the following ones like it does on TCP.
+    Reliable messages have their own sequence, are resent until acknowledged and are delivered in order.
+
+    For testing over loopback the channel can drop and reorder its outgoing datagrams on purpose.
+    """
+
+    def __init__(self, sock: socket.socket, packet_loss: float = 0.0, packet_reorder: float = 0.0,
+                 seed: Optional[int] = None, control: Optional[Callable[[memoryview], bool]] = None):
+        """
+        Args:
+            sock (socket.socket): the UDP socket, connected to the peer
+            packet_loss (float, optional): probability to drop an outgoing datagram
+            packet_reorder (float, optional): probability to send an outgoing datagram after the next one
+            seed (int, optional): seed for the loss and reorder decisions
+            control (Callable[[memoryview], bool], optional): gets every new unreliable message first, the ones
+                it returns True for are consumed (e.g. PING and PONG, so a newer message does not replace them)
+        """
+        self.sock: socket.socket = sock
+        self.sock.setblocking(False)
+        self.packet_loss: float = packet_loss
+        self.packet_reorder: float = packet_reorder
+        self.random: random.Random = random.Random(seed)
+        self.held: Optional[bytes] = None  # datagram that is held back to reorder it
+        self.control: Optional[Callable[[memoryview], bool]] = control
+
+        # The send thread and the receive thread both send (acks and retransmits)
+        self.lock: threading.Lock = threading.Lock()
+
+        # Sending
+        self.sequence: int = 0
+        self.reliable_sequence: int = 0
+        self.unacked: Dict[int, List] = {}  # reliable sequence -> [datagram, time it was sent]
+
+        # Receiving
+        self.last_sequence: int = 0  # newest unreliable sequence that was received
+        self.latest: Optional[memoryview] = None  # newest unreliable message that was not delivered yet
+        self.next_reliable: int = 1
+        self.out_of_order: Dict[int, memoryview] = {}
+        self.ready: Deque[memoryview] = collections.deque()
+
+        # Statistics
+        self.sent: int = 0
+        self.received: int = 0
+        self.stale: int = 0
+        self.retransmitted: int = 0
+        self.bytes_sent: int = 0
+        self.bytes_received: int = 0
+
+    def send(self, payload: bytes, reliable: bool = False) -> None:
+        """
+        Sends one message.
+
+        Args:
+            payload (bytes): the encoded message
+            reliable (bool, optional): resend the message until the peer acknowledged it
+        """
+        if len(payload) + DATAGRAM_HEADER.size > MAX_DATAGRAM_SIZE:
+            raise ValueError(f"message of {len(payload)} bytes does not fit into a datagram")
+        with self.lock:
+            self.sequence += 1
+            if reliable:
+                self.reliable_sequence += 1
+                datagram = DATAGRAM_HEADER.pack(DatagramKind.RELIABLE, self.sequence, self.reliable_sequence) + payload
+                self.unacked[self.reliable_sequence] = [datagram, time.monotonic()]
+            else:
+                datagram = DATAGRAM_HEADER.pack(DatagramKind.UNRELIABLE, self.sequence, 0) + payload
+            self.transmit(datagram)
+
+    def receive(self, timeout: Optional[float] = None) -> Optional[memoryview]:
+        """
+        Returns the next message. Reliable messages are returned in order, of the unreliable ones only
+        the newest is returned. Resends unacknowledged reliable messages while waiting.
+
+        Args:
+            timeout (float, optional): maximum time to wait in seconds, None waits forever
+
+        Returns:
+            Optional[memoryview]: the message, None if the timeout ran out
+        """
+        deadline: Optional[float] = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.drain()
+            if self.ready:
+                return self.ready.popleft()
+            if self.latest is not None:
+                message, self.latest = self.latest, None
+                return message
+
+            wait: float = self.retransmit()
+            if deadline is not None:
+                remaining: float = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                wait = min(wait, remaining)
+            select.select([self.sock], [], [], wait)
+
+    def drain(self) -> None:
+        """
+        Handles all datagrams that are waiting on the socket, without blocking.
+        """
+        while True:
+            try:
+                datagram: bytes = self.sock.recv(MAX_DATAGRAM_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return
+            self.handle(datagram)
+
+    def handle(self, datagram: bytes) -> None:
+        """
+        Handles one received datagram.
+        """
+        if len(datagram) < DATAGRAM_HEADER.size:
+            return
+        kind, sequence, reliable_sequence = DATAGRAM_HEADER.unpack_from(datagram)
+        self.received += 1
+        self.bytes_received += len(datagram)
+        payload: memoryview = memoryview(datagram)[DATAGRAM_HEADER.size:]
+
+        if kind == DatagramKind.UNRELIABLE:
+            if sequence <= self.last_sequence:
+                self.stale += 1  # older than one we already have
+                return
+            self.last_sequence = sequence
+            if self.control is None or not self.control(payload):
+                self.latest = payload
+
+        elif kind == DatagramKind.RELIABLE:
+            # Acknowledge every copy, the previous ack might have been lost
+            with self.lock:
+                self.transmit(DATAGRAM_HEADER.pack(DatagramKind.ACK, 0, reliable_sequence))
+            if reliable_sequence < self.next_reliable or reliable_sequence in self.out_of_order:
+                return  # duplicate
+            self.out_of_order[reliable_sequence] = payload
+            while self.next_reliable in self.out_of_order:
+                self.ready.append(self.out_of_order.pop(self.next_reliable))
+                self.next_reliable += 1
+
+        elif kind == DatagramKind.ACK:
+            with self.lock:
+                self.unacked.pop(reliable_sequence, None)
+
+    def retransmit(self) -> float:
+        """
+        Resends the reliable messages that were not acknowledged in time.
+
+        Returns:
+            float: the time in seconds until the next message needs to be resent
+        """
+        now: float = time.monotonic()
+        wait: float = RETRANSMIT_TIMEOUT
+        with self.lock:
+            for entry in self.unacked.values():
+                age: float = now - entry[1]
+                if age >= RETRANSMIT_TIMEOUT:
+                    entry[1] = now
+                    self.retransmitted += 1
+                    self.transmit(entry[0])
+                else:
+                    wait = min(wait, RETRANSMIT_TIMEOUT - age)
+            self.flush_held()
+        return wait
+
+    def transmit(self, datagram: bytes) -> None:
+        """
+        Sends a datagram, applying the simulated loss and reordering. Needs to be called with the lock held.
+        """
+        self.sent += 1
+        if self.packet_loss and self.random.random() < self.packet_loss:
+            return
+        if self.packet_reorder and self.held is None and self.random.random() < self.packet_reorder:
+            self.held = datagram  # sent after the next datagram
+            return
+        self.write(datagram)
+        self.flush_held()
+
+    def flush_held(self) -> None:
+        if self.held is not None:
+            held, self.held = self.held, None
+            self.write(held)
+
+    def write(self, datagram: bytes) -> None:
+        try:
+            self.bytes_sent += self.sock.send(datagram)
+        except (BlockingIOError, InterruptedError):
+            pass  # the socket buffer is full, treat it like a lost datagram